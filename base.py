@@ -1,19 +1,22 @@
 import math
 import time
+import atexit
 import random
+import argparse
+import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLUT import *
 from OpenGL.GLU import *
+from simulation import *
+from geometry import *
+from batching import *
+from hud_text import *
+from replay import Playback, KEY, KEY_UP, SPECIAL, MOUSE, apply_event, start_recording, load_recording
+from inputs import InputBuffer
+from network import GameClient, parse_address, FORWARD, BACKWARD, LEFT, RIGHT, FIRE
+import profiler
 
 
-GRID_LENGTH = 50
-TANK_RADIUS = 2
-BULLET_SPEED = 0.5
-TANK_SPEED = 0.5
-BOSS_HEALTH = 500
-BOSS_SPEED = 0.4
-PORTAL_RADIUS = 3
-
 camera_distance = 15
 camera_height = 10
 MIN_CAMERA_DISTANCE = 5
@@ -21,95 +24,81 @@ MAX_CAMERA_DISTANCE = 30
 MIN_CAMERA_HEIGHT = 5
 MAX_CAMERA_HEIGHT = 30
 
-game_state = {
-    'tanks': [
-        {'position': (0, 0, 0), 'rotation': 0, 'health': 100},
-        {'position': (30, 0, 30), 'rotation': 180, 'health': 100}
-    ],
-    'projectiles': [],
-    'scores': [0, 0],
-    'camera_mode': True,
-    'explosions': [],
-    'game_over': False,
-    'winner': None,
-    'powerup': None,
-    'powerup_spawn_time': time.time(),
-    'powerup_duration': 15,
-    'powerup_active': False,
-    'powerup_speed_boost': False,
-    'powerup_speed_end_time': 0,
-    'enemy_mode': 'chasing',
-    'avoiding_frames': 0,
-    'avoiding_direction': 0,
-    'boss_active': False,
-    'boss': None,
-    'enemy_fire_rate': 0.01,
-    'boss_fire_rate': 0.05,
-    'auto_teleport_enabled': False,
-    'last_auto_teleport_time': time.time(),
-    'portal_active': False,
-    'portal_position': (0, 0, 0),
-    'portal_timer': 0,
-    'paused': False,
-    'pause_menu_index': 0,
-    'pause_menu_mode': 'main',
-    'difficulty': 'easy',
-    'game_mode': 'normal',
-    'flag': {
-        'status': None,
-        'position': None,
-        'holder': None,
-        'hold_timer': 0.0
-    }
-}
-
-
-ENEMY_PROJECTILE_DAMAGE = {
-    'easy': 2,
-    'medium': 4,
-    'hard': 2
-}
-
-ENEMY_FIRE_COOLDOWN = {
-    'easy': 4.0,
-    'medium': 3.0,
-    'hard': 2.0
-}
-
-ENEMY_MISS_CHANCE = {
-    'easy': 0.4,
-    'medium': 0.3,
-    'hard': 0.2
-}
-
+ARENA_GRID_SPACING = 10
+ARENA_WALL_HEIGHT = 10
+
+# The simulation runs in fixed TICK_DT steps; frames draw between the last two
+# ticks. Frames slower than MAX_FRAME_TIME slow the game instead of piling up
+# ticks, and moves longer than SNAP_DISTANCE (respawn, teleport) are not eased.
+MAX_FRAME_TIME = 0.25
+SNAP_DISTANCE = 5
+
+# By default frames come from glutTimerFunc at DEFAULT_FPS and the process
+# sleeps in between; --fps 0 spins on glutIdleFunc instead. Either way a
+# frame is only drawn when the scene changed, or on input and window events.
+DEFAULT_FPS = 60
+
+PROFILE_OVERLAY_LINES = 12
+PROFILE_OVERLAY_REFRESH = 30
+
+show_profile_overlay = False
+profile_overlay_text = []
+profile_overlay_age = 0
+
+last_frame_time = None
+sim_accumulator = 0.0
+render_alpha = 1.0
+previous_poses = {}
+frame_interval = 1.0 / DEFAULT_FPS
+next_frame_time = None
+last_scene = None
+scene_moving = True
+
+# Set by --record / --replay. While a recording plays back, gameplay input
+# from the window is ignored; the camera can still be moved.
+recording = None
+playback = None
+
+# Gameplay input from the listeners waits here until the tick it falls in,
+# which applies it and records it; a network client sends it instead.
+input_buffer = InputBuffer()
+
+# Set by --connect. The server runs the game; this window only sends input
+# and draws the snapshots it receives, centred on the tank it was given.
+client = None
+viewer_tank = 0
+last_snapshot_time = None
+CLIENT_KEYS = {ord('w'): FORWARD, ord('s'): BACKWARD, ord('a'): LEFT, ord('d'): RIGHT}
+client_accumulator = 0.0
+
+
+def capture_poses():
+    previous_poses.clear()
+    for tank in game_state['tanks']:
+        previous_poses[id(tank)] = (tank.position[0], tank.position[2], tank.rotation)
+    if game_state['boss'] is not None:
+        boss = game_state['boss']
+        previous_poses[id(boss)] = (boss.position[0], boss.position[2], boss.rotation)
+    for obs in obstacles:
+        if obs.dynamic:
+            previous_poses[id(obs)] = (obs.x, obs.z, obs.rotation)
 
-obstacles = [
-    {'type': 'cube', 'x': 10, 'z': 10, 'size': 3, 'dynamic': False},
-    {'type': 'cube', 'x': -15, 'z': -15, 'size': 4, 'dynamic': True, 'speed': 0.3, 'direction': (1, 0), 'direction_change_time': time.time()},
-    {'type': 'cube', 'x': 20, 'z': -10, 'size': 5, 'dynamic': False, 'visible': True, 'toggle_time': time.time(), 'next_toggle': random.uniform(5, 10)},
-    {'type': 'barrier', 'x': -20, 'z': 15, 'size': 3, 'dynamic': True, 'rotation': 0, 'rotation_speed': 30},
-    {'type': 'cube', 'x': 0, 'z': -25, 'size': 4, 'dynamic': True, 'speed': 0.3, 'direction': (0, 1), 'direction_change_time': time.time()}
-]
+def blend_pose(key, x, z, rotation):
+    previous = previous_poses.get(key)
+    if previous is None:
+        return x, z, rotation
+    px, pz, prot = previous
+    if abs(x - px) + abs(z - pz) > SNAP_DISTANCE:
+        return x, z, rotation
+    t = render_alpha
+    turn = (rotation - prot + 180) % 360 - 180
+    return px + (x - px) * t, pz + (z - pz) * t, (prot + turn * t) % 360
 
-def check_boundary_collision(pos):
-    return abs(pos[0]) > GRID_LENGTH or abs(pos[2]) > GRID_LENGTH
+def render_pose(entity):
+    return blend_pose(id(entity), entity.position[0], entity.position[2], entity.rotation)
 
-def check_obstacle_collision(pos):
-    for obs in obstacles:
-        if not obs.get('visible', True):
-            continue
-        
-        if obs['type'] == 'cube':
-            distance = math.sqrt((pos[0] - obs['x'])**2 + (pos[2] - obs['z'])**2)
-            if distance < (obs['size'] / 2 + TANK_RADIUS):
-                return True
-        elif obs['type'] == 'barrier':
-            distance = math.sqrt((pos[0] - obs['x'])**2 + (pos[2] - obs['z'])**2)
-            if distance < (obs['size'] * 1.5 + TANK_RADIUS):
-                return True
-    return False
 
-def draw_arena():
+def build_arena():
     glPushMatrix()
     glColor3f(0.3, 0.7, 0.3)
     glBegin(GL_QUADS)
@@ -119,68 +108,83 @@ def draw_arena():
     glVertex3f(-GRID_LENGTH, 0, GRID_LENGTH)
     glEnd()
     glColor3f(0.5, 0.5, 0.5)
-    glBegin(GL_LINES)
-    for i in range(-GRID_LENGTH, GRID_LENGTH + 1, 10):
-        glVertex3f(i, 0.01, -GRID_LENGTH)
-        glVertex3f(i, 0.01, GRID_LENGTH)
-        glVertex3f(-GRID_LENGTH, 0.01, i)
-        glVertex3f(GRID_LENGTH, 0.01, i)
-    glEnd()
+    steps = np.arange(-GRID_LENGTH, GRID_LENGTH + 1, ARENA_GRID_SPACING, dtype=np.float32)
+    lines = np.zeros((len(steps), 4, 3), dtype=np.float32)
+    lines[:, :, 1] = 0.01
+    lines[:, 0, 0] = steps
+    lines[:, 0, 2] = -GRID_LENGTH
+    lines[:, 1, 0] = steps
+    lines[:, 1, 2] = GRID_LENGTH
+    lines[:, 2, 0] = -GRID_LENGTH
+    lines[:, 2, 2] = steps
+    lines[:, 3, 0] = GRID_LENGTH
+    lines[:, 3, 2] = steps
+    lines = lines.reshape(-1, 3)
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, lines)
+    glDrawArrays(GL_LINES, 0, len(lines))
+    glDisableClientState(GL_VERTEX_ARRAY)
     glColor3f(0.7, 0.7, 0.7)
     
     glPushMatrix()
-    glTranslatef(0, 5, -GRID_LENGTH)
-    glScalef(2 * GRID_LENGTH, 10, 1)
+    glTranslatef(0, ARENA_WALL_HEIGHT / 2, -GRID_LENGTH)
+    glScalef(2 * GRID_LENGTH, ARENA_WALL_HEIGHT, 1)
     glutSolidCube(1)
     glPopMatrix()
     
     glPushMatrix()
-    glTranslatef(0, 5, GRID_LENGTH)
-    glScalef(2 * GRID_LENGTH, 10, 1)
+    glTranslatef(0, ARENA_WALL_HEIGHT / 2, GRID_LENGTH)
+    glScalef(2 * GRID_LENGTH, ARENA_WALL_HEIGHT, 1)
     glutSolidCube(1)
     glPopMatrix()
     
     glPushMatrix()
-    glTranslatef(GRID_LENGTH, 5, 0)
-    glScalef(1, 10, 2 * GRID_LENGTH)
+    glTranslatef(GRID_LENGTH, ARENA_WALL_HEIGHT / 2, 0)
+    glScalef(1, ARENA_WALL_HEIGHT, 2 * GRID_LENGTH)
     glutSolidCube(1)
     glPopMatrix()
     
     glPushMatrix()
-    glTranslatef(-GRID_LENGTH, 5, 0)
-    glScalef(1, 10, 2 * GRID_LENGTH)
+    glTranslatef(-GRID_LENGTH, ARENA_WALL_HEIGHT / 2, 0)
+    glScalef(1, ARENA_WALL_HEIGHT, 2 * GRID_LENGTH)
     glutSolidCube(1)
     glPopMatrix()
     glPopMatrix()
 
+def draw_arena():
+    # the arena never changes during play, so it is replayed from one list
+    draw_static('arena', (GRID_LENGTH, ARENA_GRID_SPACING, ARENA_WALL_HEIGHT), build_arena)
+
 def draw_obstacle(obstacle):
-    if not obstacle.get('visible', True):
+    if not obstacle.visible:
         return
         
+    x, z, rotation = blend_pose(id(obstacle), obstacle.x, obstacle.z, obstacle.rotation)
     glPushMatrix()
     
-    if obstacle['type'] == 'barrier':
-        glTranslatef(obstacle['x'], obstacle['size'] / 2, obstacle['z'])
-        glRotatef(obstacle['rotation'], 0, 1, 0)
+    if obstacle.type == 'barrier':
+        glTranslatef(x, obstacle.size / 2, z)
+        glRotatef(rotation, 0, 1, 0)
         glScalef(3, 1, 0.5)
         glColor3f(0.5, 0.5, 0.5)
-        glutSolidCube(obstacle['size'])
+        draw_cube(obstacle.size)
     else:  
-        glTranslatef(obstacle['x'], obstacle['size'] / 2, obstacle['z'])
+        glTranslatef(x, obstacle.size / 2, z)
         glColor3f(0.5, 0.5, 0.5)
-        glutSolidCube(obstacle['size'])
+        draw_cube(obstacle.size)
         
     glPopMatrix()
 
 def draw_tank(tank, is_boss=False):
+    x, z, rotation = render_pose(tank)
     glPushMatrix()
     
     scale = 2.0 if is_boss else 1.0
     
-    glTranslatef(tank['position'][0], 0, tank['position'][2])
-    glRotatef(tank['rotation'], 0, 1, 0)
+    glTranslatef(x, 0, z)
+    glRotatef(rotation, 0, 1, 0)
     
-    if tank == game_state['tanks'][0]:
+    if tank is game_state['tanks'][viewer_tank]:
         glColor3f(0.2, 0.2, 0.8)  
     elif is_boss:
         glColor3f(0.5, 0.0, 0.5)  
@@ -188,27 +192,26 @@ def draw_tank(tank, is_boss=False):
         glColor3f(0.8, 0.2, 0.2)  
     
     glScalef(scale, scale, scale)
-    glutSolidCube(TANK_RADIUS * 2)
+    draw_cube(TANK_RADIUS * 2)
     
     glColor3f(0.3, 0.3, 0.3)
     glTranslatef(0, TANK_RADIUS, 0)
-    glutSolidCube(TANK_RADIUS)
+    draw_cube(TANK_RADIUS)
     
     glTranslatef(0, 0, TANK_RADIUS)
     glRotatef(90, 1, 0, 0)
-    quadric = gluNewQuadric()
-    gluCylinder(quadric, TANK_RADIUS / 3, TANK_RADIUS / 3, TANK_RADIUS * 2, 10, 10)
+    draw_cylinder(TANK_RADIUS / 3, TANK_RADIUS / 3, TANK_RADIUS * 2, 10, 10)
     
     glPopMatrix()
     
     
     glPushMatrix()
-    glTranslatef(tank['position'][0], 0, tank['position'][2]) #health bar
-    glRotatef(-tank['rotation'], 0, 1, 0)
+    glTranslatef(x, 0, z) #health bar
+    glRotatef(-rotation, 0, 1, 0)
     glTranslatef(0, TANK_RADIUS * 2.5 * scale, 0)
     
     max_health = BOSS_HEALTH if is_boss else 100
-    health_ratio = max(0, min(1, tank['health'] / max_health))
+    health_ratio = max(0, min(1, tank.health / max_health))
     red = 1.0 - health_ratio
     green = health_ratio
     glColor3f(red, green, 0.0)
@@ -225,29 +228,13 @@ def draw_tank(tank, is_boss=False):
     
     glPopMatrix()
 
-def draw_projectile(projectile):
-    glPushMatrix()
-    glTranslatef(projectile['position'][0], 0.5, projectile['position'][2])
-    if projectile['owner'] == 0:
-        glColor3f(0.0, 0.0, 1.0)  
-    else:
-        glColor3f(1.0, 0.0, 0.0) 
-    
-    quadric = gluNewQuadric()
-    gluSphere(quadric, 0.3, 10, 10)
-    glPopMatrix()
-
-def draw_explosion(explosion):
-    glPushMatrix()
-    
-    glTranslatef(explosion['position'][0], 0, explosion['position'][2])
-    scale = 1.0 + 1.5 * (1.0 - explosion['lifetime'] / 30.0)
-    glScalef(scale, scale, scale)
-    brightness = explosion['lifetime'] / 30.0
-    glColor3f(1.0, 0.5 * brightness, 0.0)
-    glutSolidSphere(1.0, 16, 16)
-    
-    glPopMatrix()
+def draw_projectiles_and_explosions():
+    projectiles = game_state['projectiles']
+    instances = np.concatenate([
+        projectile_instances(projectiles.interpolated_positions(render_alpha), projectiles.owner[:len(projectiles)]),
+        explosion_instances(game_state['explosions'], EXPLOSION_TICKS)
+    ])
+    draw_sphere_batch(instances)
 
 def draw_portal():
     if not game_state.get('portal_active', False):
@@ -259,7 +246,7 @@ def draw_portal():
     portal_timer = game_state.get('portal_timer', 0)
     brightness = min(1.0, portal_timer / 20.0)
     glColor3f(0.0, brightness, brightness)
-    glutSolidTorus(0.2, PORTAL_RADIUS, 10, 10)
+    draw_torus(0.2, PORTAL_RADIUS, 10, 10)
     
     glPopMatrix()
 
@@ -269,7 +256,8 @@ def draw_flag(flag_status, flag_pos=None, tank=None):
     if flag_status == 'dropped' and flag_pos is not None:
         glTranslatef(flag_pos[0], 2.5, flag_pos[2])
     elif flag_status in ['held_by_enemy', 'held_by_player'] and tank is not None:
-        glTranslatef(tank['position'][0], 2.5 + TANK_RADIUS * 2.5, tank['position'][2])
+        x, z, _ = render_pose(tank)
+        glTranslatef(x, 2.5 + TANK_RADIUS * 2.5, z)
     else:
         glPopMatrix()
         return
@@ -277,8 +265,7 @@ def draw_flag(flag_status, flag_pos=None, tank=None):
     glColor3f(0.8, 0.8, 0.8)
     glPushMatrix()
     glRotatef(-90, 1, 0, 0)
-    quadric = gluNewQuadric()
-    gluCylinder(quadric, 0.08, 0.08, 2.5, 8, 1)
+    draw_cylinder(0.08, 0.08, 2.5, 8, 1)
     glPopMatrix()
     
     glColor3f(1.0, 1.0, 0.0)
@@ -290,83 +277,6 @@ def draw_flag(flag_status, flag_pos=None, tank=None):
     
     glPopMatrix()
 
-def create_explosion(position):
-    explosion = {
-        'position': position,
-        'lifetime': 30
-    }
-    game_state['explosions'].append(explosion)
-
-def update_explosions():
-    to_remove = []
-    for i, explosion in enumerate(game_state['explosions']):
-        explosion['lifetime'] -= 1
-        if explosion['lifetime'] <= 0:
-            to_remove.append(i)
-    for i in reversed(to_remove):
-        del game_state['explosions'][i]
-
-def spawn_powerup():
-    if game_state['powerup'] is not None:
-        return
-        
-    while True:
-        x = random.uniform(-GRID_LENGTH + 5, GRID_LENGTH - 5)
-        z = random.uniform(-GRID_LENGTH + 5, GRID_LENGTH - 5)
-        pos = (x, 0, z)
-        
-        if check_obstacle_collision(pos):
-            continue
-            
-        collision = False
-        for tank in game_state['tanks']:
-            dist = math.sqrt((pos[0] - tank['position'][0])**2 + (pos[2] - tank['position'][2])**2)
-            if dist < TANK_RADIUS * 2:
-                collision = True
-                break
-                
-        if collision:
-            continue
-            
-        if game_state['boss_active'] and check_tank_collision(pos, game_state['boss']['position']):
-            continue
-            
-        game_state['powerup'] = {'position': pos, 'spawn_time': time.time()}
-        break
-
-def check_powerup_collection():
-    if game_state['powerup'] is None:
-        return
-        
-    player_pos = game_state['tanks'][0]['position']
-    powerup_pos = game_state['powerup']['position']
-    dist = math.sqrt((player_pos[0] - powerup_pos[0])**2 + (player_pos[2] - powerup_pos[2])**2)
-    
-    if dist < TANK_RADIUS * 2:
-        if random.random() < 0.5:
-            game_state['tanks'][0]['health'] = 100
-        else:
-            game_state['powerup_speed_boost'] = True
-            game_state['powerup_speed_end_time'] = time.time() + 10
-            
-        game_state['powerup'] = None
-        game_state['powerup_spawn_time'] = time.time()
-
-def update_powerup():
-    if game_state['game_over']:
-        return
-        
-    if game_state['powerup'] is None:
-        if time.time() - game_state['powerup_spawn_time'] > random.uniform(15, 20):
-            spawn_powerup()
-    else:
-        if time.time() - game_state['powerup']['spawn_time'] > 15:
-            game_state['powerup'] = None
-            game_state['powerup_spawn_time'] = time.time()
-            
-    if game_state['powerup_speed_boost'] and time.time() > game_state['powerup_speed_end_time']:
-        game_state['powerup_speed_boost'] = False
-
 def draw_powerup():
     if game_state['powerup'] is None:
         return
@@ -377,26 +287,9 @@ def draw_powerup():
                  game_state['powerup']['position'][2])
     glRotatef(time.time() * 50 % 360, 0, 1, 0)
     glColor3f(1.0, 1.0, 0.0)
-    glutSolidCube(1.0)
+    draw_cube(1.0)
     glPopMatrix()
 
-def draw_text(text, x, y):
-    glMatrixMode(GL_PROJECTION)
-    glPushMatrix()
-    glLoadIdentity()
-    glOrtho(0, 800, 0, 600, -1, 1)
-    glMatrixMode(GL_MODELVIEW)
-    glPushMatrix()
-    glLoadIdentity()
-    glColor3f(1, 1, 1)
-    glRasterPos2i(x, y)
-    for char in text:
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(char))
-    glPopMatrix()
-    glMatrixMode(GL_PROJECTION)
-    glPopMatrix()
-    glMatrixMode(GL_MODELVIEW)
-
 def draw_minimap():
     minimap_left = 600
     minimap_right = 780
@@ -445,16 +338,14 @@ def draw_minimap():
         glVertex2f(minimap_right, y)
         glEnd()
     
-    glColor3f(1.0, 1.0, 1.0)
-    glRasterPos2f((minimap_left + minimap_right) / 2 - 5, minimap_top - 10)
-    glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord('N'))
+    draw_text('N', (minimap_left + minimap_right) // 2 - 5, minimap_top - 10)
     
     glColor3f(0.5, 0.5, 0.5)
     for obs in obstacles:
-        if not obs.get('visible', True):
+        if not obs.visible:
             continue
-        x, z = world_to_minimap(obs['x'], obs['z'])
-        size = obs['size'] * (minimap_width / arena_size)
+        x, z = world_to_minimap(obs.x, obs.z)
+        size = obs.size * (minimap_width / arena_size)
         glBegin(GL_QUADS)
         glVertex2f(x - size/2, z - size/2)
         glVertex2f(x + size/2, z - size/2)
@@ -476,12 +367,12 @@ def draw_minimap():
         glEnd()
     
     #player tank
-    player = game_state['tanks'][0]
-    x, z = world_to_minimap(player['position'][0], player['position'][2])
+    player = game_state['tanks'][viewer_tank]
+    x, z = world_to_minimap(player.position[0], player.position[2])
     glColor3f(0.0, 1.0, 0.0)
     glPushMatrix()
     glTranslatef(x, z, 0)
-    glRotatef(player['rotation'], 0, 0, 1)
+    glRotatef(player.rotation, 0, 0, 1)
     glBegin(GL_TRIANGLES)
     glVertex2f(0, 6)
     glVertex2f(-4, -4)
@@ -491,11 +382,11 @@ def draw_minimap():
     
     #enemy tanks
     for i, enemy in enumerate(game_state['tanks'][1:], 1):
-        x, z = world_to_minimap(enemy['position'][0], enemy['position'][2])
+        x, z = world_to_minimap(enemy.position[0], enemy.position[2])
         glColor3f(1.0, 0.0, 0.0)
         glPushMatrix()
         glTranslatef(x, z, 0)
-        glRotatef(enemy['rotation'], 0, 0, 1)
+        glRotatef(enemy.rotation, 0, 0, 1)
         glBegin(GL_TRIANGLES)
         glVertex2f(0, 6)
         glVertex2f(-4, -4)
@@ -505,11 +396,11 @@ def draw_minimap():
     
     #boss
     if game_state['boss_active'] and game_state['boss'] is not None:
-        x, z = world_to_minimap(game_state['boss']['position'][0], game_state['boss']['position'][2])
+        x, z = world_to_minimap(game_state['boss'].position[0], game_state['boss'].position[2])
         glColor3f(0.5, 0.0, 0.5)  
         glPushMatrix()
         glTranslatef(x, z, 0)
-        glRotatef(game_state['boss']['rotation'], 0, 0, 1)
+        glRotatef(game_state['boss'].rotation, 0, 0, 1)
         glBegin(GL_TRIANGLES)
         glVertex2f(0, 8)  
         glVertex2f(-6, -6)
@@ -618,22 +509,22 @@ def draw_hud():
         return
     
     draw_text(f"Player: {game_state['scores'][0]} Enemy: {game_state['scores'][1]}", 10, 580)
-    draw_text(f"Player Health: {game_state['tanks'][0]['health']}", 10, 560)
+    draw_text(f"Player Health: {game_state['tanks'][viewer_tank].health}", 10, 560)
     
     if game_state['boss_active']:
-        draw_text(f"Boss Health: {game_state['boss']['health']}", 10, 540)
+        draw_text(f"Boss Health: {game_state['boss'].health}", 10, 540)
     else:
-        draw_text(f"Enemy Health: {game_state['tanks'][1]['health']}", 10, 540)
+        draw_text(f"Enemy Health: {game_state['tanks'][1].health}", 10, 540)
     
     if game_state['powerup_speed_boost']:
-        time_left = int(game_state['powerup_speed_end_time'] - time.time())
+        time_left = int(game_state['powerup_speed_end_time'] - now())
         draw_text(f"Speed Boost: {time_left}s", 10, 520)
     
     if not game_state['boss_active']:
         draw_text(f"Enemy Mode: {game_state['enemy_mode']}", 10, 500)
     
     if game_state['auto_teleport_enabled']:
-        time_to_teleport = 30 - int(time.time() - game_state['last_auto_teleport_time'])
+        time_to_teleport = 30 - int(now() - game_state['last_auto_teleport_time'])
         draw_text(f"Auto-Teleport: ON (Next in {time_to_teleport}s)", 10, 480)
     
     if game_state.get('game_mode', 'normal') == 'ctf':
@@ -653,7 +544,18 @@ def draw_hud():
             text = "ENEMY WINS! Press R to restart"
         draw_text(text, 250, 300)
     
-    draw_minimap()
+def draw_profile_overlay():
+    global profile_overlay_text, profile_overlay_age
+    # percentiles are re-sorted only every PROFILE_OVERLAY_REFRESH frames
+    if profile_overlay_age <= 0:
+        counts = profiler.latest_counts()
+        profile_overlay_text = ["phase  p50 / p95 / p99"]
+        profile_overlay_text += profiler.report_lines(PROFILE_OVERLAY_LINES)
+        profile_overlay_text.append(" ".join(f"{name}:{value}" for name, value in counts.items()))
+        profile_overlay_age = PROFILE_OVERLAY_REFRESH
+    profile_overlay_age -= 1
+    for i, line in enumerate(profile_overlay_text):
+        draw_text(line, 470, 470 - i * 18)
 
 def setupCamera():
     glMatrixMode(GL_PROJECTION)
@@ -662,15 +564,14 @@ def setupCamera():
     glMatrixMode(GL_MODELVIEW)
     glLoadIdentity()
     if game_state['camera_mode']:
-        tank_pos = game_state['tanks'][0]['position']
-        tank_rot = game_state['tanks'][0]['rotation']
+        tank_x, tank_z, tank_rot = render_pose(game_state['tanks'][viewer_tank])
         global camera_distance, camera_height
         rot_rad = math.radians(tank_rot)
-        camera_x = tank_pos[0] - camera_distance * math.sin(rot_rad)
-        camera_z = tank_pos[2] - camera_distance * math.cos(rot_rad)
+        camera_x = tank_x - camera_distance * math.sin(rot_rad)
+        camera_z = tank_z - camera_distance * math.cos(rot_rad)
         gluLookAt(
             camera_x, camera_height, camera_z,
-            tank_pos[0], 0, tank_pos[2],
+            tank_x, 0, tank_z,
             0, 1, 0
         )
     else:
@@ -680,22 +581,19 @@ def setupCamera():
             0, 0, -1
         )
 
-def draw_shapes():
-    draw_arena()
-    
+def draw_obstacles():
     for obs in obstacles:
         draw_obstacle(obs)
-    
-    draw_powerup()
-    draw_portal()
-    
+
+def draw_tanks():
     for tank in game_state['tanks']:
-        if tank['health'] > 0:
+        if tank.health > 0:
             draw_tank(tank)
     
-    if game_state['boss_active'] and game_state['boss']['health'] > 0:
+    if game_state['boss_active'] and game_state['boss'].health > 0:
         draw_tank(game_state['boss'], is_boss=True)
-    
+
+def draw_ctf_flag():
     if game_state.get('game_mode', 'normal') == 'ctf' and game_state['flag']['status']:
         if game_state['flag']['status'] == 'dropped':
             draw_flag('dropped', flag_pos=game_state['flag']['position'])
@@ -705,519 +603,64 @@ def draw_shapes():
                 draw_flag('held_by_enemy', tank=game_state['tanks'][holder])
         elif game_state['flag']['status'] == 'held_by_player':
             draw_flag('held_by_player', tank=game_state['tanks'][0])
-    
-    for proj in game_state['projectiles']:
-        draw_projectile(proj)
-    
-    for explosion in game_state['explosions']:
-        draw_explosion(explosion)
-    
-    draw_hud()
+
+def draw_shapes():
+    profiler.measure('draw_arena', draw_arena)
+    profiler.measure('draw_obstacles', draw_obstacles)
+    profiler.measure('draw_powerup', draw_powerup)
+    profiler.measure('draw_portal', draw_portal)
+    profiler.measure('draw_tanks', draw_tanks)
+    profiler.measure('draw_flag', draw_ctf_flag)
+    profiler.measure('draw_projectiles', draw_projectiles_and_explosions)
+    profiler.measure('draw_hud', draw_hud)
+    if not game_state.get('paused', False):
+        profiler.measure('draw_minimap', draw_minimap)
+    if show_profile_overlay:
+        draw_profile_overlay()
 
 def display():
+    prepare_text()
     glClear(GL_COLOR_BUFFER_BIT)
-    setupCamera()
+    profiler.measure('setupCamera', setupCamera)
     draw_shapes()
-    glutSwapBuffers()
-
-def check_projectile_tank_collision(proj_pos, tank_pos):
-    distance = math.sqrt((proj_pos[0] - tank_pos[0])**2 + (proj_pos[2] - tank_pos[2])**2)
-    return distance < TANK_RADIUS
-
-def check_tank_collision(tank1_pos, tank2_pos):
-    distance = math.sqrt((tank1_pos[0] - tank2_pos[0])**2 + (tank1_pos[2] - tank2_pos[2])**2)
-    return distance < TANK_RADIUS * 2
-
-def respawn_tank(tank_idx):
-    game_state['tanks'][tank_idx]['health'] = 100
-    
-    valid_position = False
-    while not valid_position:
-        x = (2 * (tank_idx % 2) - 1) * (GRID_LENGTH - 10) * (0.3 + 0.7 * random.random())
-        z = (2 * (tank_idx // 2) - 1) * (GRID_LENGTH - 10) * (0.3 + 0.7 * random.random())
-        pos = (x, 0, z)
-        
-        valid_position = not check_obstacle_collision(pos)
-        
-        for other_idx, other_tank in enumerate(game_state['tanks']):
-            if other_idx != tank_idx and check_tank_collision(pos, other_tank['position']):
-                valid_position = False
-                break
-                
-        if game_state['boss_active'] and check_tank_collision(pos, game_state['boss']['position']):
-            valid_position = False
-    
-    game_state['tanks'][tank_idx]['position'] = pos
-    game_state['tanks'][tank_idx]['rotation'] = 0 if tank_idx == 0 else 180
-
-def spawn_boss():
-    game_state['boss'] = {
-        'position': (0, 0, 30),
-        'rotation': 180,
-        'health': BOSS_HEALTH
-    }
-    game_state['boss_active'] = True
-    game_state['tanks'][1]['health'] = 0  
-
-def reset_game():
-    game_state['scores'] = [0, 0]
-    
-    for i in range(len(game_state['tanks'])):
-        respawn_tank(i)
-    
-    game_state['projectiles'] = []
-    game_state['explosions'] = []
-    game_state['game_over'] = False
-    game_state['winner'] = None
-    game_state['powerup'] = None
-    game_state['powerup_spawn_time'] = time.time()
-    game_state['powerup_speed_boost'] = False
-    game_state['enemy_mode'] = 'chasing'
-    game_state['avoiding_frames'] = 0
-    game_state['avoiding_direction'] = 0
-    game_state['boss_active'] = False
-    game_state['boss'] = None
-    game_state['enemy_fire_rate'] = 0.01
-    game_state['boss_fire_rate'] = 0.05
-    game_state['auto_teleport_enabled'] = False
-    game_state['last_auto_teleport_time'] = time.time()
-    game_state['portal_active'] = False
-    game_state['flag'] = {
-        'status': None,
-        'position': None,
-        'holder': None,
-        'hold_timer': 0.0
-    }
-    
-    global obstacles
-    obstacles = [
-        {'type': 'cube', 'x': 10, 'z': 10, 'size': 3, 'dynamic': False},
-        {'type': 'cube', 'x': -15, 'z': -15, 'size': 4, 'dynamic': True, 'speed': 0.3, 'direction': (1, 0), 'direction_change_time': time.time()},
-        {'type': 'cube', 'x': 20, 'z': -10, 'size': 5, 'dynamic': False, 'visible': True, 'toggle_time': time.time(), 'next_toggle': random.uniform(5, 10)},
-        {'type': 'barrier', 'x': -20, 'z': 15, 'size': 3, 'dynamic': True, 'rotation': 0, 'rotation_speed': 30},
-        {'type': 'cube', 'x': 0, 'z': -25, 'size': 4, 'dynamic': True, 'speed': 0.3, 'direction': (0, 1), 'direction_change_time': time.time()}
-    ]
-
-def check_win_condition():
-    if game_state.get('game_over', False):
-        return
-        
-    if game_state['scores'][0] >= 2 and not game_state['boss_active'] and game_state['game_mode'] == 'normal':
-        spawn_boss()
-    elif game_state['scores'][1] >= 5:
-        game_state['game_over'] = True
-        game_state['winner'] = 1
-
-def update_projectiles():
-    if game_state['game_over'] or game_state['paused']:
-        return
-        
-    projectiles_to_remove = []
-    
-    for i, proj in enumerate(game_state['projectiles']):
-        pos = list(proj['position'])
-        dir_vector = proj['direction']
-        
-        pos[0] += dir_vector[0] * BULLET_SPEED
-        pos[1] += dir_vector[1] * BULLET_SPEED
-        pos[2] += dir_vector[2] * BULLET_SPEED
-        
-        proj['position'] = tuple(pos)
-        
-        if (abs(pos[0]) > GRID_LENGTH or abs(pos[2]) > GRID_LENGTH):
-            projectiles_to_remove.append(i)
-            continue
-            
-        if check_obstacle_collision(pos):
-            projectiles_to_remove.append(i)
-            create_explosion(pos)
-            continue
-            
-        for tank_idx, tank in enumerate(game_state['tanks']):
-            if proj['owner'] != tank_idx:
-                if check_projectile_tank_collision(pos, tank['position']):
-                    projectiles_to_remove.append(i)
-                    create_explosion(pos)
-                     
-                    if proj['owner'] == 0:
-                        tank['health'] -= 20
-                    else:
-                        tank['health'] -= ENEMY_PROJECTILE_DAMAGE.get(game_state.get('difficulty', 'easy'), 10)
-                    
-                    if tank['health'] <= 0:
-                        if game_state.get('game_mode', 'normal') == 'ctf' and tank_idx != 0 and game_state['flag']['status'] == 'held_by_enemy' and game_state['flag']['holder'] == tank_idx:
-                            game_state['flag']['status'] = 'dropped'
-                            game_state['flag']['position'] = tank['position']
-                            game_state['flag']['holder'] = None
-                            game_state['flag']['hold_timer'] = 0.0
-                        
-                        if game_state.get('game_mode', 'normal') == 'ctf' and tank_idx == 0 and game_state['flag']['status'] == 'held_by_player':
-                            game_state['game_over'] = True
-                            game_state['winner'] = 1
-                        
-                        game_state['scores'][proj['owner']] += 1
-                        respawn_tank(tank_idx)
-                    
-                    break
-        
-        if game_state['boss_active'] and proj['owner'] == 0:
-            boss = game_state['boss']
-            if check_projectile_tank_collision(pos, boss['position']):
-                projectiles_to_remove.append(i)
-                create_explosion(pos)
-                
-                boss['health'] -= 20
-                
-                if boss['health'] <= 0:
-                    game_state['game_over'] = True
-                    game_state['winner'] = 0
-    
-    for i in sorted(projectiles_to_remove, reverse=True):
-        if i < len(game_state['projectiles']):
-            game_state['projectiles'].pop(i)
-
-def update_enemy_ai():
-    if game_state['game_over'] or game_state['paused']:
-        return
-        
-    for idx, enemy in enumerate(game_state['tanks'][1:], 1):
-        player = game_state['tanks'][0]
-        
-        if 'enemy_mode' not in enemy:
-            enemy['enemy_mode'] = 'chasing'
-        if 'avoiding_frames' not in enemy:
-            enemy['avoiding_frames'] = 0
-        if 'avoiding_direction' not in enemy:
-            enemy['avoiding_direction'] = 0
-        if 'fire_cooldown' not in enemy:
-            enemy['fire_cooldown'] = 0
-        
-        dx = player['position'][0] - enemy['position'][0]
-        dz = player['position'][2] - enemy['position'][2]
-        
-        target_angle = math.degrees(math.atan2(dx, dz)) % 360
-        current_angle = enemy['rotation']
-        angle_diff = (target_angle - current_angle + 180) % 360 - 180
-        
-        distance = math.sqrt(dx**2 + dz**2)
-        
-        ROT_SPEED = 1.2 if game_state['difficulty'] == 'easy' else 1.5 if game_state['difficulty'] == 'medium' else 1.0
-        MOVE_SPEED = TANK_SPEED * (0.4 if game_state['difficulty'] == 'hard' else 0.5)
-        
-        if enemy['enemy_mode'] == 'chasing':
-            if abs(angle_diff) > 5:
-                if angle_diff > 0:
-                    enemy['rotation'] = (current_angle + ROT_SPEED) % 360
-                else:
-                    enemy['rotation'] = (current_angle - ROT_SPEED) % 360
-            
-            if distance > 20 and abs(angle_diff) < 10:
-                pos = list(enemy['position'])
-                rot = enemy['rotation']
-                pos[0] += MOVE_SPEED * math.sin(math.radians(rot))
-                pos[2] += MOVE_SPEED * math.cos(math.radians(rot))
-                
-                if check_boundary_collision(pos) or check_obstacle_collision(pos):
-                    enemy['enemy_mode'] = 'avoiding'
-                    enemy['avoiding_frames'] = 20
-                    enemy['avoiding_direction'] = random.choice([1, -1])
-                else:
-                    enemy['position'] = tuple(pos)
-            
-            if enemy['fire_cooldown'] > 0:
-                enemy['fire_cooldown'] -= 1/60.0
-            
-            if abs(angle_diff) < 5 and distance < 40 and enemy['fire_cooldown'] <= 0:
-                miss_chance = ENEMY_MISS_CHANCE.get(game_state['difficulty'], 0.3)
-                fire_angle = enemy['rotation']
-                
-                if random.random() < miss_chance:
-                    fire_angle += random.uniform(-40, 40)
-                
-                direction = (
-                    math.sin(math.radians(fire_angle)),
-                    0,
-                    math.cos(math.radians(fire_angle))
-                )
-                
-                projectile = {
-                    'position': enemy['position'],
-                    'direction': direction,
-                    'owner': idx
-                }
-                
-                game_state['projectiles'].append(projectile)
-                enemy['fire_cooldown'] = ENEMY_FIRE_COOLDOWN.get(game_state['difficulty'], 1.2)
-        
-        elif enemy['enemy_mode'] == 'avoiding':
-            if enemy['avoiding_frames'] > 0:
-                enemy['rotation'] = (enemy['rotation'] + 2 * enemy['avoiding_direction']) % 360
-                enemy['avoiding_frames'] -= 1
-                
-                if enemy['avoiding_frames'] % 5 == 0:
-                    pos = list(enemy['position'])
-                    rot = enemy['rotation']
-                    pos[0] += MOVE_SPEED * math.sin(math.radians(rot))
-                    pos[2] += MOVE_SPEED * math.cos(math.radians(rot))
-                    
-                    if not check_boundary_collision(pos) and not check_obstacle_collision(pos):
-                        enemy['position'] = tuple(pos)
-            else:
-                enemy['enemy_mode'] = 'chasing'
-
-def update_boss_ai():
-    if not game_state['boss_active'] or game_state['game_over'] or game_state['paused']:
-        return
-        
-    boss = game_state['boss']
-    player = game_state['tanks'][0]
-    
-    dx = player['position'][0] - boss['position'][0]
-    dz = player['position'][2] - boss['position'][2]
-    
-    target_angle = math.degrees(math.atan2(dx, dz)) % 360
-    current_angle = boss['rotation']
-    angle_diff = (target_angle - current_angle + 180) % 360 - 180
-    
-    distance = math.sqrt(dx**2 + dz**2)
-    
-    if abs(angle_diff) > 5:
-        boss['rotation'] = (current_angle + 4 * (1 if angle_diff > 0 else -1)) % 360
-    
-    if distance > 15 and abs(angle_diff) < 15:
-        pos = list(boss['position'])
-        rot = boss['rotation']
-        pos[0] += BOSS_SPEED * 0.25 * math.sin(math.radians(rot))
-        pos[2] += BOSS_SPEED * 0.25 * math.cos(math.radians(rot))
-        
-        if not (check_boundary_collision(pos) or check_obstacle_collision(pos)):
-            boss['position'] = tuple(pos)
-    
-    if abs(angle_diff) < 10 and random.random() < game_state['boss_fire_rate']:
-        direction = (math.sin(math.radians(boss['rotation'])), 0, math.cos(math.radians(boss['rotation'])))
-        
-        projectile1 = {'position': boss['position'], 'direction': direction, 'owner': 1}
-        projectile2 = {
-            'position': boss['position'], 
-            'direction': (
-                math.sin(math.radians(boss['rotation'] + 10)), 
-                0, 
-                math.cos(math.radians(boss['rotation'] + 10))
-            ), 
-            'owner': 1
-        }
-        
-        game_state['projectiles'].extend([projectile1, projectile2])
+    profiler.measure('swap_buffers', glutSwapBuffers)
+    if profiler.enabled:
+        profiler.end_frame(entity_counts())
 
-def update_dynamic_obstacles():
-    if game_state['paused']:
-        return
-        
-    for obs in obstacles:
-        if obs.get('dynamic'):
-            if obs['type'] == 'cube':
-                pos = [obs['x'], obs['z']]
-                pos[0] += obs['speed'] * obs['direction'][0]
-                pos[1] += obs['speed'] * obs['direction'][1]
-                
-                if abs(pos[0]) > GRID_LENGTH - obs['size']/2 or abs(pos[1]) > GRID_LENGTH - obs['size']/2:
-                    obs['direction'] = (-obs['direction'][0], -obs['direction'][1])
-                
-                if time.time() - obs.get('direction_change_time', time.time()) > 5:
-                    angle = random.uniform(0, 360)
-                    obs['direction'] = (math.sin(math.radians(angle)), math.cos(math.radians(angle)))
-                    obs['direction_change_time'] = time.time()
-                
-                obs['x'], obs['z'] = pos[0], pos[1]
-            
-            elif obs['type'] == 'barrier':
-                obs['rotation'] = (obs['rotation'] + obs['rotation_speed']) % 360
-        
-        if 'toggle_time' in obs and 'next_toggle' in obs:
-            if obs.get('visible', True) and time.time() - obs['toggle_time'] > obs['next_toggle']:
-                obs['visible'] = False
-                obs['toggle_time'] = time.time()
-                obs['next_toggle'] = random.uniform(3, 7)
-            elif not obs.get('visible', True) and time.time() - obs['toggle_time'] > obs['next_toggle']:
-                obs['visible'] = True
-                obs['toggle_time'] = time.time()
-                obs['next_toggle'] = random.uniform(5, 10)
+def keyboardListener(key, x, y):
+    # a key is the same key with Shift or Caps Lock, and is released as such
+    if playback is None:
+        input_buffer.push(KEY, key.lower()[0])
 
-def teleport_player():
-    game_state['portal_active'] = True
-    game_state['portal_timer'] = 30  
-    
-    attempts = 0
-    while attempts < 100:  
-        x = random.uniform(-GRID_LENGTH + 5, GRID_LENGTH - 5)
-        z = random.uniform(-GRID_LENGTH + 5, GRID_LENGTH - 5)
-        pos = (x, 0, z)
-        
-        valid = not check_boundary_collision(pos) and not check_obstacle_collision(pos)
-        
-        if valid:
-            
-            if check_tank_collision(pos, game_state['tanks'][1]['position']):
-                valid = False
-                
-            if game_state['boss_active'] and check_tank_collision(pos, game_state['boss']['position']):
-                valid = False
-            
-            if valid:
-                game_state['portal_position'] = pos
-                game_state['tanks'][0]['position'] = pos
-                break
-        
-        attempts += 1
-    
-    glutPostRedisplay()
+def keyboardUpListener(key, x, y):
+    if playback is None:
+        input_buffer.push(KEY_UP, key.lower()[0])
 
-def update_portal_effect():
-    if game_state['portal_active']:
-        game_state['portal_timer'] -= 1
-        if game_state['portal_timer'] <= 0:
-            game_state['portal_active'] = False
+def entryListener(state):
+    # releases go to whatever window has the keyboard now, so keys still
+    # down when it leaves are let go here
+    if state == GLUT_LEFT and playback is None:
+        input_buffer.release()
 
-def check_flag_logic():
-    if game_state.get('game_mode', 'normal') != 'ctf' or game_state['paused']:
-        return
-    
-    flag = game_state['flag']
-    
-    if flag['status'] is None:
-        flag['status'] = 'held_by_enemy'
-        flag['holder'] = 1
-        flag['position'] = None
-        flag['hold_timer'] = 0.0
-    
-    if flag['status'] == 'held_by_player':
-        flag['hold_timer'] += 1/60.0
-        if flag['hold_timer'] >= 10.0:
-            game_state['game_over'] = True
-            game_state['winner'] = 0
-    
-    if flag['status'] == 'dropped' and flag['position'] is not None:
-        player_pos = game_state['tanks'][0]['position']
-        dist = math.sqrt((player_pos[0] - flag['position'][0])**2 + (player_pos[2] - flag['position'][2])**2)
-        if dist < TANK_RADIUS * 2:
-            flag['status'] = 'held_by_player'
-            flag['holder'] = 0
-            flag['position'] = None
-            flag['hold_timer'] = 0.0
-
-def keyboardListener(key, x, y):
-    if key == b'\x1b':  # ESC
-        if not game_state['paused']:
-            game_state['paused'] = True
-            game_state['pause_menu_index'] = 0
-            game_state['pause_menu_mode'] = 'main'
-        else:
-            game_state['paused'] = False
-        glutPostRedisplay()
-        return
-    
-    if game_state['paused']:
-        if key == b'\r' or key == b'\n':  # Enter
-            if game_state['pause_menu_mode'] == 'main':
-                if game_state['pause_menu_index'] == 0:  # Resume
-                    game_state['paused'] = False
-                elif game_state['pause_menu_index'] == 1:  # Restart
-                    reset_game()
-                    game_state['paused'] = False
-                elif game_state['pause_menu_index'] == 2:  # Difficulty
-                    game_state['pause_menu_mode'] = 'difficulty'
-                    game_state['pause_menu_index'] = ['easy', 'medium', 'hard'].index(game_state['difficulty'])
-                elif game_state['pause_menu_index'] == 3:  # Game Mode
-                    game_state['pause_menu_mode'] = 'gamemode'
-                    game_state['pause_menu_index'] = 0 if game_state['game_mode'] == 'normal' else 1
-            
-            elif game_state['pause_menu_mode'] == 'difficulty':
-                selected = ['easy', 'medium', 'hard'][game_state['pause_menu_index']]
-                if selected != game_state['difficulty']:
-                    game_state['difficulty'] = selected
-                    if selected == 'medium':
-                        pass
-                    elif selected == 'hard':
-                        while len(game_state['tanks']) < 4:
-                            pos = (random.uniform(-GRID_LENGTH+5, GRID_LENGTH-5), 0, random.uniform(-GRID_LENGTH+5, GRID_LENGTH-5))
-                            game_state['tanks'].append({'position': pos, 'rotation': random.randint(0, 359), 'health': 100})
-                    elif selected == 'easy':
-                        game_state['tanks'] = game_state['tanks'][:2]
-                
-                game_state['pause_menu_mode'] = 'main'
-                game_state['pause_menu_index'] = 2
-            
-            elif game_state['pause_menu_mode'] == 'gamemode':
-                selected = ['normal', 'ctf'][game_state['pause_menu_index']]
-                game_state['game_mode'] = selected
-                game_state['pause_menu_mode'] = 'main'
-                game_state['pause_menu_index'] = 3
-            
-            glutPostRedisplay()
-        
-        elif key == b'\x1b':  # ESC again
-            if game_state['pause_menu_mode'] == 'main':
-                game_state['paused'] = False
-            else:
-                game_state['pause_menu_mode'] = 'main'
-                game_state['pause_menu_index'] = 0
-            glutPostRedisplay()
-        
-        elif key == b'w':  # up
-            menu_size = 4 if game_state['pause_menu_mode']=='main' else 3 if game_state['pause_menu_mode']=='difficulty' else 2
-            game_state['pause_menu_index'] = (game_state['pause_menu_index'] - 1) % menu_size
-            glutPostRedisplay()
-        
-        elif key == b's':  # down
-            menu_size = 4 if game_state['pause_menu_mode']=='main' else 3 if game_state['pause_menu_mode']=='difficulty' else 2
-            game_state['pause_menu_index'] = (game_state['pause_menu_index'] + 1) % menu_size
-            glutPostRedisplay()
-        
-        return
-    
-    if game_state['game_over']:
-        if key == b'r':
-            reset_game()
-        return
-    
-    if key == b'w':
-        pos = list(game_state['tanks'][0]['position'])
-        rot = game_state['tanks'][0]['rotation']
-        speed_multiplier = 2.0 if game_state['powerup_speed_boost'] else 1.0
-        pos[0] += TANK_SPEED * speed_multiplier * math.sin(math.radians(rot))
-        pos[2] += TANK_SPEED * speed_multiplier * math.cos(math.radians(rot))
-        if not check_boundary_collision(pos) and not check_obstacle_collision(pos):
-            game_state['tanks'][0]['position'] = tuple(pos)
-    elif key == b's':
-        pos = list(game_state['tanks'][0]['position'])
-        rot = game_state['tanks'][0]['rotation']
-        speed_multiplier = 2.0 if game_state['powerup_speed_boost'] else 1.0
-        pos[0] -= TANK_SPEED * speed_multiplier * math.sin(math.radians(rot))
-        pos[2] -= TANK_SPEED * speed_multiplier * math.cos(math.radians(rot))
-        if not check_boundary_collision(pos) and not check_obstacle_collision(pos):
-            game_state['tanks'][0]['position'] = tuple(pos)
-    elif key == b'a':
-        game_state['tanks'][0]['rotation'] = (game_state['tanks'][0]['rotation'] + 5) % 360
-    elif key == b'd':
-        game_state['tanks'][0]['rotation'] = (game_state['tanks'][0]['rotation'] - 5) % 360
-    elif key == b'q':
-        game_state['auto_teleport_enabled'] = not game_state['auto_teleport_enabled']
-        if game_state['auto_teleport_enabled']:
-            game_state['last_auto_teleport_time'] = time.time()
-            teleport_player()
-    elif key == b'c':
-        game_state['scores'][0] += 1
-    elif key == b'v':
-        game_state['scores'][1] += 1
-    elif key == b'r':
-        reset_game()
-    
-    glutPostRedisplay()
+def windowStatusListener(state):
+    if state in (GLUT_HIDDEN, GLUT_FULLY_COVERED):
+        entryListener(GLUT_LEFT)
 
 def specialKeyListener(key, x, y):
-    global camera_distance, camera_height
+    global camera_distance, camera_height, show_profile_overlay, profile_overlay_age
     if key == GLUT_KEY_F1:
-        game_state['camera_mode'] = not game_state['camera_mode']
+        # the camera mode is game state, except where nothing is simulated here
+        if playback is None and client is None:
+            input_buffer.push(SPECIAL, key)
+        else:
+            toggle_camera_mode()
+    elif key == GLUT_KEY_F2:
+        show_profile_overlay = not show_profile_overlay
+        profile_overlay_age = 0
+        if show_profile_overlay:
+            profiler.enable()
+        elif profiler.dump_path is None:
+            profiler.disable()
     elif key == GLUT_KEY_UP:
         camera_distance = max(MIN_CAMERA_DISTANCE, camera_distance - 1)
         camera_height = max(MIN_CAMERA_HEIGHT, camera_height - 1)
@@ -1228,116 +671,192 @@ def specialKeyListener(key, x, y):
     glutPostRedisplay()
 
 def mouseListener(button, state, x, y):
-    if game_state['game_over'] or game_state['paused']:
-        return
-    
-    if button == GLUT_LEFT_BUTTON and state == GLUT_DOWN:
-        tank_pos = game_state['tanks'][0]['position']
-        rotation = game_state['tanks'][0]['rotation']
-        rad = math.radians(rotation)
-        direction = (math.sin(rad), 0, math.cos(rad))
-        
-        projectile = {
-            'position': tank_pos,
-            'direction': direction,
-            'owner': 0
-        }
-        
-        game_state['projectiles'].append(projectile)
-    
-    glutPostRedisplay()
+    if playback is None:
+        input_buffer.push(MOUSE, button, state)
+
+def apply_inputs(until):
+    # Applies and records the input that arrived by until; True if any did.
+    events = input_buffer.take(until)
+    for kind, a, b in events:
+        if recording is not None:
+            recording.record(kind, a, b)
+        apply_event(kind, a, b)
+    if game_state['paused']:
+        # the simulation lets go of held keys on pause
+        input_buffer.held.clear()
+    return bool(events)
+
+def scene_signature():
+    # everything a tick can change on screen
+    count = len(world)
+    store = game_state['projectiles']
+    g = game_state
+    countdowns = (int(g['powerup_speed_end_time'] - now()) if g['powerup_speed_boost'] else None,
+                  int(now() - g['last_auto_teleport_time']) if g['auto_teleport_enabled'] else None)
+    return (world['position'][:count].tobytes(), world['rotation'][:count].tobytes(),
+            world['health'][:count].tobytes(), store.position[:store.count].tobytes(),
+            [explosion.lifetime for explosion in g['explosions']],
+            [(obs.x, obs.z, obs.rotation, obs.visible) for obs in obstacles],
+            tuple(g['scores']), g['game_over'], g['winner'], g['boss_active'], g['enemy_mode'],
+            g['paused'], g['pause_menu_mode'], g['pause_menu_index'],
+            tuple(g['flag'].values()), countdowns)
+
+def scene_changed():
+    global last_scene
+    scene = scene_signature()
+    changed = scene != last_scene
+    last_scene = scene
+    # the power-up and the portal spin on their own until the game is over
+    spinning = game_state['powerup'] is not None or game_state['portal_active']
+    return changed or (spinning and not game_state['game_over'])
+
+def advance(current_time):
+    # Runs the ticks due by current_time and says whether to draw a frame:
+    # while the last tick moved something, frames ease toward it.
+    global last_frame_time, sim_accumulator, render_alpha, scene_moving
+    frame_time = 0.0 if last_frame_time is None else min(current_time - last_frame_time, MAX_FRAME_TIME)
+    last_frame_time = current_time
+    
+    if client is not None:
+        return poll_server(current_time, frame_time)
+    
+    # a playback keeps its ticks running while paused, as the recording may
+    # resume on a later one
+    if game_state.get('paused', False) and playback is None:
+        sim_accumulator = 0.0
+        return apply_inputs(current_time) or show_profile_overlay
+    
+    ticked = False
+    sim_accumulator += frame_time
+    while sim_accumulator >= TICK_DT:
+        sim_accumulator -= TICK_DT
+        capture_poses()
+        if playback is not None:
+            playback.step()
+        else:
+            # the moment this tick stands for, so input waits at most a tick
+            apply_inputs(current_time - sim_accumulator)
+            tick = game_state['tick']
+            step()
+            # a paused tick simulates nothing, so the recording does not
+            # count it and input while paused lands on the tick that resumes
+            if recording is not None and game_state['tick'] != tick:
+                recording.after_step()
+        ticked = True
+    render_alpha = sim_accumulator / TICK_DT
+    if ticked:
+        scene_moving = scene_changed()
+    profiler.add_time('idle', time.perf_counter() - current_time)
+    return scene_moving or show_profile_overlay
 
 def idle():
-    if game_state.get('paused', False):
-        return
-    
-    update_projectiles()
-    update_explosions()
-    update_powerup()
-    check_powerup_collection()
-    update_enemy_ai()
-    update_boss_ai()
-    update_dynamic_obstacles()
-    update_portal_effect()
-    check_flag_logic()
-    check_win_condition()
-    
-    if game_state['auto_teleport_enabled'] and time.time() - game_state['last_auto_teleport_time'] >= 30:
-        teleport_player()
-        game_state['last_auto_teleport_time'] = time.time()
-    
-    glutPostRedisplay()
+    if advance(time.perf_counter()):
+        glutPostRedisplay()
+
+def frame_timer(value):
+    global next_frame_time
+    current_time = time.perf_counter()
+    if advance(current_time):
+        glutPostRedisplay()
+    # frames keep to a fixed schedule; one that runs late moves it on
+    # instead of letting frames bunch up behind it
+    next_frame_time = max(next_frame_time + frame_interval, current_time)
+    glutTimerFunc(max(round((next_frame_time - time.perf_counter()) * 1000), 0), frame_timer, 0)
+
+def send_client_input(current_time, frame_time):
+    # Held movement keys count a press per tick, as the server moves a
+    # local player; a click is one shot.
+    global client_accumulator
+    for kind, a, b in input_buffer.take(current_time):
+        if kind == MOUSE and a == GLUT_LEFT_BUTTON and b == GLUT_DOWN:
+            client.press(FIRE)
+    client_accumulator += frame_time
+    ticks = int(client_accumulator // TICK_DT)
+    client_accumulator -= ticks * TICK_DT
+    if ticks:
+        for key in input_buffer.held:
+            if key in CLIENT_KEYS:
+                client.press(CLIENT_KEYS[key], ticks)
+
+def poll_server(current_time, frame_time):
+    global render_alpha, viewer_tank, last_snapshot_time
+    send_client_input(current_time, frame_time)
+    fresh = client.poll()
+    if fresh:
+        capture_poses()
+        client.apply()
+        viewer_tank = client.tank_idx
+        last_snapshot_time = current_time
+    easing = render_alpha < 1.0
+    if last_snapshot_time is not None:
+        # eases from the previous snapshot to the newest over one snapshot interval
+        render_alpha = min(1.0, (current_time - last_snapshot_time) / (client.snapshot_ticks * TICK_DT))
+    profiler.add_time('idle', time.perf_counter() - current_time)
+    return fresh or easing or show_profile_overlay
 
 def init():
     glClearColor(0.0, 0.0, 0.0, 0.0)
 
+def shutdown():
+    release_text()
+    release_batches()
+    release_geometry()
+
 def main():
+    parser = argparse.ArgumentParser(description="3D Tank Battle Arena")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="time every frame phase and write the samples to PATH (.csv or .jsonl) on exit")
+    parser.add_argument('--seed', type=int, default=None, help="seed the match for a reproducible game")
+    parser.add_argument('--record', metavar='PATH', help="record every input and write the recording to PATH on exit")
+    parser.add_argument('--replay', metavar='PATH', help="play back a recording made with --record")
+    parser.add_argument('--seek', type=int, default=0, metavar='TICK', help="start the playback at this tick")
+    parser.add_argument('--connect', metavar='HOST:PORT', help="join a game run by network.py instead of playing locally")
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS,
+                        help="frame rate to run at, sleeping between frames; 0 redraws from an idle callback instead")
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable(args.profile)
+    
+    global recording, playback, client, frame_interval, next_frame_time
+    if args.connect:
+        client = GameClient(parse_address(args.connect))
+        client.connect()
+        atexit.register(client.close)
+    elif args.replay:
+        playback = Playback(load_recording(args.replay))
+        playback.seek(args.seek)
+    elif args.record:
+        try:
+            recording = start_recording(args.seed)
+        except ValueError as error:
+            parser.error(str(error))
+        atexit.register(lambda: recording.save(args.record))
+    elif args.seed is not None:
+        seed(args.seed)
+        reset_game()
+    
     glutInit()
     glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB)
     glutInitWindowSize(800, 600)
     glutCreateWindow(b"3D Tank Battle Arena")
     init()
     glutDisplayFunc(display)
-    glutIdleFunc(idle)
+    if args.fps > 0:
+        frame_interval = 1.0 / args.fps
+        next_frame_time = time.perf_counter()
+        glutTimerFunc(0, frame_timer, 0)
+    else:
+        glutIdleFunc(idle)
+    glutIgnoreKeyRepeat(1)
     glutKeyboardFunc(keyboardListener)
+    glutKeyboardUpFunc(keyboardUpListener)
     glutSpecialFunc(specialKeyListener)
     glutMouseFunc(mouseListener)
+    glutEntryFunc(entryListener)
+    glutWindowStatusFunc(windowStatusListener)
+    glutCloseFunc(shutdown)
     glutMainLoop()
 
-def draw_flag(flag_status, flag_pos=None, tank=None):
-    glPushMatrix()
-    
-    if flag_status == 'dropped' and flag_pos is not None:
-        glTranslatef(flag_pos[0], 2.5, flag_pos[2])
-    elif flag_status in ['held_by_enemy', 'held_by_player'] and tank is not None:
-        glTranslatef(tank['position'][0], 2.5 + TANK_RADIUS * 2.5, tank['position'][2])
-    else:
-        glPopMatrix()
-        return
-    
-    glColor3f(0.8, 0.8, 0.8)
-    glPushMatrix()
-    glRotatef(-90, 1, 0, 0)
-    quadric = gluNewQuadric()
-    gluCylinder(quadric, 0.08, 0.08, 2.5, 8, 1)
-    glPopMatrix()
-    
-    glColor3f(1.0, 1.0, 0.0)
-    glBegin(GL_TRIANGLES)
-    glVertex3f(0, 2.2, 0)
-    glVertex3f(1.0, 1.7, 0)
-    glVertex3f(0, 1.7, 0)
-    glEnd()
-    
-    glPopMatrix()
-
-def check_flag_logic():
-    if game_state.get('game_mode', 'normal') != 'ctf' or game_state['paused']:
-        return
-    
-    flag = game_state['flag']
-    
-    if flag['status'] is None:
-        flag['status'] = 'held_by_enemy'
-        flag['holder'] = 1
-        flag['position'] = None
-        flag['hold_timer'] = 0.0
-    
-    if flag['status'] == 'held_by_player':
-        flag['hold_timer'] += 1/60.0
-        if flag['hold_timer'] >= 10.0:
-            game_state['game_over'] = True
-            game_state['winner'] = 0
-    
-    if flag['status'] == 'dropped' and flag['position'] is not None:
-        player_pos = game_state['tanks'][0]['position']
-        dist = math.sqrt((player_pos[0] - flag['position'][0])**2 + (player_pos[2] - flag['position'][2])**2)
-        if dist < TANK_RADIUS * 2:
-            flag['status'] = 'held_by_player'
-            flag['holder'] = 0
-            flag['position'] = None
-            flag['hold_timer'] = 0.0
-
 if __name__ == "__main__":
     main()
 
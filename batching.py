@@ -0,0 +1,202 @@
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+from OpenGL.arrays import vbo
+
+
+# Draws many coloured spheres in one call. Each instance is a row of
+# [x, y, z, scale, r, g, b]. With instanced arrays the unit sphere is uploaded
+# once and a small shader places every copy; otherwise the copies are merged
+# on the CPU into a vertex/colour buffer, MERGED_CHUNK instances per
+# glDrawArrays. The merged buffer and its VBO are allocated once at the
+# chunk size and refilled in place, so however many instances there are,
+# a frame allocates nothing and never holds more than one chunk. Like
+# geometry.py, everything here belongs to the current GL context and is
+# freed by release_batches().
+
+INSTANCE_FLOATS = 7
+SPHERE_SLICES = 10
+SPHERE_STACKS = 10
+# about 3.7 MB of vertices at the sphere size above
+MERGED_CHUNK = 256
+
+VERTEX_SHADER = """
+#version 120
+attribute vec3 vertex;
+attribute vec4 placement;
+attribute vec3 tint;
+varying vec3 color;
+void main() {
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(vertex * placement.w + placement.xyz, 1.0);
+    color = tint;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 120
+varying vec3 color;
+void main() {
+    gl_FragColor = vec4(color, 1.0);
+}
+"""
+
+_state = {
+    'mode': None,
+    'mesh': None,
+    'mesh_vbo': None,
+    'instance_vbo': None,
+    'merged': None,
+    'merged_vbo': None,
+    'program': None,
+    'locations': None
+}
+
+
+def sphere_triangles(slices, stacks):
+    theta = np.linspace(0.0, np.pi, stacks + 1)
+    phi = np.linspace(0.0, 2 * np.pi, slices + 1)
+    t, p = np.meshgrid(theta, phi, indexing='ij')
+    points = np.stack([np.sin(t) * np.cos(p), np.cos(t), np.sin(t) * np.sin(p)], axis=-1)
+    a = points[:-1, :-1]
+    b = points[1:, :-1]
+    c = points[1:, 1:]
+    d = points[:-1, 1:]
+    triangles = np.stack([a, b, c, a, c, d], axis=2)
+    return np.ascontiguousarray(triangles.reshape(-1, 3), dtype=np.float32)
+
+def _setup():
+    _state['mesh'] = sphere_triangles(SPHERE_SLICES, SPHERE_STACKS)
+    try:
+        if not (bool(glDrawArraysInstanced) and bool(glVertexAttribDivisor)):
+            raise RuntimeError("instanced arrays unavailable")
+        program = shaders.compileProgram(
+            shaders.compileShader(VERTEX_SHADER, GL_VERTEX_SHADER),
+            shaders.compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER),
+        )
+    except Exception:
+        _state['mode'] = 'merged'
+        # vertex positions, then colours, each a contiguous block
+        _state['merged'] = np.zeros((2, MERGED_CHUNK, len(_state['mesh']), 3), dtype=np.float32)
+        _state['merged_vbo'] = vbo.VBO(_state['merged'], usage='GL_STREAM_DRAW')
+        return
+    _state['mode'] = 'instanced'
+    _state['program'] = program
+    _state['locations'] = tuple(glGetAttribLocation(program, name) for name in ('vertex', 'placement', 'tint'))
+    _state['mesh_vbo'] = vbo.VBO(_state['mesh'], usage='GL_STATIC_DRAW')
+    _state['instance_vbo'] = vbo.VBO(np.zeros((0, INSTANCE_FLOATS), dtype=np.float32), usage='GL_STREAM_DRAW')
+
+def batch_mode():
+    if _state['mode'] is None:
+        _setup()
+    return _state['mode']
+
+def _draw_instanced(instances):
+    vertex_loc, placement_loc, tint_loc = _state['locations']
+    mesh_vbo = _state['mesh_vbo']
+    instance_vbo = _state['instance_vbo']
+    stride = INSTANCE_FLOATS * 4
+
+    glUseProgram(_state['program'])
+    mesh_vbo.bind()
+    glEnableVertexAttribArray(vertex_loc)
+    glVertexAttribPointer(vertex_loc, 3, GL_FLOAT, GL_FALSE, 12, mesh_vbo)
+    instance_vbo.set_array(instances)
+    instance_vbo.bind()
+    glEnableVertexAttribArray(placement_loc)
+    glVertexAttribPointer(placement_loc, 4, GL_FLOAT, GL_FALSE, stride, instance_vbo)
+    glVertexAttribDivisor(placement_loc, 1)
+    glEnableVertexAttribArray(tint_loc)
+    glVertexAttribPointer(tint_loc, 3, GL_FLOAT, GL_FALSE, stride, instance_vbo + 16)
+    glVertexAttribDivisor(tint_loc, 1)
+
+    glDrawArraysInstanced(GL_TRIANGLES, 0, len(_state['mesh']), len(instances))
+
+    glVertexAttribDivisor(placement_loc, 0)
+    glVertexAttribDivisor(tint_loc, 0)
+    glDisableVertexAttribArray(vertex_loc)
+    glDisableVertexAttribArray(placement_loc)
+    glDisableVertexAttribArray(tint_loc)
+    instance_vbo.unbind()
+    glUseProgram(0)
+
+def merge_chunk(instances, out):
+    # the vertices and colours of every instance into the front of the two
+    # blocks of out, one sphere each
+    mesh = _state['mesh']
+    vertices = out[0, :len(instances)]
+    colors = out[1, :len(instances)]
+    np.multiply(mesh[None, :, :], instances[:, None, 3:4], out=vertices)
+    vertices += instances[:, None, 0:3]
+    colors[:] = instances[:, None, 4:7]
+    return vertices, colors
+
+def _draw_merged(instances):
+    merged = _state['merged']
+    merged_vbo = _state['merged_vbo']
+    # every chunk is written to fresh storage of the chunk size, so it
+    # never waits on the draw of the chunk before it
+    block = merged[0].nbytes
+    merged_vbo.bind()
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glEnableClientState(GL_COLOR_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, merged_vbo)
+    glColorPointer(3, GL_FLOAT, 0, merged_vbo + block)
+    for start in range(0, len(instances), MERGED_CHUNK):
+        vertices, colors = merge_chunk(instances[start:start + MERGED_CHUNK], merged)
+        glBufferData(GL_ARRAY_BUFFER, merged.nbytes, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertices.nbytes, vertices)
+        glBufferSubData(GL_ARRAY_BUFFER, block, colors.nbytes, colors)
+        glDrawArrays(GL_TRIANGLES, 0, vertices.shape[0] * vertices.shape[1])
+    glDisableClientState(GL_COLOR_ARRAY)
+    glDisableClientState(GL_VERTEX_ARRAY)
+    merged_vbo.unbind()
+
+def draw_sphere_batch(instances):
+    if len(instances) == 0:
+        return
+    instances = np.ascontiguousarray(instances, dtype=np.float32)
+    if batch_mode() == 'instanced':
+        _draw_instanced(instances)
+    else:
+        _draw_merged(instances)
+
+def projectile_instances(positions, owners):
+    instances = np.empty((len(owners), INSTANCE_FLOATS), dtype=np.float32)
+    instances[:, 0] = positions[:, 0]
+    instances[:, 1] = 0.5
+    instances[:, 2] = positions[:, 2]
+    instances[:, 3] = 0.3
+    player = owners == 0
+    instances[:, 4] = np.where(player, 0.0, 1.0)
+    instances[:, 5] = 0.0
+    instances[:, 6] = np.where(player, 1.0, 0.0)
+    return instances
+
+def explosion_instances(explosions, full_lifetime):
+    count = len(explosions)
+    instances = np.empty((count, INSTANCE_FLOATS), dtype=np.float32)
+    if count == 0:
+        return instances
+    data = np.array([(e.position[0], e.position[2], e.lifetime) for e in explosions], dtype=np.float32)
+    life = data[:, 2] / full_lifetime
+    instances[:, 0] = data[:, 0]
+    instances[:, 1] = 0.0
+    instances[:, 2] = data[:, 1]
+    instances[:, 3] = 1.0 + 1.5 * (1.0 - life)
+    instances[:, 4] = 1.0
+    instances[:, 5] = 0.5 * life
+    instances[:, 6] = 0.0
+    return instances
+
+def release_batches():
+    for key in ('mesh_vbo', 'instance_vbo', 'merged_vbo'):
+        if _state[key] is not None:
+            _state[key].delete()
+            _state[key] = None
+    if _state['program'] is not None:
+        glDeleteProgram(_state['program'])
+        _state['program'] = None
+    _state['mode'] = None
+    _state['mesh'] = None
+    _state['merged'] = None
+    _state['locations'] = None
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import tracemalloc
+
+import numpy as np
+
+import profiler
+from simulation import *
+
+
+# Scripted scenarios timed three ways: a bare tick loop for throughput, a
+# profiled loop for per-phase times and a tracemalloc loop for peak memory.
+# Every pass starts from the same seed, so runs of two versions see the same
+# game. The render half draws the same scenarios through base.display() when
+# a GLUT window can be opened, and is reported as skipped otherwise.
+
+BENCHMARK_VERSION = 1
+WARMUP_TICKS = 30
+STRESS_PROJECTILES = 10000
+STRESS_OBSTACLES = 500
+
+
+def hold_game_open():
+    # Keeps long runs from ending in a game over screen.
+    game_state['game_over'] = False
+    game_state['winner'] = None
+    game_state['scores'][1] = 0
+    if game_state['tanks'][0].health <= 0:
+        game_state['tanks'][0].health = 100
+
+def setup_idle():
+    pass
+
+def setup_hard():
+    set_difficulty('hard')
+    reset_game()
+
+def setup_boss():
+    spawn_boss()
+    game_state['boss_fire_rate'] = 0.5
+
+def boss_tick():
+    hold_game_open()
+    game_state['boss'].health = BOSS_HEALTH
+    player = game_state['tanks'][0]
+    dx = game_state['boss'].position[0] - player.position[0]
+    dz = game_state['boss'].position[2] - player.position[2]
+    player.rotation = math.degrees(math.atan2(dx, dz)) % 360
+    if game_state['tick'] % 6 == 0:
+        fire_player()
+
+def top_up_projectiles():
+    hold_game_open()
+    projectiles = game_state['projectiles']
+    missing = STRESS_PROJECTILES - len(projectiles)
+    if missing <= 0:
+        return
+    positions = np.zeros((missing, 3))
+    positions[:, 0] = np_rng.uniform(-GRID_LENGTH, GRID_LENGTH, missing)
+    positions[:, 2] = np_rng.uniform(-GRID_LENGTH, GRID_LENGTH, missing)
+    angles = np_rng.uniform(0, 2 * np.pi, missing)
+    directions = np.zeros((missing, 3))
+    directions[:, 0] = np.sin(angles)
+    directions[:, 2] = np.cos(angles)
+    projectiles.add_many(positions, directions, np_rng.integers(0, 2, missing))
+
+def setup_obstacles():
+    for _ in range(STRESS_OBSTACLES):
+        angle = rng.uniform(0, 360)
+        add_obstacle(Obstacle('cube', rng.uniform(-GRID_LENGTH + 5, GRID_LENGTH - 5),
+                              rng.uniform(-GRID_LENGTH + 5, GRID_LENGTH - 5), 2, dynamic=True, speed=0.3,
+                              direction=(math.sin(math.radians(angle)), math.cos(math.radians(angle))),
+                              direction_change_time=now()))
+
+# name -> (setup after reset_game(), hook called before every tick)
+SCENARIOS = {
+    'idle': (setup_idle, hold_game_open),
+    'hard': (setup_hard, hold_game_open),
+    'boss': (setup_boss, boss_tick),
+    'projectiles_10k': (setup_idle, top_up_projectiles),
+    'obstacles_500': (setup_obstacles, hold_game_open)
+}
+
+
+def start_scenario(name, seed_value):
+    setup, hook = SCENARIOS[name]
+    set_clock(tick_clock)
+    seed(seed_value)
+    set_difficulty('easy')
+    game_state['game_mode'] = 'normal'
+    game_state['paused'] = False
+    reset_game()
+    setup()
+    for _ in range(WARMUP_TICKS):
+        hook()
+        step()
+    return hook
+
+def time_ticks(name, ticks, seed_value):
+    hook = start_scenario(name, seed_value)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        hook()
+        step()
+    return time.perf_counter() - start
+
+def profile_ticks(name, ticks, seed_value):
+    hook = start_scenario(name, seed_value)
+    profiler.reset(max(profiler.WINDOW, ticks))
+    profiler.enable()
+    try:
+        for _ in range(ticks):
+            profiler.measure('scenario', hook)
+            step()
+            profiler.end_frame(entity_counts())
+        return profiler.stats(), profiler.latest_counts()
+    finally:
+        profiler.disable()
+        profiler.reset()
+
+def peak_memory(name, ticks, seed_value):
+    tracemalloc.start()
+    try:
+        hook = start_scenario(name, seed_value)
+        tracemalloc.reset_peak()
+        for _ in range(ticks):
+            hook()
+            step()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def run_simulation(names, ticks, seed_value):
+    results = {}
+    for name in names:
+        elapsed = time_ticks(name, ticks, seed_value)
+        phases, counts = profile_ticks(name, ticks, seed_value)
+        results[name] = {
+            'ticks': ticks,
+            'seconds': round(elapsed, 6),
+            'ticks_per_sec': round(ticks / max(elapsed, 1e-9), 1),
+            'peak_memory_bytes': peak_memory(name, ticks, seed_value),
+            'counts': counts,
+            'phases_ms': phases
+        }
+    return results
+
+
+def render_unavailable():
+    # freeglut exits the process if it cannot reach a display, so look first.
+    from OpenGL.GLUT import glutInit
+    if not bool(glutInit):
+        return "GLUT library not found"
+    if os.name == 'posix' and sys.platform != 'darwin' and not os.environ.get('DISPLAY'):
+        return "no display to open an offscreen window on (set DISPLAY, e.g. under xvfb-run)"
+    return None
+
+def run_render(names, frames, seed_value):
+    import base
+    from OpenGL.GL import glFinish
+    from OpenGL.GLUT import glutInit, glutInitDisplayMode, glutInitWindowSize, glutCreateWindow, glutHideWindow, GLUT_DOUBLE, GLUT_RGB
+
+    glutInit()
+    glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB)
+    glutInitWindowSize(800, 600)
+    glutCreateWindow(b"Tank Wars benchmark")
+    glutHideWindow()
+    base.init()
+
+    results = {}
+    for name in names:
+        hook = start_scenario(name, seed_value)
+        base.render_alpha = 0.5
+        base.display()
+        glFinish()
+        profiler.reset(max(profiler.WINDOW, frames))
+        profiler.enable()
+        try:
+            start = time.perf_counter()
+            for _ in range(frames):
+                profiler.measure('scenario', hook)
+                base.capture_poses()
+                step()
+                base.display()
+                profiler.measure('gl_finish', glFinish)
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                'frames': frames,
+                'seconds': round(elapsed, 6),
+                'frames_per_sec': round(frames / max(elapsed, 1e-9), 1),
+                'batch_mode': base.batch_mode(),
+                'counts': profiler.latest_counts(),
+                'phases_ms': profiler.stats()
+            }
+        finally:
+            profiler.disable()
+            profiler.reset()
+    base.shutdown()
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for half, rate in (('simulation', 'ticks_per_sec'), ('render', 'frames_per_sec')):
+        old_half = baseline.get(half) or {}
+        new_half = results.get(half) or {}
+        for name, new in new_half.items():
+            old = old_half.get(name)
+            if not isinstance(new, dict) or not isinstance(old, dict) or rate not in old:
+                continue
+            if new[rate] < old[rate] * (1.0 - tolerance):
+                found.append(f"{half}/{name}: {rate} {old[rate]} -> {new[rate]}")
+    return found
+
+def print_summary(results):
+    for name, result in results['simulation'].items():
+        slowest = sorted(result['phases_ms'].items(), key=lambda item: -item[1]['mean'])
+        phases = ", ".join(f"{phase} {stats['mean']:.3f}" for phase, stats in slowest[:4] if phase != 'frame')
+        print(f"{name:16s} {result['ticks_per_sec']:9.0f} ticks/s  "
+              f"peak {result['peak_memory_bytes'] / 1024:8.0f} KiB  ms/tick: {phases}")
+    render = results['render']
+    if 'skipped' in render:
+        print(f"render: skipped ({render['skipped']})")
+    else:
+        for name, result in render.items():
+            print(f"{name:16s} {result['frames_per_sec']:9.0f} frames/s  ({result['batch_mode']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Tank Wars simulation and rendering")
+    parser.add_argument('--ticks', type=int, default=TICK_RATE * 10)
+    parser.add_argument('--frames', type=int, default=TICK_RATE * 5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="run only this scenario (repeatable)")
+    parser.add_argument('--no-render', action='store_true', help="skip the render half")
+    parser.add_argument('--output', metavar='PATH', help="write the results as JSON to PATH")
+    parser.add_argument('--baseline', metavar='PATH', help="compare against an earlier --output file")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="allowed throughput drop against the baseline (default 0.15)")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results = {
+        'version': BENCHMARK_VERSION,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'simulation': run_simulation(names, args.ticks, args.seed),
+        'render': {}
+    }
+    reason = "disabled with --no-render" if args.no_render else render_unavailable()
+    if reason is None:
+        results['render'] = run_render(names, args.frames, args.seed)
+    else:
+        results['render'] = {'skipped': reason}
+
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"regression: {line}")
+        if found:
+            sys.exit(1)
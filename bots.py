@@ -0,0 +1,114 @@
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+
+from simulation import TICK_RATE, TICK_DT, DIFFICULTIES
+from network import GameClient, query_stats, parse_address, DEFAULT_PORT, FORWARD, BACKWARD, LEFT, RIGHT, FIRE
+
+
+# Load generator for network.py. Each bot is a real client: it decodes every
+# snapshot and sends input every tick, driving forward about half the time
+# with the odd turn and shot. Stages run with a growing number of
+# bots. After each stage the server reports its tick times, and the bytes
+# every bot received give the per-client bandwidth.
+
+STARTUP_TIMEOUT = 5.0
+
+
+def drive(bot, chooser):
+    if chooser.random() < 0.5:
+        bot.press(FORWARD if chooser.random() < 0.85 else BACKWARD)
+    if chooser.random() < 0.2:
+        bot.press(LEFT if chooser.random() < 0.5 else RIGHT)
+    if chooser.random() < 0.03:
+        bot.press(FIRE)
+
+def run_stage(address, count, seconds, chooser):
+    bots = [GameClient(address) for _ in range(count)]
+    for bot in bots:
+        bot.connect()
+    query_stats(address, reset=True)
+    for bot in bots:
+        bot.bytes_received = 0
+        bot.snapshots_received = 0
+
+    start = next_tick = time.perf_counter()
+    late_ticks = 0
+    while time.perf_counter() - start < seconds:
+        for bot in bots:
+            drive(bot, chooser)
+            bot.poll()
+        next_tick += TICK_DT
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late_ticks += 1
+    elapsed = time.perf_counter() - start
+
+    server = query_stats(address)
+    for bot in bots:
+        bot.close()
+    return {
+        'clients': count,
+        'seconds': round(elapsed, 3),
+        'server': server,
+        'received_bytes_per_sec_per_client': round(sum(b.bytes_received for b in bots) / elapsed / count, 1),
+        'snapshots_per_sec_per_client': round(sum(b.snapshots_received for b in bots) / elapsed / count, 1),
+        'late_bot_ticks': late_ticks
+    }
+
+def start_server(port, difficulty):
+    process = subprocess.Popen([sys.executable, 'network.py', '--port', str(port), '--difficulty', difficulty],
+                               stdout=subprocess.DEVNULL)
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        try:
+            query_stats(('127.0.0.1', port), timeout=0.2)
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+    process.kill()
+    raise RuntimeError("the server did not start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure Tank Wars server tick time against the number of clients")
+    parser.add_argument('--server', metavar='HOST:PORT', help="use a running server instead of starting one")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port for the server started here")
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='hard')
+    parser.add_argument('--clients', default='1,2,4,8,16,32', help="comma-separated bot counts, one stage each")
+    parser.add_argument('--seconds', type=float, default=5.0, help="length of each stage")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', metavar='PATH', help="write the results as JSON to PATH")
+    args = parser.parse_args()
+
+    process = None
+    if args.server:
+        address = parse_address(args.server)
+    else:
+        address = ('127.0.0.1', args.port)
+        process = start_server(args.port, args.difficulty)
+
+    chooser = random.Random(args.seed)
+    results = []
+    try:
+        for count in [int(c) for c in args.clients.split(',')]:
+            result = run_stage(address, count, args.seconds, chooser)
+            results.append(result)
+            tick = result['server'].get('tick_ms', {})
+            print(f"{count:4d} clients  tick p50 {tick.get('p50', 0):6.3f} ms  p99 {tick.get('p99', 0):6.3f} ms  "
+                  f"max {tick.get('max', 0):6.3f} ms  {result['received_bytes_per_sec_per_client'] / 1024:5.2f} KB/s per client  "
+                  f"{result['server']['projectiles']} projectiles")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
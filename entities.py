@@ -0,0 +1,152 @@
+class Entity:
+    # Base for the game's entity types. fields names what an entity holds;
+    # the slotted types keep them in __slots__, so instances carry no
+    # per-object dict and every field always exists. Item access and get()
+    # map onto the fields, so code written against the old dict entities
+    # keeps working; hot paths use the attributes directly.
+    __slots__ = ()
+    fields = ()
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.fields else default
+
+    def keys(self):
+        return self.fields
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.fields}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.fields)
+
+    # entities are keyed by identity (id(tank), grid items), not by value
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={getattr(self, key)!r}" for key in self.fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Tank(Entity):
+    # Handle on a tank entity in a World (see world.py): player, enemy or
+    # boss. The fields live in the world's packed columns, so systems can
+    # work on every tank at once while one tank still reads like an
+    # object. controlled is the tag for a tank driven by a network client
+    # instead of the enemy AI.
+    __slots__ = ('world', 'entity')
+    fields = ('position', 'rotation', 'health', 'controlled')
+
+    def __init__(self, world, entity):
+        self.world = world
+        self.entity = entity
+
+    @property
+    def position(self):
+        world = self.world
+        return tuple(world.columns['position'][world.rows[self.entity]].tolist())
+
+    @position.setter
+    def position(self, value):
+        world = self.world
+        world.columns['position'][world.rows[self.entity]] = value
+
+    @property
+    def rotation(self):
+        world = self.world
+        return float(world.columns['rotation'][world.rows[self.entity]])
+
+    @rotation.setter
+    def rotation(self, value):
+        world = self.world
+        world.columns['rotation'][world.rows[self.entity]] = value
+
+    @property
+    def health(self):
+        world = self.world
+        return int(world.columns['health'][world.rows[self.entity]])
+
+    @health.setter
+    def health(self, value):
+        world = self.world
+        world.columns['health'][world.rows[self.entity]] = value
+
+    @property
+    def controlled(self):
+        return self.world.has(self.entity, 'controlled')
+
+    @controlled.setter
+    def controlled(self, value):
+        if value:
+            self.world.add(self.entity, 'controlled')
+        else:
+            self.world.discard(self.entity, 'controlled')
+
+
+class Explosion(Entity):
+    __slots__ = fields = ('position', 'lifetime')
+
+    def __init__(self, position, lifetime):
+        self.position = position
+        self.lifetime = lifetime
+
+
+class Obstacle(Entity):
+    # Every obstacle has every field; ones that do not apply keep their
+    # defaults. toggle_time is None on obstacles that never blink.
+    __slots__ = fields = ('type', 'x', 'z', 'size', 'dynamic', 'speed', 'direction', 'direction_change_time',
+                          'visible', 'toggle_time', 'next_toggle', 'rotation', 'rotation_speed')
+
+    def __init__(self, type, x, z, size, dynamic=False, speed=0.0, direction=(0, 0), direction_change_time=0.0,
+                 visible=True, toggle_time=None, next_toggle=0.0, rotation=0, rotation_speed=0):
+        self.type = type
+        self.x = x
+        self.z = z
+        self.size = size
+        self.dynamic = dynamic
+        self.speed = speed
+        self.direction = direction
+        self.direction_change_time = direction_change_time
+        self.visible = visible
+        self.toggle_time = toggle_time
+        self.next_toggle = next_toggle
+        self.rotation = rotation
+        self.rotation_speed = rotation_speed
+
+
+class Pool:
+    # Free list for one entity type: take() reinitialises a released
+    # instance when there is one and only allocates when the list is empty.
+
+    def __init__(self, kind, limit=1024):
+        self.kind = kind
+        self.limit = limit
+        self.free = []
+
+    def take(self, *args):
+        if self.free:
+            entity = self.free.pop()
+            entity.__init__(*args)
+            return entity
+        return self.kind(*args)
+
+    def release(self, entity):
+        if len(self.free) < self.limit:
+            self.free.append(entity)
+
+    def release_all(self, entities):
+        self.free.extend(entities[:max(self.limit - len(self.free), 0)])
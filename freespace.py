@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+
+class FreeSpace:
+    # Raster of the arena floor (x/z plane) marking where a tank can stand.
+    # Each cell counts the obstacles within reach of any part of it, so any
+    # point of a cell with a zero count is clear of every obstacle. place()
+    # and remove() only note the change, so obstacles moving every tick
+    # cost a dict write each; the pending changes are stamped in, and the
+    # free cells of each area re-listed, the next time a point is drawn.
+    # A draw then picks a free cell from the list and a point inside it.
+    # Points near the given tanks are drawn again a few times before one
+    # exact pass over the area rasterises them out as well.
+
+    def __init__(self, half_extent, cell_size, attempts=16):
+        self.half_extent = half_extent
+        self.cell_size = cell_size
+        self.size = int(math.ceil(2 * half_extent / cell_size))
+        self.attempts = attempts
+        self.counts = np.zeros((self.size, self.size), dtype=np.int32)
+        self.stamps = {}
+        self.pending = {}
+        # area -> (cell rows, cell columns, flat indices of its free cells)
+        self._free = {}
+
+    def _stamp(self, x, z, radius):
+        # The cells with some point closer than radius to (x, z), as a
+        # window of the raster and a mask over it.
+        cs = self.cell_size
+        u = (x + self.half_extent) / cs
+        v = (z + self.half_extent) / cs
+        r = radius / cs
+        col0 = max(int(math.floor(u - r)), 0)
+        col1 = min(int(math.floor(u + r)) + 1, self.size)
+        row0 = max(int(math.floor(v - r)), 0)
+        row1 = min(int(math.floor(v + r)) + 1, self.size)
+        if col0 >= col1 or row0 >= row1:
+            return None
+        cols = np.arange(col0, col1)
+        rows = np.arange(row0, row1)
+        dx = np.maximum(np.maximum(cols - u, u - cols - 1), 0)
+        dz = np.maximum(np.maximum(rows - v, v - rows - 1), 0)
+        mask = dz[:, None] ** 2 + dx[None, :] ** 2 < r * r
+        return row0, row1, col0, col1, mask
+
+    def place(self, key, x, z, radius):
+        self.pending[key] = (x, z, radius)
+
+    def remove(self, key):
+        self.pending[key] = None
+
+    def clear(self):
+        self.counts[:] = 0
+        self.stamps.clear()
+        self.pending.clear()
+        self._free.clear()
+
+    def _refresh(self):
+        counts = self.counts
+        for key, target in self.pending.items():
+            old = self.stamps.pop(key, None)
+            if old is not None:
+                row0, row1, col0, col1, mask = old
+                counts[row0:row1, col0:col1] -= mask
+            stamp = self._stamp(*target) if target is not None else None
+            if stamp is not None:
+                row0, row1, col0, col1, mask = stamp
+                counts[row0:row1, col0:col1] += mask
+                self.stamps[key] = stamp
+        self.pending.clear()
+        self._free.clear()
+
+    def _area(self, area):
+        # the cells lying wholly inside area = (x0, x1, z0, z1)
+        x0, x1, z0, z1 = area
+        cs = self.cell_size
+        h = self.half_extent
+        cols = (max(math.ceil((x0 + h) / cs), 0), min(math.floor((x1 + h) / cs), self.size))
+        rows = (max(math.ceil((z0 + h) / cs), 0), min(math.floor((z1 + h) / cs), self.size))
+        return rows, cols
+
+    def free_cells(self, area):
+        if self.pending:
+            self._refresh()
+        cached = self._free.get(area)
+        if cached is None:
+            rows, cols = self._area(area)
+            window = self.counts[rows[0]:rows[1], cols[0]:cols[1]]
+            cached = (rows, cols, np.flatnonzero(window == 0))
+            self._free[area] = cached
+        return cached
+
+    def points(self, rng, area, count):
+        # count uniform points of the free space in area, drawn in one go
+        # from a NumPy generator, or None when there is none
+        rows, cols, free = self.free_cells(area)
+        if len(free) == 0:
+            return None
+        row, col = np.divmod(free[rng.integers(len(free), size=count)], cols[1] - cols[0])
+        x = (cols[0] + col + rng.random(count)) * self.cell_size - self.half_extent
+        z = (rows[0] + row + rng.random(count)) * self.cell_size - self.half_extent
+        return np.stack((x, z), axis=1)
+
+    def sample(self, rng, area, avoid=(), radius=0.0):
+        # A uniform point of the free space in area at least radius from
+        # every (x, z) in avoid, or None when there is none.
+        rows, cols, free = self.free_cells(area)
+        if len(free) == 0:
+            return None
+        cs = self.cell_size
+        h = self.half_extent
+        width = cols[1] - cols[0]
+        avoid = np.asarray(avoid, dtype=float).reshape(-1, 2)
+        r2 = radius * radius
+        for _ in range(self.attempts):
+            row, col = divmod(int(free[rng.randrange(len(free))]), width)
+            x = (cols[0] + col + rng.random()) * cs - h
+            z = (rows[0] + row + rng.random()) * cs - h
+            if len(avoid) == 0 or (((avoid[:, 0] - x) ** 2 + (avoid[:, 1] - z) ** 2) >= r2).all():
+                return (x, 0, z)
+
+        # crowded: rasterise the avoided discs too and draw from what is left
+        window = self.counts[rows[0]:rows[1], cols[0]:cols[1]] == 0
+        for ax, az in avoid.tolist():
+            stamp = self._stamp(ax, az, radius)
+            if stamp is None:
+                continue
+            row0, row1, col0, col1, mask = stamp
+            row0, row1 = max(row0, rows[0]), min(row1, rows[1])
+            col0, col1 = max(col0, cols[0]), min(col1, cols[1])
+            if row0 < row1 and col0 < col1:
+                cut = mask[row0 - stamp[0]:row1 - stamp[0], col0 - stamp[2]:col1 - stamp[2]]
+                window[row0 - rows[0]:row1 - rows[0], col0 - cols[0]:col1 - cols[0]] &= ~cut
+        left = np.flatnonzero(window)
+        if len(left) == 0:
+            return None
+        row, col = divmod(int(left[rng.randrange(len(left))]), width)
+        return ((cols[0] + col + rng.random()) * cs - h, 0, (rows[0] + row + rng.random()) * cs - h)
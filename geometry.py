@@ -0,0 +1,68 @@
+from OpenGL.GL import *
+from OpenGL.GLUT import *
+from OpenGL.GLU import *
+
+
+# Every mesh is tessellated once into a display list on first use and replayed
+# with a single glCallList afterwards. Keys carry the tessellation, so each
+# level of detail of a primitive gets its own list. Lists belong to the GL
+# context they were built in; call release_geometry() before it goes away.
+
+_quadric = None
+_display_lists = {}
+_static_lists = {}
+
+
+def _shared_quadric():
+    global _quadric
+    if _quadric is None:
+        _quadric = gluNewQuadric()
+    return _quadric
+
+def _call_cached(key, build):
+    display_list = _display_lists.get(key)
+    if display_list is None:
+        display_list = glGenLists(1)
+        glNewList(display_list, GL_COMPILE)
+        build()
+        glEndList()
+        _display_lists[key] = display_list
+    glCallList(display_list)
+
+def draw_static(name, version, build):
+    # One list per name, rebuilt only when version changes (e.g. when the
+    # arena is resized); the stale list is deleted.
+    entry = _static_lists.get(name)
+    if entry is None or entry[0] != version:
+        if entry is not None:
+            glDeleteLists(entry[1], 1)
+        display_list = glGenLists(1)
+        glNewList(display_list, GL_COMPILE)
+        build()
+        glEndList()
+        entry = (version, display_list)
+        _static_lists[name] = entry
+    glCallList(entry[1])
+
+def draw_cylinder(base, top, height, slices, stacks):
+    _call_cached(('cylinder', base, top, height, slices, stacks),
+                 lambda: gluCylinder(_shared_quadric(), base, top, height, slices, stacks))
+
+def draw_cube(size):
+    _call_cached(('cube', size), lambda: glutSolidCube(size))
+
+def draw_torus(inner_radius, outer_radius, sides, rings):
+    _call_cached(('torus', inner_radius, outer_radius, sides, rings),
+                 lambda: glutSolidTorus(inner_radius, outer_radius, sides, rings))
+
+def release_geometry():
+    global _quadric
+    for display_list in _display_lists.values():
+        glDeleteLists(display_list, 1)
+    _display_lists.clear()
+    for _, display_list in _static_lists.values():
+        glDeleteLists(display_list, 1)
+    _static_lists.clear()
+    if _quadric is not None:
+        gluDeleteQuadric(_quadric)
+        _quadric = None
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.GLUT import *
+
+
+# HUD text drawn from a glyph atlas. The first prepare_text() call of a
+# frame rasterises the printable ASCII glyphs of the GLUT font once into a
+# texture. Each distinct string is laid out once into a display list of
+# textured quads, so redrawing unchanged text is one glCallList. Until the
+# atlas exists, or if it cannot be built, text falls back to a single
+# glutBitmapString call per string.
+
+FONT = GLUT_BITMAP_HELVETICA_18
+FIRST_CHAR = 32
+LAST_CHAR = 126
+ATLAS_COLUMNS = 16
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+MAX_CACHED_STRINGS = 128
+
+_atlas = {
+    'texture': None,
+    'failed': False,
+    'cell_width': 0,
+    'cell_height': 0,
+    'descent': 0,
+    'advances': {},
+    'tex_size': (0, 0)
+}
+_layouts = OrderedDict()
+
+
+def _next_power_of_two(value):
+    size = 1
+    while size < value:
+        size *= 2
+    return size
+
+def _build_atlas():
+    # Must run before the frame clears the back buffer: the glyphs are drawn
+    # into its bottom-left corner and read straight back.
+    advances = {code: glutBitmapWidth(FONT, code) for code in range(FIRST_CHAR, LAST_CHAR + 1)}
+    height = glutBitmapHeight(FONT)
+    cell_width = max(advances.values()) + 2
+    cell_height = height + 2
+    descent = height // 4
+    rows = (LAST_CHAR - FIRST_CHAR) // ATLAS_COLUMNS + 1
+    width = cell_width * ATLAS_COLUMNS
+    total_height = cell_height * rows
+
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glOrtho(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    glLoadIdentity()
+    glClearColor(0.0, 0.0, 0.0, 0.0)
+    glClear(GL_COLOR_BUFFER_BIT)
+    glColor3f(1, 1, 1)
+    for code in range(FIRST_CHAR, LAST_CHAR + 1):
+        slot = code - FIRST_CHAR
+        glRasterPos2i((slot % ATLAS_COLUMNS) * cell_width + 1, (slot // ATLAS_COLUMNS) * cell_height + descent + 1)
+        glutBitmapCharacter(FONT, code)
+    glPixelStorei(GL_PACK_ALIGNMENT, 1)
+    pixels = glReadPixels(0, 0, width, total_height, GL_RED, GL_UNSIGNED_BYTE)
+    glClear(GL_COLOR_BUFFER_BIT)
+    glPopMatrix()
+    glMatrixMode(GL_PROJECTION)
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
+
+    tex_width = _next_power_of_two(width)
+    tex_height = _next_power_of_two(total_height)
+    alpha = np.zeros((tex_height, tex_width), dtype=np.uint8)
+    alpha[:total_height, :width] = np.frombuffer(pixels, dtype=np.uint8).reshape(total_height, width)
+    upload_atlas(alpha, advances, cell_width, cell_height, descent)
+
+def upload_atlas(alpha, advances, cell_width, cell_height, descent):
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA, alpha.shape[1], alpha.shape[0], 0, GL_ALPHA, GL_UNSIGNED_BYTE, alpha)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    _atlas.update({
+        'texture': texture,
+        'cell_width': cell_width,
+        'cell_height': cell_height,
+        'descent': descent,
+        'advances': advances,
+        'tex_size': (alpha.shape[1], alpha.shape[0])
+    })
+
+def prepare_text():
+    if _atlas['texture'] is not None or _atlas['failed']:
+        return
+    try:
+        _build_atlas()
+    except Exception:
+        _atlas['failed'] = True
+
+def _compile_layout(text):
+    cell_width = _atlas['cell_width']
+    cell_height = _atlas['cell_height']
+    descent = _atlas['descent']
+    tex_width, tex_height = _atlas['tex_size']
+    advances = _atlas['advances']
+    display_list = glGenLists(1)
+    glNewList(display_list, GL_COMPILE)
+    glBegin(GL_QUADS)
+    pen = 0
+    for char in text:
+        code = ord(char)
+        if code not in advances:
+            code = ord('?')
+        slot = code - FIRST_CHAR
+        u0 = (slot % ATLAS_COLUMNS) * cell_width / tex_width
+        v0 = (slot // ATLAS_COLUMNS) * cell_height / tex_height
+        u1 = u0 + cell_width / tex_width
+        v1 = v0 + cell_height / tex_height
+        x0 = pen - 1
+        y0 = -descent - 1
+        glTexCoord2f(u0, v0)
+        glVertex2f(x0, y0)
+        glTexCoord2f(u1, v0)
+        glVertex2f(x0 + cell_width, y0)
+        glTexCoord2f(u1, v1)
+        glVertex2f(x0 + cell_width, y0 + cell_height)
+        glTexCoord2f(u0, v1)
+        glVertex2f(x0, y0 + cell_height)
+        pen += advances[code]
+    glEnd()
+    glEndList()
+    return display_list
+
+def _cached_layout(text):
+    display_list = _layouts.get(text)
+    if display_list is not None:
+        _layouts.move_to_end(text)
+        return display_list
+    display_list = _compile_layout(text)
+    _layouts[text] = display_list
+    if len(_layouts) > MAX_CACHED_STRINGS:
+        _, evicted = _layouts.popitem(last=False)
+        glDeleteLists(evicted, 1)
+    return display_list
+
+def draw_text(text, x, y, color=(1, 1, 1)):
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glOrtho(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT, -1, 1)
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    glLoadIdentity()
+    glColor3f(*color)
+    if _atlas['texture'] is not None:
+        glTranslatef(x, y, 0)
+        glEnable(GL_TEXTURE_2D)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glBindTexture(GL_TEXTURE_2D, _atlas['texture'])
+        glCallList(_cached_layout(text))
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_BLEND)
+        glDisable(GL_TEXTURE_2D)
+    else:
+        glRasterPos2i(x, y)
+        glutBitmapString(FONT, text.encode('ascii', 'replace'))
+    glPopMatrix()
+    glMatrixMode(GL_PROJECTION)
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
+
+def release_text():
+    for display_list in _layouts.values():
+        glDeleteLists(display_list, 1)
+    _layouts.clear()
+    if _atlas['texture'] is not None:
+        glDeleteTextures([_atlas['texture']])
+        _atlas['texture'] = None
+    _atlas['failed'] = False
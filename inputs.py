@@ -0,0 +1,48 @@
+import time
+from collections import deque
+
+from replay import KEY, KEY_UP
+
+
+class InputBuffer:
+    # Window input in arrival order, each event stamped with the time it
+    # arrived. The frame loop hands every tick the events that arrived
+    # before it with take(), so an input reaches the simulation on the first
+    # tick after it happened. Events are (kind, a, b) as in replay.py, and
+    # held lists the keys down as of the events taken so far, in press order.
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.events = deque()
+        self.held = []
+
+    def push(self, kind, a, b=0):
+        self.events.append((self.clock(), kind, a, b))
+
+    def take(self, until):
+        events = self.events
+        taken = []
+        while events and events[0][0] <= until:
+            _, kind, a, b = events.popleft()
+            if kind == KEY and a not in self.held:
+                self.held.append(a)
+            elif kind == KEY_UP and a in self.held:
+                self.held.remove(a)
+            taken.append((kind, a, b))
+        return taken
+
+    def release(self):
+        # Key releases for every key that is down once the events waiting
+        # are taken, for when the window stops receiving the real ones.
+        held = list(self.held)
+        for _, kind, a, _ in self.events:
+            if kind == KEY and a not in held:
+                held.append(a)
+            elif kind == KEY_UP and a in held:
+                held.remove(a)
+        for a in held:
+            self.push(KEY_UP, a)
+
+    def clear(self):
+        self.events.clear()
+        self.held.clear()
@@ -0,0 +1,243 @@
+import math
+import heapq
+from collections import deque
+
+import numpy as np
+
+
+# (row, column) steps to the eight neighbours; rows run along z, columns along x
+OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+STEPS = np.array(OFFSETS, dtype=float)
+STEP_LENGTHS = np.hypot(STEPS[:, 0], STEPS[:, 1])
+ANGLES = np.degrees(np.arctan2(STEPS[:, 1], STEPS[:, 0])) % 360
+UNREACHED = 1 << 30
+
+
+class FlowField:
+    # Navigation grid over the arena floor (x/z plane) holding a breadth-first
+    # flow field toward one goal cell. An obstacle blocks every cell whose
+    # centre lies inside its footprint square, and each cell counts the
+    # obstacles on it, so moving or hiding one only touches the cells it
+    # leaves and enters. A new goal cell means a full breadth-first solve;
+    # cells that were blocked or freed since the last update are repaired
+    # in place, re-solving only the cells whose distance depended on them.
+    # Either way the heading table is refreshed, and looking up a heading
+    # is then one array index per position.
+
+    def __init__(self, half_extent, cell_size):
+        self.half_extent = half_extent
+        self.cell_size = cell_size
+        self.size = int(math.ceil(2 * half_extent / cell_size))
+        # obstacles on each cell, row by row
+        self.counts = [0] * (self.size * self.size)
+        self.spans = {}
+        self.goal = None
+        self.dist = None
+        self.flipped = set()
+        self.solves = 0
+        self.repairs = 0
+        # heading in degrees toward the goal per cell, NaN where there is none
+        self.heading = np.full(self.size * self.size, np.nan)
+        self._alignment = None
+        self._neighbours()
+
+    def _neighbours(self):
+        # Every step carries the two cells it passes beside, so a diagonal
+        # is not taken past a blocked corner; a straight step names its
+        # target twice. The same steps are kept as lists for the searches
+        # and as tables, with the cell count standing for off the grid, for
+        # the heading pass.
+        size = self.size
+        outside = size * size
+        self._steps = []
+        self._table = np.full((outside, len(OFFSETS)), outside)
+        self._beside = (np.full((outside, len(OFFSETS)), outside), np.full((outside, len(OFFSETS)), outside))
+        for row in range(size):
+            for col in range(size):
+                i = row * size + col
+                steps = []
+                for k, (dr, dc) in enumerate(OFFSETS):
+                    r, c = row + dr, col + dc
+                    if not (0 <= r < size and 0 <= c < size):
+                        continue
+                    step = (r * size + c, r * size + col, row * size + c) if dr and dc else (r * size + c,) * 3
+                    steps.append(step)
+                    self._table[i, k] = step[0]
+                    self._beside[0][i, k] = step[1]
+                    self._beside[1][i, k] = step[2]
+                self._steps.append(steps)
+
+    def cell(self, x, z):
+        last = self.size - 1
+        col = min(max(int((x + self.half_extent) // self.cell_size), 0), last)
+        row = min(max(int((z + self.half_extent) // self.cell_size), 0), last)
+        return row, col
+
+    def _span(self, x, z, radius):
+        # Cells whose centres fall inside the square of half-width radius,
+        # in cell units measured from the centre of the first cell.
+        u = (x + self.half_extent) / self.cell_size - 0.5
+        v = (z + self.half_extent) / self.cell_size - 0.5
+        r = radius / self.cell_size
+        col0 = max(math.ceil(u - r), 0)
+        col1 = min(math.floor(u + r), self.size - 1)
+        row0 = max(math.ceil(v - r), 0)
+        row1 = min(math.floor(v + r), self.size - 1)
+        if col0 > col1 or row0 > row1:
+            return None
+        return row0, row1 + 1, col0, col1 + 1
+
+    def _mark(self, span, delta):
+        if span is None:
+            return
+        row0, row1, col0, col1 = span
+        counts = self.counts
+        # a count that ends at 1 going up, or 0 going down, flipped the cell
+        flipped = 1 if delta > 0 else 0
+        track = self.dist is not None
+        for row in range(row0, row1):
+            for i in range(row * self.size + col0, row * self.size + col1):
+                counts[i] += delta
+                if track and counts[i] == flipped:
+                    self.flipped.add(i)
+
+    def place(self, key, x, z, radius):
+        span = self._span(x, z, radius)
+        old = self.spans.get(key, False)
+        if span == old:
+            return
+        if old:
+            self._mark(old, -1)
+        self._mark(span, 1)
+        self.spans[key] = span
+
+    def remove(self, key):
+        if key in self.spans:
+            self._mark(self.spans.pop(key), -1)
+
+    def clear(self):
+        # the next update solves from scratch, so flips need no tracking
+        self.counts = [0] * (self.size * self.size)
+        self.spans.clear()
+        self.flipped.clear()
+        self.dist = None
+
+    def _blocked(self):
+        # the goal cell is always open, even with an obstacle on its centre
+        blocked = [count > 0 for count in self.counts]
+        blocked[self.goal[0] * self.size + self.goal[1]] = False
+        return blocked
+
+    def update(self, goal_x, goal_z):
+        goal = self.cell(goal_x, goal_z)
+        if goal != self.goal or self.dist is None:
+            if goal != self.goal:
+                self.goal = goal
+                self._update_alignment()
+            blocked = self._blocked()
+            self._solve(blocked)
+        elif self.flipped:
+            blocked = self._blocked()
+            self._repair(blocked)
+        else:
+            return
+        self.flipped.clear()
+        self._update_headings(blocked)
+
+    def _solve(self, blocked):
+        size = self.size
+        goal = self.goal[0] * size + self.goal[1]
+        steps = self._steps
+        dist = [UNREACHED] * (size * size)
+        dist[goal] = 0
+        queue = deque([goal])
+        while queue:
+            i = queue.popleft()
+            d = dist[i] + 1
+            for j, a, b in steps[i]:
+                if dist[j] == UNREACHED and not (blocked[j] or blocked[a] or blocked[b]):
+                    dist[j] = d
+                    queue.append(j)
+        self.dist = dist
+        self.solves += 1
+
+    def _repair(self, blocked):
+        # Changing a cell also changes the diagonal steps past its corners,
+        # so the cells around it are checked as well.
+        dist = self.dist
+        steps = self._steps
+        goal = self.goal[0] * self.size + self.goal[1]
+        touched = set(self.flipped)
+        for i in self.flipped:
+            touched.update(step[0] for step in steps[i])
+
+        # Cells that lost every neighbour one step closer to the goal are
+        # orphaned, and so in turn is anything that relied on them.
+        orphans = set()
+        queue = deque(touched)
+        while queue:
+            i = queue.popleft()
+            if i == goal or dist[i] == UNREACHED:
+                continue
+            d = dist[i] - 1
+            if not blocked[i] and any(dist[j] == d and not (blocked[j] or blocked[a] or blocked[b])
+                                      for j, a, b in steps[i]):
+                continue
+            dist[i] = UNREACHED
+            orphans.add(i)
+            queue.extend(step[0] for step in steps[i])
+
+        # Then distances flow back in from the settled cells around them,
+        # nearest first.
+        heap = []
+        for i in touched | orphans:
+            if blocked[i] or i == goal:
+                continue
+            best = dist[i]
+            for j, a, b in steps[i]:
+                if dist[j] + 1 < best and not (blocked[j] or blocked[a] or blocked[b]):
+                    best = dist[j] + 1
+            if best < dist[i]:
+                dist[i] = best
+                heap.append((best, i))
+        heapq.heapify(heap)
+        while heap:
+            d, i = heapq.heappop(heap)
+            if d != dist[i]:
+                continue
+            d += 1
+            for j, a, b in steps[i]:
+                if d < dist[j] and not (blocked[j] or blocked[a] or blocked[b]):
+                    dist[j] = d
+                    heapq.heappush(heap, (d, j))
+        self.repairs += 1
+
+    def _update_alignment(self):
+        # How well each step lines up with the straight line from the cell
+        # to the goal, scaled to break ties between equally near neighbours
+        # only; open ground then gives direct paths instead of staircases.
+        rows, cols = np.divmod(np.arange(self.size * self.size), self.size)
+        to_row = (self.goal[0] - rows)[:, None]
+        to_col = (self.goal[1] - cols)[:, None]
+        length = np.maximum(np.hypot(to_row, to_col), 1)
+        self._alignment = 0.25 * (to_row * STEPS[:, 0] + to_col * STEPS[:, 1]) / (STEP_LENGTHS * length)
+
+    def _update_headings(self, blocked):
+        # Each cell steps to its nearest reachable neighbour.
+        distance = np.array(self.dist + [UNREACHED], dtype=float)
+        distance[distance >= UNREACHED] = np.inf
+        walls = np.array(blocked + [True])
+        scores = distance[self._table]
+        scores[walls[self._beside[0]] | walls[self._beside[1]]] = np.inf
+        scores -= self._alignment
+        best = scores.argmin(axis=1)
+        best_score = scores[np.arange(len(best)), best]
+        self.heading = np.where(np.isfinite(best_score) & (best_score < distance[:-1]), ANGLES[best], np.nan)
+
+    def headings(self, xs, zs):
+        # Heading toward the goal at each position, NaN in the goal cell or
+        # where the goal cannot be reached.
+        last = self.size - 1
+        cols = np.minimum(np.maximum(((xs + self.half_extent) // self.cell_size).astype(int), 0), last)
+        rows = np.minimum(np.maximum(((zs + self.half_extent) // self.cell_size).astype(int), 0), last)
+        return self.heading[rows * self.size + cols]
@@ -0,0 +1,628 @@
+import json
+import time
+import zlib
+import socket
+import struct
+from collections import deque, OrderedDict
+
+import numpy as np
+
+from simulation import *
+from snapshot import FLAG_STATUSES, OBSTACLE_TYPES
+
+
+# UDP multiplayer. The server owns the simulation and every client drives one
+# tank by sending nothing but input counters: the ticks each movement key
+# was held and the shots fired. Every SNAPSHOT_TICKS ticks the server sends
+# each client the world, delta-encoded against the last snapshot that
+# client acknowledged: fixed-size blocks of quantised values travel as
+# differences from that base, projectiles as the ids spawned and removed
+# since it, explosions once when they appear, and the whole payload is
+# zlib-compressed. Clients extrapolate projectiles along their direction and
+# age explosions themselves, so neither costs bytes while it lasts.
+# Snapshots are numbered by server frame, which unlike game_state['tick']
+# does not restart with reset_game().
+
+DEFAULT_PORT = 27960
+SNAPSHOT_TICKS = 3
+HISTORY = 64                    # snapshots kept per client as delta bases
+CLIENT_TIMEOUT = 5.0            # seconds of silence before a client is dropped
+RESTART_TICKS = TICK_RATE * 3   # pause on the game over screen before a new round
+MAX_NEW_PROJECTILES = 1024      # per snapshot; the rest go out with the next one
+MAX_PRESSES = 30                # per input message, against replayed counters
+MAX_LAG = 0.25                  # seconds behind schedule before ticks are skipped
+POSITION_SCALE = 100.0
+ANGLE_SCALE = 65536 / 360.0
+
+HELLO = b'H'
+WELCOME = b'W'
+INPUT = b'I'
+SNAPSHOT = b'S'
+BYE = b'B'
+STATS = b'Q'
+
+FORWARD = 0
+BACKWARD = 1
+LEFT = 2
+RIGHT = 3
+FIRE = 4
+ACTIONS = 5
+
+FULL = 0
+DELTA = 1
+SAME = 2
+NO_BASE = 0xFFFFFFFF
+
+# tag, input sequence, last snapshot frame received, one wrapping counter per action
+INPUT_MSG = struct.Struct('<cII5H')
+# tag, tank index, ticks per second, ticks per snapshot
+WELCOME_MSG = struct.Struct('<cBHH')
+# frame, base frame (NO_BASE for a full snapshot), tank index of the receiver
+SNAPSHOT_HEAD = struct.Struct('<IIB')
+# FULL, DELTA or SAME, rows, bit per column sent as int8
+BLOCK_HEAD = struct.Struct('<BHI')
+COUNT = struct.Struct('<H')
+
+PROJECTILE = np.dtype([('id', '<u4'), ('x', '<i2'), ('z', '<i2'), ('angle', '<u2'), ('owner', 'u1')])
+# what a client keeps per projectile: the wire record plus the frame it was valid at
+TRACKED_PROJECTILE = np.dtype(PROJECTILE.descr + [('frame', '<u4')])
+
+# scores, state bits, winner, boss x/z/rotation/health, powerup x/z, portal
+# x/z/timer, flag status/x/z/holder/hold time, difficulty, game mode, enemy mode
+SCALARS = 21
+GAME_OVER_BIT = 1 << 0
+BOSS_BIT = 1 << 1
+POWERUP_BIT = 1 << 2
+PORTAL_BIT = 1 << 3
+SPEED_BOOST_BIT = 1 << 4
+FLAG_POSITION_BIT = 1 << 5
+TANK_COLUMNS = 4            # x, z, rotation, health
+OBSTACLE_COLUMNS = 4        # x, z, rotation, visible
+OBSTACLE_INFO_COLUMNS = 2   # type, size
+EXPLOSION_COLUMNS = 3       # x, z, lifetime
+
+
+def quantise_position(value):
+    return int(round(value * POSITION_SCALE))
+
+def quantise_angle(degrees):
+    return int(round(degrees * ANGLE_SCALE)) & 0xFFFF
+
+def _int16(rows, columns):
+    # wraps like the wire format, so angles above 180 degrees survive
+    return np.array(rows, dtype=np.int64).reshape(-1, columns).astype(np.int16)
+
+def quantise_scalars():
+    g = game_state
+    boss = g['boss']
+    powerup = g['powerup']
+    flag = g['flag']
+    bits = 0
+    for bit, on in ((GAME_OVER_BIT, g['game_over']), (BOSS_BIT, g['boss_active'] and boss is not None),
+                    (POWERUP_BIT, powerup is not None), (PORTAL_BIT, g['portal_active']),
+                    (SPEED_BOOST_BIT, g['powerup_speed_boost']), (FLAG_POSITION_BIT, flag['position'] is not None)):
+        if on:
+            bits |= bit
+    boss_values = (quantise_position(boss.position[0]), quantise_position(boss.position[2]),
+                   quantise_angle(boss.rotation), boss.health) if boss is not None else (0, 0, 0, 0)
+    powerup_pos = powerup['position'] if powerup is not None else (0, 0, 0)
+    flag_pos = flag['position'] if flag['position'] is not None else (0, 0, 0)
+    winner = g['winner']
+    holder = flag['holder']
+    return _int16([
+        g['scores'][0], g['scores'][1], bits, -1 if winner is None else winner,
+        *boss_values,
+        quantise_position(powerup_pos[0]), quantise_position(powerup_pos[2]),
+        quantise_position(g['portal_position'][0]), quantise_position(g['portal_position'][2]), g['portal_timer'],
+        FLAG_STATUSES.index(flag['status']), quantise_position(flag_pos[0]), quantise_position(flag_pos[2]),
+        -1 if holder is None else holder, int(round(flag['hold_timer'] * 100)),
+        DIFFICULTIES.index(g['difficulty']), GAME_MODES.index(g['game_mode']), ENEMY_MODES.index(g['enemy_mode'])
+    ], SCALARS)
+
+def quantise_tanks():
+    return _int16([(quantise_position(t.position[0]), quantise_position(t.position[2]),
+                    quantise_angle(t.rotation), t.health) for t in game_state['tanks']], TANK_COLUMNS)
+
+def quantise_obstacles():
+    return _int16([(quantise_position(obs.x), quantise_position(obs.z),
+                    quantise_angle(obs.rotation), obs.visible) for obs in obstacles],
+                  OBSTACLE_COLUMNS)
+
+def obstacle_info():
+    return _int16([(OBSTACLE_TYPES.index(obs.type), quantise_position(obs.size)) for obs in obstacles],
+                  OBSTACLE_INFO_COLUMNS)
+
+def quantise_projectiles(indices):
+    store = game_state['projectiles']
+    records = np.empty(len(indices), dtype=PROJECTILE)
+    records['id'] = store.ids[indices] & 0xFFFFFFFF
+    records['x'] = np.round(store.position[indices, 0] * POSITION_SCALE)
+    records['z'] = np.round(store.position[indices, 2] * POSITION_SCALE)
+    angles = np.degrees(np.arctan2(store.direction[indices, 0], store.direction[indices, 2]))
+    records['angle'] = np.round(angles * ANGLE_SCALE).astype(np.int64) & 0xFFFF
+    records['owner'] = store.owner[indices]
+    return records
+
+def quantise_explosions(max_age=None):
+    # Only explosions at most max_age ticks old; the client ages the rest.
+    return _int16([(quantise_position(e.position[0]), quantise_position(e.position[2]), e.lifetime)
+                   for e in game_state['explosions']
+                   if max_age is None or EXPLOSION_TICKS - e.lifetime <= max_age], EXPLOSION_COLUMNS)
+
+
+def _encode_block(parts, current, base):
+    # Rows of int16 values, sent column by column; a column whose values all
+    # fit in a byte is sent as int8, and a block equal to its base is empty.
+    # Returns whether the block went out in full rather than as a delta.
+    full = base is None or base.shape != current.shape
+    values = current if full else current - base
+    if not full and not values.any():
+        parts.append(BLOCK_HEAD.pack(SAME, len(current), 0))
+        return False
+    narrow = ((values >= -128) & (values <= 127)).all(axis=0)
+    mask = sum(1 << column for column in np.flatnonzero(narrow).tolist())
+    parts.append(BLOCK_HEAD.pack(FULL if full else DELTA, len(current), mask))
+    for column in range(values.shape[1]):
+        parts.append(values[:, column].astype('<i1' if narrow[column] else '<i2').tobytes())
+    return full
+
+def _decode_block(data, offset, columns, base):
+    kind, rows, mask = BLOCK_HEAD.unpack_from(data, offset)
+    offset += BLOCK_HEAD.size
+    if kind == SAME:
+        return base, False, offset
+    values = np.empty((rows, columns), dtype=np.int16)
+    for column in range(columns):
+        dtype = '<i1' if mask & (1 << column) else '<i2'
+        values[:, column] = np.frombuffer(data, dtype=dtype, count=rows, offset=offset)
+        offset += rows * np.dtype(dtype).itemsize
+    if kind == DELTA:
+        values = base + values
+    return values, kind == FULL, offset
+
+def _read_array(data, offset, dtype):
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    values = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+    return values, offset + values.nbytes
+
+
+class RemoteClient:
+
+    def __init__(self, address, tank_idx):
+        self.address = address
+        self.tank_idx = tank_idx
+        self.counters = [0] * ACTIONS
+        self.sequence = 0
+        self.acked = None
+        self.frames = OrderedDict()
+        self.last_heard = time.perf_counter()
+        self.bytes_sent = 0
+
+
+class GameServer:
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, difficulty='easy', game_mode='normal', seed_value=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.address = self.sock.getsockname()
+        self.clients = {}
+        self.frame = 0
+        self.game_over_frames = 0
+        self.tick_times = deque(maxlen=TICK_RATE * 60)
+        self.bytes_sent = 0
+        self.stats_started = time.perf_counter()
+
+        set_clock(tick_clock)
+        if seed_value is not None:
+            seed(seed_value)
+        set_difficulty(difficulty)
+        game_state['game_mode'] = game_mode
+        game_state['paused'] = False
+        reset_game()
+
+    def claim_tank(self):
+        tanks = game_state['tanks']
+        for idx, tank in enumerate(tanks):
+            if not tank.controlled:
+                tank.controlled = True
+                return idx
+        add_tank((0, 0, 0), 0, 100, controlled=True)
+        respawn_tank(len(tanks) - 1)
+        return len(tanks) - 1
+
+    def release_tank(self, client):
+        game_state['tanks'][client.tank_idx].controlled = False
+
+    def send(self, message, address):
+        try:
+            self.sock.sendto(message, address)
+        except OSError:
+            return 0
+        return len(message)
+
+    def handle(self, message, address):
+        tag = message[:1]
+        client = self.clients.get(address)
+        if tag == HELLO:
+            if client is None:
+                client = self.clients[address] = RemoteClient(address, self.claim_tank())
+            client.last_heard = time.perf_counter()
+            self.send(WELCOME_MSG.pack(WELCOME, client.tank_idx, TICK_RATE, SNAPSHOT_TICKS), address)
+        elif tag == INPUT and client is not None and len(message) == INPUT_MSG.size:
+            _, sequence, ack, *counters = INPUT_MSG.unpack(message)
+            client.last_heard = time.perf_counter()
+            if ack in client.frames and (client.acked is None or ack > client.acked):
+                client.acked = ack
+            if sequence <= client.sequence:
+                return
+            client.sequence = sequence
+            presses = [(new - old) & 0xFFFF for new, old in zip(counters, client.counters)]
+            client.counters = counters
+            self.apply_input(client.tank_idx, [min(count, MAX_PRESSES) for count in presses])
+        elif tag == BYE and client is not None:
+            self.release_tank(client)
+            del self.clients[address]
+        elif tag == STATS:
+            self.send(STATS + json.dumps(self.stats()).encode(), address)
+            if message[1:2] == b'r':
+                self.reset_stats()
+
+    def apply_input(self, tank_idx, presses):
+        # the same actions a local keypress or click performs
+        if game_state['game_over'] or game_state['tanks'][tank_idx].health <= 0:
+            return
+        for _ in range(presses[FORWARD]):
+            move_player(1, tank_idx)
+        for _ in range(presses[BACKWARD]):
+            move_player(-1, tank_idx)
+        if presses[LEFT] or presses[RIGHT]:
+            rotate_player(PLAYER_TURN_SPEED * (presses[LEFT] - presses[RIGHT]), tank_idx)
+        for _ in range(min(presses[FIRE], 3)):
+            fire_player(tank_idx)
+
+    def poll(self):
+        while True:
+            try:
+                message, address = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except ConnectionResetError:
+                continue
+            if message:
+                self.handle(message, address)
+
+    def encode_snapshot(self, client, scalars, tanks, obstacles_now, info):
+        base = client.frames.get(client.acked) if client.acked is not None else None
+        store = game_state['projectiles']
+        n = len(store)
+        ids = store.ids[:n] & 0xFFFFFFFF
+
+        parts = [SNAPSHOT_HEAD.pack(self.frame, NO_BASE if base is None else client.acked, client.tank_idx)]
+        _encode_block(parts, scalars, base['scalars'] if base else None)
+        _encode_block(parts, tanks, base['tanks'] if base else None)
+        if _encode_block(parts, obstacles_now, base['obstacles'] if base else None):
+            parts.append(info.tobytes())
+
+        known = base['projectiles'] if base else np.zeros(0, dtype=np.int64)
+        removed = known[~np.isin(known, ids)].astype('<u4')
+        fresh = np.flatnonzero(~np.isin(ids, known))[:MAX_NEW_PROJECTILES]
+        parts.append(COUNT.pack(len(removed)))
+        parts.append(removed.tobytes())
+        parts.append(COUNT.pack(len(fresh)))
+        parts.append(quantise_projectiles(fresh).tobytes())
+        # explosions only go out once; the client ages them itself
+        _encode_block(parts, quantise_explosions(None if base is None else self.frame - client.acked), None)
+
+        # what the client will know once this arrives
+        still_known = known[np.isin(known, ids)]
+        client.frames[self.frame] = {
+            'scalars': scalars,
+            'tanks': tanks,
+            'obstacles': obstacles_now,
+            'projectiles': np.union1d(still_known, ids[fresh])
+        }
+        while len(client.frames) > HISTORY:
+            client.frames.popitem(last=False)
+        return SNAPSHOT + zlib.compress(b''.join(parts), 1)
+
+    def broadcast(self):
+        if not self.clients:
+            return
+        scalars = quantise_scalars()
+        tanks = quantise_tanks()
+        obstacles_now = quantise_obstacles()
+        info = obstacle_info()
+        for client in self.clients.values():
+            message = self.encode_snapshot(client, scalars, tanks, obstacles_now, info)
+            sent = self.send(message, client.address)
+            client.bytes_sent += sent
+            self.bytes_sent += sent
+
+    def drop_silent_clients(self):
+        cutoff = time.perf_counter() - CLIENT_TIMEOUT
+        for address in [a for a, c in self.clients.items() if c.last_heard < cutoff]:
+            self.release_tank(self.clients.pop(address))
+
+    def tick(self):
+        start = time.perf_counter()
+        self.poll()
+        step()
+        self.frame += 1
+        if game_state['game_over']:
+            self.game_over_frames += 1
+            if self.game_over_frames >= RESTART_TICKS:
+                reset_game()
+                self.game_over_frames = 0
+        if self.frame % SNAPSHOT_TICKS == 0:
+            self.broadcast()
+        if self.frame % TICK_RATE == 0:
+            self.drop_silent_clients()
+        self.tick_times.append(time.perf_counter() - start)
+
+    def run(self, duration=None):
+        # Fixed-rate loop; ticks that fall behind run back to back.
+        start = next_tick = time.perf_counter()
+        while duration is None or time.perf_counter() - start < duration:
+            self.tick()
+            next_tick += TICK_DT
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -MAX_LAG:
+                next_tick = time.perf_counter()
+
+    def stats(self):
+        times = sorted(self.tick_times)
+        elapsed = max(time.perf_counter() - self.stats_started, 1e-9)
+        result = {
+            'clients': len(self.clients),
+            'tanks': len(game_state['tanks']),
+            'projectiles': len(game_state['projectiles']),
+            'ticks': len(times),
+            'bytes_per_sec': round(self.bytes_sent / elapsed, 1),
+            'bytes_per_sec_per_client': round(self.bytes_sent / elapsed / max(1, len(self.clients)), 1)
+        }
+        if times:
+            last = len(times) - 1
+            result['tick_ms'] = {
+                'mean': round(sum(times) / len(times) * 1000, 4),
+                'p50': round(times[last // 2] * 1000, 4),
+                'p95': round(times[int(last * 0.95)] * 1000, 4),
+                'p99': round(times[int(last * 0.99)] * 1000, 4),
+                'max': round(times[last] * 1000, 4)
+            }
+        return result
+
+    def reset_stats(self):
+        self.tick_times.clear()
+        self.bytes_sent = 0
+        self.stats_started = time.perf_counter()
+
+    def close(self):
+        self.sock.close()
+
+
+class GameClient:
+
+    def __init__(self, address):
+        self.server = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.tank_idx = None
+        self.counters = [0] * ACTIONS
+        self.sequence = 0
+        self.input_dirty = False
+        self.frames = OrderedDict()
+        self.latest = None
+        self.snapshot_ticks = SNAPSHOT_TICKS
+        self.bytes_received = 0
+        self.snapshots_received = 0
+
+    def connect(self, timeout=5.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.sock.sendto(HELLO, self.server)
+            wait_until = time.perf_counter() + 0.2
+            while time.perf_counter() < wait_until:
+                self.poll(send=False)
+                if self.tank_idx is not None:
+                    return self.tank_idx
+                time.sleep(0.005)
+        raise TimeoutError(f"no answer from {self.server[0]}:{self.server[1]}")
+
+    def press(self, action, times=1):
+        self.counters[action] = (self.counters[action] + times) & 0xFFFF
+        self.input_dirty = True
+
+    def send_input(self):
+        self.sequence += 1
+        ack = self.latest['frame'] if self.latest is not None else NO_BASE
+        self.sock.sendto(INPUT_MSG.pack(INPUT, self.sequence, ack, *self.counters), self.server)
+        self.input_dirty = False
+
+    def poll(self, send=True):
+        # Reads everything pending, then acks the newest snapshot and sends
+        # the input counters if either changed. Returns True on a new snapshot.
+        updated = False
+        while True:
+            try:
+                message = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue
+            self.bytes_received += len(message)
+            tag = message[:1]
+            if tag == WELCOME and len(message) == WELCOME_MSG.size:
+                _, self.tank_idx, _, self.snapshot_ticks = WELCOME_MSG.unpack(message)
+            elif tag == SNAPSHOT:
+                updated |= self.decode_snapshot(zlib.decompress(message[1:]))
+        if send and self.tank_idx is not None and (updated or self.input_dirty):
+            self.send_input()
+        return updated
+
+    def decode_snapshot(self, data):
+        frame, base_frame, tank_idx = SNAPSHOT_HEAD.unpack_from(data, 0)
+        if self.latest is not None and frame <= self.latest['frame']:
+            return False
+        base = None
+        if base_frame != NO_BASE:
+            base = self.frames.get(base_frame)
+            if base is None:
+                return False
+        offset = SNAPSHOT_HEAD.size
+        scalars, _, offset = _decode_block(data, offset, SCALARS, base['scalars'] if base else None)
+        tanks, _, offset = _decode_block(data, offset, TANK_COLUMNS, base['tanks'] if base else None)
+        obstacles_now, full, offset = _decode_block(data, offset, OBSTACLE_COLUMNS, base['obstacles'] if base else None)
+        if full:
+            info = np.frombuffer(data, dtype=np.int16, count=len(obstacles_now) * OBSTACLE_INFO_COLUMNS,
+                                 offset=offset).reshape(-1, OBSTACLE_INFO_COLUMNS)
+            offset += info.nbytes
+        else:
+            info = base['obstacle_info']
+        removed, offset = _read_array(data, offset, '<u4')
+        fresh, offset = _read_array(data, offset, PROJECTILE)
+        explosions, _, offset = _decode_block(data, offset, EXPLOSION_COLUMNS, None)
+        if base is not None:
+            aged = base['explosions'].copy()
+            aged[:, 2] -= frame - base_frame
+            explosions = np.concatenate([aged[aged[:, 2] > 0], explosions])
+
+        known = base['projectiles'] if base else np.zeros(0, dtype=TRACKED_PROJECTILE)
+        kept = known[~np.isin(known['id'], removed)]
+        added = np.zeros(len(fresh), dtype=TRACKED_PROJECTILE)
+        for name in PROJECTILE.names:
+            added[name] = fresh[name]
+        added['frame'] = frame
+        snapshot = {
+            'frame': frame,
+            'tank_idx': tank_idx,
+            'scalars': scalars,
+            'tanks': tanks,
+            'obstacles': obstacles_now,
+            'obstacle_info': info,
+            'projectiles': np.concatenate([kept, added]),
+            'explosions': explosions
+        }
+        self.frames[frame] = snapshot
+        while len(self.frames) > HISTORY:
+            self.frames.popitem(last=False)
+        self.latest = snapshot
+        self.snapshots_received += 1
+        return True
+
+    def apply(self):
+        # Writes the newest snapshot into game_state and obstacles so the
+        # normal draw code can show it. Nothing here is simulated.
+        snapshot = self.latest
+        if snapshot is None:
+            return
+        s = snapshot['scalars'][0].tolist()
+        bits = s[2]
+        game_state['scores'] = [s[0], s[1]]
+        game_state['game_over'] = bool(bits & GAME_OVER_BIT)
+        game_state['winner'] = None if s[3] < 0 else s[3]
+        game_state['boss_active'] = bool(bits & BOSS_BIT)
+        if bits & BOSS_BIT:
+            place_boss((s[4] / POSITION_SCALE, 0, s[5] / POSITION_SCALE), (s[6] & 0xFFFF) / ANGLE_SCALE, s[7])
+        else:
+            remove_boss()
+        game_state['powerup'] = {
+            'position': (s[8] / POSITION_SCALE, 0, s[9] / POSITION_SCALE),
+            'spawn_time': now()
+        } if bits & POWERUP_BIT else None
+        game_state['portal_position'] = (s[10] / POSITION_SCALE, 0, s[11] / POSITION_SCALE)
+        game_state['portal_timer'] = s[12]
+        game_state['portal_active'] = bool(bits & PORTAL_BIT)
+        game_state['powerup_speed_boost'] = bool(bits & SPEED_BOOST_BIT)
+        game_state['flag'] = {
+            'status': FLAG_STATUSES[s[13]],
+            'position': (s[14] / POSITION_SCALE, 0, s[15] / POSITION_SCALE) if bits & FLAG_POSITION_BIT else None,
+            'holder': None if s[16] < 0 else s[16],
+            'hold_timer': s[17] / 100
+        }
+        game_state['difficulty'] = DIFFICULTIES[s[18]]
+        game_state['game_mode'] = GAME_MODES[s[19]]
+        game_state['enemy_mode'] = ENEMY_MODES[s[20]]
+
+        tanks = game_state['tanks']
+        rows = snapshot['tanks'].tolist()
+        remove_tanks(len(rows))
+        while len(tanks) < len(rows):
+            add_tank((0, 0, 0), 0, 100)
+        for tank, (x, z, rotation, health) in zip(tanks, rows):
+            tank.position = (x / POSITION_SCALE, 0, z / POSITION_SCALE)
+            tank.rotation = (rotation & 0xFFFF) / ANGLE_SCALE
+            tank.health = health
+
+        info = snapshot['obstacle_info'].tolist()
+        if len(obstacles) != len(info) or any(obs.type != OBSTACLE_TYPES[kind] for obs, (kind, _) in zip(obstacles, info)):
+            obstacles[:] = [Obstacle(OBSTACLE_TYPES[kind], 0.0, 0.0, size / POSITION_SCALE)
+                            for kind, size in info]
+        for obs, (x, z, rotation, visible) in zip(obstacles, snapshot['obstacles'].tolist()):
+            obs.x = x / POSITION_SCALE
+            obs.z = z / POSITION_SCALE
+            obs.rotation = (rotation & 0xFFFF) / ANGLE_SCALE
+            obs.visible = bool(visible)
+
+        projectiles = snapshot['projectiles']
+        angles = np.radians(projectiles['angle'] / ANGLE_SCALE)
+        travelled = BULLET_SPEED * (snapshot['frame'] - projectiles['frame'].astype(np.int64))
+        positions = np.zeros((len(projectiles), 3))
+        directions = np.zeros((len(projectiles), 3))
+        directions[:, 0] = np.sin(angles)
+        directions[:, 2] = np.cos(angles)
+        positions[:, 0] = projectiles['x'] / POSITION_SCALE + directions[:, 0] * travelled
+        positions[:, 2] = projectiles['z'] / POSITION_SCALE + directions[:, 2] * travelled
+        store = game_state['projectiles']
+        store.clear()
+        store.add_many(positions, directions, projectiles['owner'])
+
+        game_state['explosions'] = [Explosion((x / POSITION_SCALE, 0, z / POSITION_SCALE), lifetime)
+                                    for x, z, lifetime in snapshot['explosions'].tolist()]
+
+    def close(self):
+        try:
+            self.sock.sendto(BYE, self.server)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def query_stats(address, reset=False, timeout=1.0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        sock.sendto(STATS + (b'r' if reset else b''), address)
+        message = sock.recv(65536)
+    finally:
+        sock.close()
+    return json.loads(message[1:])
+
+def parse_address(text):
+    host, _, port = text.partition(':')
+    return (host or '127.0.0.1', int(port) if port else DEFAULT_PORT)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a Tank Wars server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='easy')
+    parser.add_argument('--mode', choices=GAME_MODES, default='normal')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    server = GameServer(args.host, args.port, args.difficulty, args.mode, args.seed)
+    print(f"serving on {server.address[0]}:{server.address[1]}")
+    try:
+        server.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
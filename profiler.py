@@ -0,0 +1,141 @@
+import atexit
+import csv
+import json
+import time
+from collections import deque
+
+
+# Per-phase frame timing. Phases are timed with measure(); the totals of one
+# frame are closed by end_frame(), which keeps a rolling window per phase for
+# percentiles and a bounded history for dump(). While disabled, measure() is a
+# plain call and end_frame() returns at once. reset() can set another window
+# length until the next reset().
+
+WINDOW = 600
+MAX_HISTORY = 100000
+
+enabled = False
+dump_path = None
+
+_frame = {}
+_counts = {}
+_samples = {}
+_window = WINDOW
+_history = deque(maxlen=MAX_HISTORY)
+_frame_index = 0
+_frame_start = None
+_dump_registered = False
+
+
+def enable(path=None):
+    global enabled, dump_path, _dump_registered, _frame_start
+    enabled = True
+    _frame_start = time.perf_counter()
+    if path is not None:
+        dump_path = path
+    if dump_path is not None and not _dump_registered:
+        atexit.register(lambda: dump(dump_path))
+        _dump_registered = True
+
+def disable():
+    global enabled
+    enabled = False
+    _frame.clear()
+
+def measure(name, fn, *args):
+    if not enabled:
+        return fn(*args)
+    start = time.perf_counter()
+    result = fn(*args)
+    _frame[name] = _frame.get(name, 0.0) + time.perf_counter() - start
+    return result
+
+def add_time(name, seconds):
+    if enabled:
+        _frame[name] = _frame.get(name, 0.0) + seconds
+
+def end_frame(counts=None):
+    global _frame_index, _frame_start
+    if not enabled:
+        return
+    now = time.perf_counter()
+    if _frame_start is not None:
+        _frame['frame'] = now - _frame_start
+    _frame_start = now
+    for name, seconds in _frame.items():
+        window = _samples.get(name)
+        if window is None:
+            window = _samples[name] = deque(maxlen=_window)
+        window.append(seconds)
+    record = {'frame_index': _frame_index}
+    record.update({name: round(seconds * 1000.0, 4) for name, seconds in _frame.items()})
+    if counts:
+        record.update(counts)
+        _counts.update(counts)
+    _history.append(record)
+    _frame_index += 1
+    _frame.clear()
+
+def percentiles(name, points=(50, 95, 99)):
+    window = _samples.get(name)
+    if not window:
+        return None
+    ordered = sorted(window)
+    last = len(ordered) - 1
+    return tuple(ordered[min(last, int(round(p / 100.0 * last)))] for p in points)
+
+def phase_names():
+    return sorted(_samples, key=lambda name: -sum(_samples[name]))
+
+def report_lines(limit=None):
+    lines = []
+    for name in phase_names()[:limit]:
+        p50, p95, p99 = percentiles(name)
+        lines.append(f"{name}: {p50 * 1000:.2f} / {p95 * 1000:.2f} / {p99 * 1000:.2f} ms")
+    return lines
+
+def stats():
+    # mean and percentiles of every phase over its window, in milliseconds
+    result = {}
+    for name in phase_names():
+        window = _samples[name]
+        p50, p95, p99 = percentiles(name)
+        result[name] = {
+            'mean': round(sum(window) / len(window) * 1000.0, 4),
+            'p50': round(p50 * 1000.0, 4),
+            'p95': round(p95 * 1000.0, 4),
+            'p99': round(p99 * 1000.0, 4),
+            'max': round(max(window) * 1000.0, 4)
+        }
+    return result
+
+def latest_counts():
+    return dict(_counts)
+
+def dump(path):
+    if not _history:
+        return
+    records = list(_history)
+    if path.endswith('.csv'):
+        columns = []
+        for record in records:
+            for key in record:
+                if key not in columns:
+                    columns.append(key)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+def reset(window=WINDOW):
+    global _frame_index, _window
+    _window = window
+    _frame.clear()
+    _counts.clear()
+    _samples.clear()
+    _history.clear()
+    _frame_index = 0
@@ -0,0 +1,235 @@
+import numpy as np
+
+
+# Upper bound on the temporary distance matrix built per chunk (points x circles).
+MAX_PAIRS_PER_CHUNK = 1 << 20
+
+
+class ProjectileStore:
+    # Struct-of-arrays storage for every live projectile. Slots [0, count)
+    # are live; removal swaps survivors from the tail into the holes, so the
+    # arrays never need shifting. It still accepts and yields the old
+    # {'position', 'direction', 'owner'} dicts for callers that want them.
+    # previous holds each position before the last advance() for rendering.
+    # Every projectile gets an id from a running counter that moves with it
+    # between slots, so it can be followed across ticks.
+
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.position = np.zeros((capacity, 3))
+        self.previous = np.zeros((capacity, 3))
+        self.direction = np.zeros((capacity, 3))
+        self.owner = np.zeros(capacity, dtype=np.int32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.next_id = 0
+
+    def _reserve(self, needed):
+        capacity = len(self.owner)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('position', 'previous', 'direction', 'owner', 'ids'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, position, direction, owner):
+        self._reserve(self.count + 1)
+        i = self.count
+        self.position[i] = position
+        self.previous[i] = position
+        self.direction[i] = direction
+        self.owner[i] = owner
+        self.ids[i] = self.next_id
+        self.next_id += 1
+        self.count += 1
+
+    def add_many(self, positions, directions, owners):
+        k = len(owners)
+        self._reserve(self.count + k)
+        i = self.count
+        self.position[i:i + k] = positions
+        self.previous[i:i + k] = positions
+        self.direction[i:i + k] = directions
+        self.owner[i:i + k] = owners
+        self.ids[i:i + k] = np.arange(self.next_id, self.next_id + k)
+        self.next_id += k
+        self.count += k
+
+    def append(self, projectile):
+        self.add(projectile['position'], projectile['direction'], projectile['owner'])
+
+    def extend(self, projectiles):
+        for projectile in projectiles:
+            self.append(projectile)
+
+    def clear(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        n = self.count
+        positions = self.position[:n].tolist()
+        directions = self.direction[:n].tolist()
+        owners = self.owner[:n].tolist()
+        for i in range(n):
+            yield {'position': tuple(positions[i]), 'direction': tuple(directions[i]), 'owner': owners[i]}
+
+    def advance(self, speed):
+        n = self.count
+        self.previous[:n] = self.position[:n]
+        self.position[:n] += self.direction[:n] * speed
+
+    def interpolated_positions(self, alpha):
+        n = self.count
+        return self.previous[:n] + (self.position[:n] - self.previous[:n]) * alpha
+
+    def remove(self, dead):
+        # dead is a boolean mask over the live slots
+        n = self.count
+        keep = n - int(np.count_nonzero(dead))
+        holes = np.flatnonzero(dead[:keep])
+        fillers = np.flatnonzero(~dead[keep:]) + keep
+        self.position[holes] = self.position[fillers]
+        self.previous[holes] = self.previous[fillers]
+        self.direction[holes] = self.direction[fillers]
+        self.owner[holes] = self.owner[fillers]
+        self.ids[holes] = self.ids[fillers]
+        self.count = keep
+
+
+def first_circle_hit(px, pz, cx, cz, radius, skip=None):
+    # Index of the first circle (in array order) that contains each point, or
+    # -1. radius may be a scalar or one value per circle. skip, if given,
+    # holds one circle index per point that must not count as a hit.
+    n = len(px)
+    result = np.full(n, -1, dtype=np.int64)
+    m = len(cx)
+    if n == 0 or m == 0:
+        return result
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), (m,))
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // m)
+    for start in range(0, n, chunk):
+        end = min(n, start + chunk)
+        dx = px[start:end, None] - cx[None, :]
+        dz = pz[start:end, None] - cz[None, :]
+        hit = np.sqrt(dx ** 2 + dz ** 2) < radius[None, :]
+        if skip is not None:
+            rows = np.arange(end - start)
+            cols = skip[start:end]
+            valid = (cols >= 0) & (cols < m)
+            hit[rows[valid], cols[valid]] = False
+        any_hit = hit.any(axis=1)
+        result[start:end] = np.where(any_hit, hit.argmax(axis=1), -1)
+    return result
+
+def segment_circle_entry(x0, z0, x1, z1, cx, cz, radius):
+    # Fraction of the way from (x0, z0) to (x1, z1) at which the segment
+    # first touches the circle: 0 if it starts inside, inf if it never
+    # does. Arguments broadcast against each other.
+    dx = x1 - x0
+    dz = z1 - z0
+    fx = x0 - cx
+    fz = z0 - cz
+    a = dx ** 2 + dz ** 2
+    b = fx * dx + fz * dz
+    c = fx ** 2 + fz ** 2 - radius ** 2
+    disc = b ** 2 - a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (-b - np.sqrt(np.maximum(disc, 0))) / a
+    entering = (disc >= 0) & (a > 0) & (t >= 0) & (t <= 1)
+    return np.where(c < 0, 0.0, np.where(entering, t, np.inf))
+
+def segment_box_entry(x0, z0, x1, z1, cx, cz, half_x, half_z, angle):
+    # The same for a box with half extents half_x and half_z along its own
+    # axes, turned by angle degrees about the vertical the way glRotatef
+    # turns it: the segment is taken into the box's frame and clipped
+    # against both slabs.
+    rad = np.radians(angle)
+    cos = np.cos(rad)
+    sin = np.sin(rad)
+    rx = x0 - cx
+    rz = z0 - cz
+    dx = x1 - x0
+    dz = z1 - z0
+    u = rx * cos - rz * sin
+    v = rx * sin + rz * cos
+    # a segment not moving along an axis gets a vanishing step instead, so
+    # it is inside that slab for all of its length or none of it
+    du = dx * cos - dz * sin
+    dv = dx * sin + dz * cos
+    du = np.where(du == 0, 1e-300, du)
+    dv = np.where(dv == 0, 1e-300, dv)
+    with np.errstate(over='ignore'):
+        u0 = (-half_x - u) / du
+        u1 = (half_x - u) / du
+        v0 = (-half_z - v) / dv
+        v1 = (half_z - v) / dv
+    enter = np.maximum(np.minimum(u0, u1), np.minimum(v0, v1))
+    leave = np.minimum(np.maximum(u0, u1), np.maximum(v0, v1))
+    hit = (enter < leave) & (enter <= 1) & (leave > 0)
+    return np.where(hit, np.maximum(enter, 0.0), np.inf)
+
+def _near_pairs(x0, z0, x1, z1, cx, cz, reach):
+    # Rows and columns of the (segment, shape) pairs whose start point lies
+    # within the shape's reach plus the segment's length: the only pairs
+    # that can touch, so the exact test runs on those alone. Chunked like
+    # first_circle_hit.
+    n = len(x0)
+    m = len(cx)
+    length = np.sqrt((x1 - x0) ** 2 + (z1 - z0) ** 2)
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // m)
+    rows = []
+    cols = []
+    for start in range(0, n, chunk):
+        end = min(n, start + chunk)
+        near = ((x0[start:end, None] - cx[None, :]) ** 2 + (z0[start:end, None] - cz[None, :]) ** 2 <
+                (reach[None, :] + length[start:end, None]) ** 2)
+        r, c = np.nonzero(near)
+        rows.append(r + start)
+        cols.append(c)
+    return np.concatenate(rows), np.concatenate(cols)
+
+def _first_entry(n, rows, cols, t):
+    # For each of n segments, the shape it enters first among the pairs
+    # tested and the fraction where it does; the lower index wins a tie.
+    index = np.full(n, -1, dtype=np.int64)
+    entry = np.full(n, np.inf)
+    hit = np.isfinite(t)
+    rows = rows[hit]
+    cols = cols[hit]
+    t = t[hit]
+    order = np.lexsort((cols, t, rows))
+    first = order[np.r_[True, rows[order][1:] != rows[order][:-1]]] if len(order) else order
+    index[rows[first]] = cols[first]
+    entry[rows[first]] = t[first]
+    return index, entry
+
+def first_circle_entry(x0, z0, x1, z1, cx, cz, radius, skip=None):
+    # Swept first_circle_hit: for each segment, the index of the circle it
+    # touches first along its length and the fraction at which it does, or
+    # -1 and inf. skip works as in first_circle_hit.
+    n = len(x0)
+    if n == 0 or len(cx) == 0:
+        return np.full(n, -1, dtype=np.int64), np.full(n, np.inf)
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), (len(cx),))
+    rows, cols = _near_pairs(x0, z0, x1, z1, cx, cz, radius)
+    if skip is not None:
+        kept = skip[rows] != cols
+        rows = rows[kept]
+        cols = cols[kept]
+    t = segment_circle_entry(x0[rows], z0[rows], x1[rows], z1[rows], cx[cols], cz[cols], radius[cols])
+    return _first_entry(n, rows, cols, t)
+
+def first_box_entry(x0, z0, x1, z1, cx, cz, half_x, half_z, angle):
+    # The same against boxes, as described for segment_box_entry.
+    n = len(x0)
+    if n == 0 or len(cx) == 0:
+        return np.full(n, -1, dtype=np.int64), np.full(n, np.inf)
+    rows, cols = _near_pairs(x0, z0, x1, z1, cx, cz, np.hypot(half_x, half_z))
+    t = segment_box_entry(x0[rows], z0[rows], x1[rows], z1[rows], cx[cols], cz[cols], half_x[cols], half_z[cols], angle[cols])
+    return _first_entry(n, rows, cols, t)
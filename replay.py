@@ -0,0 +1,187 @@
+import time
+import random
+import struct
+import bisect
+
+from OpenGL.GLUT import GLUT_LEFT_BUTTON, GLUT_DOWN, GLUT_KEY_F1
+
+from simulation import *
+from snapshot import save_state, restore_state
+
+
+# A recording is the seed plus every input the window listeners received,
+# key releases included, each tagged with the recording tick: the number of step() calls since the
+# match started. Unlike game_state['tick'] it never restarts, so inputs stay
+# ordered across reset_game(). Every keyframe_interval ticks a full state
+# keyframe is stored, taken before that tick's inputs, so seeking restores
+# the nearest keyframe and re-simulates at most one interval. Keyframes are
+# snapshot.py snapshots, random generators included.
+
+MAGIC = b'TWRP'
+FORMAT_VERSION = 3
+KEYFRAME_INTERVAL = TICK_RATE * 5
+
+KEY = 0
+SPECIAL = 1
+MOUSE = 2
+KEY_UP = 3
+
+# magic, version, seed, difficulty, game mode, keyframe interval, ticks
+HEADER = struct.Struct('<4sHQBBII')
+# recording tick, kind, two input bytes (key code, or mouse button and state)
+EVENT = struct.Struct('<IBBB')
+COUNT = struct.Struct('<I')
+# recording tick, payload length
+KEYFRAME = struct.Struct('<II')
+
+
+class Recording:
+
+    def __init__(self, seed_value, difficulty='easy', game_mode='normal', keyframe_interval=KEYFRAME_INTERVAL):
+        self.seed = seed_value
+        self.difficulty = difficulty
+        self.game_mode = game_mode
+        self.keyframe_interval = keyframe_interval
+        self.ticks = 0
+        self.events = []
+        self.keyframes = {}
+
+    def record(self, kind, a, b=0):
+        self.events.append((self.ticks, kind, a, b))
+
+    def after_step(self):
+        self.ticks += 1
+        if self.ticks % self.keyframe_interval == 0:
+            self.keyframes[self.ticks] = save_state()
+
+    def save(self, path):
+        # packed in full first, so a recording that fails to pack leaves
+        # an existing file alone
+        parts = [HEADER.pack(MAGIC, FORMAT_VERSION, self.seed,
+                             DIFFICULTIES.index(self.difficulty), GAME_MODES.index(self.game_mode),
+                             self.keyframe_interval, self.ticks),
+                 COUNT.pack(len(self.events)),
+                 b''.join(EVENT.pack(*event) for event in self.events),
+                 COUNT.pack(len(self.keyframes))]
+        for tick in sorted(self.keyframes):
+            data = self.keyframes[tick]
+            parts.append(KEYFRAME.pack(tick, len(data)))
+            parts.append(data)
+        with open(path, 'wb') as f:
+            f.write(b''.join(parts))
+
+
+def load_recording(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, seed_value, difficulty, game_mode, interval, ticks = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a Tank Wars recording")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has recording format {version}, expected {FORMAT_VERSION}")
+    recording = Recording(seed_value, DIFFICULTIES[difficulty], GAME_MODES[game_mode], interval)
+    recording.ticks = ticks
+    offset = HEADER.size
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    recording.events = list(EVENT.iter_unpack(data[offset:offset + count * EVENT.size]))
+    offset += count * EVENT.size
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    for _ in range(count):
+        tick, length = KEYFRAME.unpack_from(data, offset)
+        offset += KEYFRAME.size
+        recording.keyframes[tick] = data[offset:offset + length]
+        offset += length
+    return recording
+
+def start_recording(seed_value=None, keyframe_interval=KEYFRAME_INTERVAL):
+    # Restarts the match from the seed so the recording covers all of it.
+    if seed_value is None:
+        seed_value = random.SystemRandom().getrandbits(63)
+    elif not 0 <= seed_value < 2 ** 64:
+        raise ValueError(f"a recording seed must be in 0..2**64-1, got {seed_value}")
+    recording = Recording(seed_value, game_state['difficulty'], game_state['game_mode'], keyframe_interval)
+    set_clock(tick_clock)
+    seed(seed_value)
+    game_state['paused'] = False
+    reset_game()
+    recording.keyframes[0] = save_state()
+    return recording
+
+def apply_event(kind, a, b):
+    # Only what the inputs change in the simulation; camera zoom and the
+    # profiler overlay are view state and are not replayed.
+    if kind == KEY:
+        key_down(bytes([a]))
+    elif kind == KEY_UP:
+        key_up(bytes([a]))
+    elif kind == SPECIAL:
+        if a == GLUT_KEY_F1:
+            toggle_camera_mode()
+    elif kind == MOUSE:
+        if a == GLUT_LEFT_BUTTON and b == GLUT_DOWN:
+            fire_player()
+
+
+class Playback:
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.event_ticks = [event[0] for event in recording.events]
+        self.keyframe_ticks = sorted(recording.keyframes)
+        self.tick = 0
+        self.next_event = 0
+        self.seek(0)
+
+    def seek(self, tick):
+        tick = max(0, min(tick, self.recording.ticks))
+        start = self.keyframe_ticks[bisect.bisect_right(self.keyframe_ticks, tick) - 1]
+        set_clock(tick_clock)
+        restore_state(self.recording.keyframes[start])
+        self.tick = start
+        self.next_event = bisect.bisect_left(self.event_ticks, start)
+        while self.tick < tick:
+            self.step()
+
+    def apply_inputs(self):
+        events = self.recording.events
+        while self.next_event < len(events) and events[self.next_event][0] == self.tick:
+            apply_event(*events[self.next_event][1:])
+            self.next_event += 1
+
+    def finished(self):
+        return self.tick >= self.recording.ticks
+
+    def step(self):
+        # Inputs of a tick are applied before it is simulated, as they were
+        # when recorded; once the recording ends only trailing inputs apply.
+        self.apply_inputs()
+        if self.finished():
+            return False
+        step()
+        self.tick += 1
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a Tank Wars recording without a window")
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, default=None, help="stop at this recording tick")
+    args = parser.parse_args()
+
+    recording = load_recording(args.path)
+    start = time.perf_counter()
+    playback = Playback(recording)
+    if args.seek is not None:
+        playback.seek(args.seek)
+    else:
+        while playback.step():
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"recording: {recording.ticks} ticks, {len(recording.events)} inputs, "
+          f"{len(recording.keyframes)} keyframes, seed {recording.seed}")
+    print(f"replayed to tick {playback.tick} in {elapsed:.3f}s")
+    print(f"scores: {game_state['scores']}  winner: {game_state['winner']}")
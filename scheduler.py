@@ -0,0 +1,63 @@
+import heapq
+
+
+class Scheduler:
+    # Events on simulation time. Each pending event has a key, a tuple like
+    # ('blink', 3), and at most one event per key is pending: scheduling a
+    # key again moves it. run() fires everything due in order of due time,
+    # ties in key order, so the order never depends on when an event was
+    # scheduled and a schedule rebuilt from saved state fires exactly like
+    # the original. Only due events are touched, so nothing costs anything
+    # between firings. Cancelled events stay in the heap as dead entries
+    # until they surface or outnumber the live ones.
+
+    def __init__(self):
+        self.heap = []
+        self.pending = {}
+        self.seq = 0
+        self.dead = 0
+
+    def schedule(self, key, due, callback):
+        self.cancel(key)
+        # seq only keeps heapq from comparing callbacks of dead entries
+        entry = [due, key, self.seq, callback]
+        self.seq += 1
+        self.pending[key] = entry
+        heapq.heappush(self.heap, entry)
+
+    def cancel(self, key):
+        entry = self.pending.pop(key, None)
+        if entry is None:
+            return
+        entry[3] = None
+        self.dead += 1
+        if self.dead > 64 and self.dead > len(self.pending):
+            self.heap = [entry for entry in self.heap if entry[3] is not None]
+            heapq.heapify(self.heap)
+            self.dead = 0
+
+    def due(self, key):
+        entry = self.pending.get(key)
+        return entry[0] if entry is not None else None
+
+    def run(self, time):
+        heap = self.heap
+        while heap and heap[0][0] <= time:
+            _, key, _, callback = heapq.heappop(heap)
+            if callback is None:
+                self.dead -= 1
+                continue
+            del self.pending[key]
+            callback()
+
+    def clear(self):
+        self.heap.clear()
+        self.pending.clear()
+        self.seq = 0
+        self.dead = 0
+
+    def __contains__(self, key):
+        return key in self.pending
+
+    def __len__(self):
+        return len(self.pending)
@@ -0,0 +1,1156 @@
+import math
+import time
+import random
+from functools import partial
+
+import numpy as np
+
+import profiler
+from projectiles import ProjectileStore, first_circle_hit, first_circle_entry, first_box_entry, segment_circle_entry
+from spatial import SpatialGrid
+from navigation import FlowField
+from entities import Tank, Explosion, Obstacle, Pool
+from world import World
+from freespace import FreeSpace
+from scheduler import Scheduler
+
+
+GRID_LENGTH = 50
+TANK_RADIUS = 2
+BULLET_SPEED = 0.5
+TANK_SPEED = 0.5
+BOSS_HEALTH = 500
+BOSS_SPEED = 0.4
+PORTAL_RADIUS = 3
+
+TICK_RATE = 60
+TICK_DT = 1.0 / TICK_RATE
+EXPLOSION_TICKS = TICK_RATE // 2
+PORTAL_TICKS = TICK_RATE // 2
+
+# Larger than the widest obstacle footprint so most lookups touch one cell.
+GRID_CELL_SIZE = 8
+NAV_CELL_SIZE = TANK_RADIUS * 2
+FREE_CELL_SIZE = 1
+# where power-ups and teleports land
+SPAWN_AREA = (-GRID_LENGTH + 5, GRID_LENGTH - 5, -GRID_LENGTH + 5, GRID_LENGTH - 5)
+FLOW_SNAP_ANGLE = 30   # degrees; closer than this to the flow, enemies aim straight at the player
+
+ENEMY_PROJECTILE_DAMAGE = {
+    'easy': 2,
+    'medium': 4,
+    'hard': 2
+}
+
+ENEMY_FIRE_COOLDOWN = {
+    'easy': 4.0,
+    'medium': 3.0,
+    'hard': 2.0
+}
+
+ENEMY_MISS_CHANCE = {
+    'easy': 0.4,
+    'medium': 0.3,
+    'hard': 0.2
+}
+
+ENEMY_ROT_SPEED = {
+    'easy': 1.2,
+    'medium': 1.5,
+    'hard': 1.0
+}
+
+ENEMY_MOVE_SPEED = {
+    'easy': TANK_SPEED * 0.5,
+    'medium': TANK_SPEED * 0.5,
+    'hard': TANK_SPEED * 0.4
+}
+
+# the player's shells, against tanks and the boss alike
+PLAYER_PROJECTILE_DAMAGE = 20
+
+# Moving cubes head off in a new direction every OBSTACLE_TURN_SECONDS;
+# blinking cubes stay up, then down, for a random time in these ranges.
+OBSTACLE_TURN_SECONDS = 5
+OBSTACLE_SHOWN_SECONDS = (5, 10)
+OBSTACLE_HIDDEN_SECONDS = (3, 7)
+
+# Movement keys act on every tick they are held, as bits of
+# game_state['held_keys']; a turn key turns PLAYER_TURN_SPEED degrees a tick.
+HELD_KEYS = {b'w': 1, b's': 2, b'a': 4, b'd': 8}
+PLAYER_TURN_SPEED = 3
+
+DIFFICULTIES = ('easy', 'medium', 'hard')
+GAME_MODES = ('normal', 'ctf')
+
+ENEMY_MODES = ('chasing', 'avoiding')
+CHASING = 0
+AVOIDING = 1
+
+
+# All game logic draws from these generators so a seeded run is reproducible;
+# np_rng feeds the batched updates that roll one number per entity.
+rng = random.Random()
+np_rng = np.random.default_rng()
+
+def tick_clock():
+    return game_state['tick'] * TICK_DT
+
+# Any zero-argument callable returning seconds. By default sim time only
+# moves with step(), so game speed does not depend on how often it is called.
+clock = tick_clock
+
+def now():
+    return clock()
+
+def set_clock(new_clock):
+    global clock
+    clock = new_clock
+
+def seed(value):
+    rng.seed(value)
+    # NumPy takes no negative seeds; those wrap to 64 bits. Reseeded in
+    # place so modules that imported np_rng keep a live reference.
+    if value is not None and value < 0:
+        value &= 2 ** 64 - 1
+    np_rng.bit_generator.state = np.random.default_rng(value).bit_generator.state
+
+
+def new_obstacles():
+    return [
+        Obstacle('cube', 10, 10, 3),
+        Obstacle('cube', -15, -15, 4, dynamic=True, speed=0.3, direction=(1, 0), direction_change_time=now()),
+        Obstacle('cube', 20, -10, 5, toggle_time=now(), next_toggle=rng.uniform(*OBSTACLE_SHOWN_SECONDS)),
+        Obstacle('barrier', -20, 15, 3, dynamic=True, rotation=0, rotation_speed=30),
+        Obstacle('cube', 0, -25, 4, dynamic=True, speed=0.3, direction=(0, 1), direction_change_time=now())
+    ]
+
+
+# Tanks and the boss are entities of one World, each with a position,
+# rotation and health. tank_index is a tank's place in game_state['tanks']
+# (the boss has none), the player and boss tags mark those two, and the
+# enemy AI keeps its per-tank state in the ai_* components of the tanks it
+# drives. controlled tags a tank a network client drives.
+world = World()
+world.component('position', shape=(3,))
+world.component('rotation')
+world.component('health', dtype=np.int64)
+world.component('tank_index', dtype=np.int64)
+world.component('ai_mode', dtype=np.int8)
+world.component('ai_avoiding_frames', dtype=np.int32)
+world.component('ai_avoiding_direction', dtype=np.int32)
+world.component('ai_fire_cooldown')
+for tag in ('player', 'boss', 'controlled'):
+    world.component(tag, dtype=None)
+AI_COMPONENTS = ('ai_mode', 'ai_avoiding_frames', 'ai_avoiding_direction', 'ai_fire_cooldown')
+
+game_state = {
+    'tick': 0,
+    'tanks': [],
+    'projectiles': ProjectileStore(),
+    'scores': [0, 0],
+    'camera_mode': True,
+    'explosions': [],
+    'game_over': False,
+    'winner': None,
+    'powerup': None,
+    'powerup_spawn_time': 0.0,
+    'powerup_next_spawn_time': 15.0,
+    'powerup_duration': 15,
+    'powerup_active': False,
+    'powerup_speed_boost': False,
+    'powerup_speed_end_time': 0,
+    'enemy_mode': 'chasing',
+    'boss_active': False,
+    'boss': None,
+    'enemy_fire_rate': 0.01,
+    'boss_fire_rate': 0.05,
+    'auto_teleport_enabled': False,
+    'last_auto_teleport_time': 0.0,
+    'portal_active': False,
+    'portal_position': (0, 0, 0),
+    'portal_timer': 0,
+    'paused': False,
+    'held_keys': 0,
+    'pause_menu_index': 0,
+    'pause_menu_mode': 'main',
+    'difficulty': 'easy',
+    'game_mode': 'normal',
+    'flag': {
+        'status': None,
+        'position': None,
+        'holder': None,
+        'hold_timer': 0.0
+    }
+}
+
+obstacles = new_obstacles()
+# timed game events on sim time; see schedule_events()
+events = Scheduler()
+# spent explosions are recycled; a hit spawns one nearly every tick under fire
+explosion_pool = Pool(Explosion)
+
+# Obstacles are indexed with their footprint grown by TANK_RADIUS, so a
+# collision test is a single-cell point lookup. Tanks are indexed as points.
+obstacle_grid = SpatialGrid(GRID_CELL_SIZE)
+# Shared by every enemy; visible obstacles block it with the same grown footprint.
+navigation = FlowField(GRID_LENGTH, NAV_CELL_SIZE)
+# Free floor for spawns and teleports, with the same footprint again.
+free_space = FreeSpace(GRID_LENGTH, FREE_CELL_SIZE)
+
+
+def obstacle_radius(obs):
+    if obs.type == 'cube':
+        return obs.size / 2
+    elif obs.type == 'barrier':
+        return obs.size * 1.5
+    return None
+
+def obstacle_box(obs):
+    # Half extents and turn of the box the obstacle is drawn as; it fits
+    # inside the footprint obstacle_grid indexes it with.
+    if obs.type == 'cube':
+        return obs.size / 2, obs.size / 2, 0
+    elif obs.type == 'barrier':
+        return obs.size * 1.5, obs.size * 0.25, obs.rotation
+    return None
+
+def index_obstacle(obs):
+    radius = obstacle_radius(obs)
+    if radius is not None:
+        obstacle_grid.move(id(obs), obs, obs.x, obs.z, radius + TANK_RADIUS)
+        if obs.visible:
+            navigation.place(id(obs), obs.x, obs.z, radius + TANK_RADIUS)
+            free_space.place(id(obs), obs.x, obs.z, radius + TANK_RADIUS)
+        else:
+            navigation.remove(id(obs))
+            free_space.remove(id(obs))
+
+def rebuild_obstacle_grid():
+    obstacle_grid.clear()
+    navigation.clear()
+    free_space.clear()
+    for obs in obstacles:
+        index_obstacle(obs)
+
+def add_obstacle(obs):
+    obstacles.append(obs)
+    index_obstacle(obs)
+    schedule_obstacle(len(obstacles) - 1)
+
+def add_tank(position, rotation, health, controlled=False):
+    # The first tank is the player; the enemy AI drives the rest unless a
+    # client controls them, starting out chasing with no cooldown.
+    tanks = game_state['tanks']
+    components = {'position': position, 'rotation': rotation, 'health': health, 'tank_index': len(tanks)}
+    if tanks:
+        components.update(dict.fromkeys(AI_COMPONENTS, 0))
+    else:
+        components['player'] = True
+    if controlled:
+        components['controlled'] = True
+    tank = Tank(world, world.spawn(**components))
+    tanks.append(tank)
+    return tank
+
+def remove_tanks(count):
+    # drops every tank from index count on
+    tanks = game_state['tanks']
+    for tank in tanks[count:]:
+        world.despawn(tank.entity)
+    del tanks[count:]
+
+def place_boss(position, rotation, health):
+    boss = game_state['boss']
+    if boss is None:
+        boss = Tank(world, world.spawn(position=position, rotation=rotation, health=health, boss=True))
+        game_state['boss'] = boss
+    else:
+        boss.position = position
+        boss.rotation = rotation
+        boss.health = health
+    return boss
+
+def remove_boss():
+    if game_state['boss'] is not None:
+        world.despawn(game_state['boss'].entity)
+        game_state['boss'] = None
+
+def spawn_point(area, skip=None):
+    # A free point in area where a tank would touch no obstacle, no tank
+    # but tank skip and not the boss, or None when the area is full.
+    avoid = world['position'][world.query('tank_index')][:, ::2]
+    if skip is not None:
+        avoid = np.delete(avoid, skip, axis=0)
+    if game_state['boss_active']:
+        boss = game_state['boss'].position
+        avoid = np.vstack((avoid, (boss[0], boss[2])))
+    return free_space.sample(rng, area, avoid, TANK_RADIUS * 2)
+
+def respawn_area(tank_idx):
+    # each tank index respawns in its own corner, away from the centre
+    sx = 2 * (tank_idx % 2) - 1
+    sz = 2 * (tank_idx // 2 % 2) - 1
+    near = (GRID_LENGTH - 10) * 0.3
+    far = GRID_LENGTH - 10
+    return (min(sx * near, sx * far), max(sx * near, sx * far), min(sz * near, sz * far), max(sz * near, sz * far))
+
+add_tank((0, 0, 0), 0, 100)
+add_tank((30, 0, 30), 180, 100)
+rebuild_obstacle_grid()
+
+
+def check_boundary_collision(pos):
+    return abs(pos[0]) > GRID_LENGTH or abs(pos[2]) > GRID_LENGTH
+
+def check_obstacle_collision(pos):
+    for obs in obstacle_grid.query_items(pos[0], pos[2]):
+        if not obs.visible:
+            continue
+
+        distance = math.sqrt((pos[0] - obs.x)**2 + (pos[2] - obs.z)**2)
+        if distance < (obstacle_radius(obs) + TANK_RADIUS):
+            return True
+    return False
+
+def check_projectile_tank_collision(proj_pos, tank_pos):
+    distance = math.sqrt((proj_pos[0] - tank_pos[0])**2 + (proj_pos[2] - tank_pos[2])**2)
+    return distance < TANK_RADIUS
+
+def check_tank_collision(tank1_pos, tank2_pos):
+    distance = math.sqrt((tank1_pos[0] - tank2_pos[0])**2 + (tank1_pos[2] - tank2_pos[2])**2)
+    return distance < TANK_RADIUS * 2
+
+def create_explosion(position):
+    game_state['explosions'].append(explosion_pool.take(position, EXPLOSION_TICKS))
+
+def update_explosions():
+    explosions = game_state['explosions']
+    live = []
+    for explosion in explosions:
+        explosion.lifetime -= 1
+        if explosion.lifetime > 0:
+            live.append(explosion)
+        else:
+            explosion_pool.release(explosion)
+    if len(live) != len(explosions):
+        explosions[:] = live
+
+def spawn_powerup():
+    if game_state['powerup'] is not None:
+        return False
+
+    pos = spawn_point(SPAWN_AREA)
+    if pos is None:
+        return False
+    game_state['powerup'] = {'position': pos, 'spawn_time': now()}
+    return True
+
+def check_powerup_collection():
+    if game_state['powerup'] is None:
+        return
+
+    player_pos = game_state['tanks'][0].position
+    powerup_pos = game_state['powerup']['position']
+    dist = math.sqrt((player_pos[0] - powerup_pos[0])**2 + (player_pos[2] - powerup_pos[2])**2)
+
+    if dist < TANK_RADIUS * 2:
+        if rng.random() < 0.5:
+            game_state['tanks'][0].health = 100
+        else:
+            game_state['powerup_speed_boost'] = True
+            game_state['powerup_speed_end_time'] = now() + 10
+            schedule_speed_boost()
+
+        clear_powerup()
+
+def clear_powerup():
+    # the next power-up comes 15-20 seconds after this one is gone
+    game_state['powerup'] = None
+    game_state['powerup_spawn_time'] = now()
+    game_state['powerup_next_spawn_time'] = now() + rng.uniform(15, 20)
+    schedule_powerup()
+
+def respawn_tank(tank_idx):
+    tank = game_state['tanks'][tank_idx]
+    tank.health = 100
+
+    # anywhere in the arena if its corner is full, or stay put if that is too
+    pos = spawn_point(respawn_area(tank_idx), skip=tank_idx) or spawn_point(SPAWN_AREA, skip=tank_idx)
+    if pos is not None:
+        tank.position = pos
+    tank.rotation = 0 if tank_idx == 0 else 180
+
+def spawn_boss():
+    place_boss((0, 0, 30), 180, BOSS_HEALTH)
+    game_state['boss_active'] = True
+    game_state['tanks'][1].health = 0
+
+def reset_game():
+    game_state['tick'] = 0
+    game_state['scores'] = [0, 0]
+
+    for i in range(len(game_state['tanks'])):
+        respawn_tank(i)
+
+    game_state['projectiles'].clear()
+    explosion_pool.release_all(game_state['explosions'])
+    game_state['explosions'] = []
+    game_state['game_over'] = False
+    game_state['winner'] = None
+    clear_powerup()
+    game_state['powerup_speed_boost'] = False
+    game_state['enemy_mode'] = 'chasing'
+    enemies = world.query(*AI_COMPONENTS)
+    for name in AI_COMPONENTS:
+        world[name][enemies] = 0
+    game_state['boss_active'] = False
+    remove_boss()
+    game_state['enemy_fire_rate'] = 0.01
+    game_state['boss_fire_rate'] = 0.05
+    game_state['auto_teleport_enabled'] = False
+    game_state['last_auto_teleport_time'] = now()
+    game_state['portal_active'] = False
+    game_state['flag'] = {
+        'status': None,
+        'position': None,
+        'holder': None,
+        'hold_timer': 0.0
+    }
+
+    # rebuilt in place so modules holding a reference to the list stay valid
+    obstacles[:] = new_obstacles()
+    rebuild_obstacle_grid()
+    schedule_events()
+
+def set_difficulty(selected):
+    if selected == game_state['difficulty']:
+        return
+    game_state['difficulty'] = selected
+    if selected == 'hard':
+        while len(game_state['tanks']) < 4:
+            pos = (rng.uniform(-GRID_LENGTH+5, GRID_LENGTH-5), 0, rng.uniform(-GRID_LENGTH+5, GRID_LENGTH-5))
+            add_tank(pos, rng.randint(0, 359), 100)
+    elif selected == 'easy':
+        remove_tanks(2)
+
+def check_win_condition():
+    if game_state.get('game_over', False):
+        return
+
+    if game_state['scores'][0] >= 2 and not game_state['boss_active'] and game_state['game_mode'] == 'normal':
+        spawn_boss()
+    elif game_state['scores'][1] >= 5:
+        game_state['game_over'] = True
+        game_state['winner'] = 1
+
+def obstacle_hits(px, pz):
+    # Vectorised check_obstacle_collision over arrays of x and z.
+    hits = np.zeros(len(px), dtype=bool)
+    visible = [obs for obs in obstacles if obs.visible and obstacle_radius(obs) is not None]
+    if len(px) == 0 or not visible:
+        return hits
+
+    # Only points in a cell that some obstacle footprint touches need the
+    # exact test; the rest of the arena is skipped in one lookup.
+    candidates = np.flatnonzero(obstacle_grid.occupied(obstacle_grid.cell_indices(px), obstacle_grid.cell_indices(pz)))
+    if len(candidates) == 0:
+        return hits
+
+    ox = np.array([obs.x for obs in visible], dtype=float)
+    oz = np.array([obs.z for obs in visible], dtype=float)
+    radius = np.array([obstacle_radius(obs) + TANK_RADIUS for obs in visible])
+    hits[candidates] = first_circle_hit(px[candidates], pz[candidates], ox, oz, radius) >= 0
+    return hits
+
+def obstacle_entries(x0, z0, x1, z1):
+    # Vectorised: fraction of each segment at which it first enters the box
+    # of a visible obstacle, inf where it enters none.
+    entry = np.full(len(x0), np.inf)
+    visible = [obs for obs in obstacles if obs.visible and obstacle_box(obs) is not None]
+    if len(x0) == 0 or not visible:
+        return entry
+
+    # Only segments through a cell that some obstacle footprint touches
+    # need the exact test; the grid walk finds them all at once.
+    candidates = np.flatnonzero(obstacle_grid.crossed(x0, z0, x1, z1))
+    if len(candidates) == 0:
+        return entry
+
+    boxes = np.array([(obs.x, obs.z) + obstacle_box(obs) for obs in visible], dtype=float)
+    entry[candidates] = first_box_entry(x0[candidates], z0[candidates], x1[candidates], z1[candidates],
+                                        boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4])[1]
+    return entry
+
+def line_of_fire(x0, z0, x1, z1):
+    # Vectorised: whether a shell fired from each (x0, z0) would reach a
+    # tank at (x1, z1) before any visible obstacle stops it.
+    x0 = np.atleast_1d(np.asarray(x0, dtype=float))
+    z0 = np.atleast_1d(np.asarray(z0, dtype=float))
+
+    # the shell lands once it is within TANK_RADIUS of the target
+    dx = x1 - x0
+    dz = z1 - z0
+    length = np.sqrt(dx ** 2 + dz ** 2)
+    reach = np.maximum(length - TANK_RADIUS, 0) / np.maximum(length, 1e-9)
+    x1 = x0 + dx * reach
+    z1 = z0 + dz * reach
+
+    return ~np.isfinite(obstacle_entries(x0, z0, x1, z1))
+
+def update_projectiles():
+    if game_state['game_over'] or game_state['paused']:
+        return
+
+    store = game_state['projectiles']
+    n = len(store)
+    if n == 0:
+        return
+
+    # One vectorised pass moves every shell and finds what it hit; only the
+    # handful of hits are then resolved one by one, in slot order. Each
+    # shell is swept along the whole step it moved, so however far that
+    # is, nothing is passed through: the first thing the step touches is
+    # what it hit, and the explosion goes where it touched.
+    store.advance(BULLET_SPEED)
+    pos = store.position[:n]
+    x0 = store.previous[:n, 0]
+    z0 = store.previous[:n, 2]
+    x1 = pos[:, 0]
+    z1 = pos[:, 2]
+    owner = store.owner[:n]
+
+    obstacle_t = obstacle_entries(x0, z0, x1, z1)
+
+    tanks = game_state['tanks']
+    tank_pos = world['position'][world.query('tank_index')]
+    tank_x = tank_pos[:, 0]
+    tank_z = tank_pos[:, 2]
+    hit_tank, tank_t = first_circle_entry(x0, z0, x1, z1, tank_x, tank_z, TANK_RADIUS, skip=owner)
+
+    boss_t = np.full(n, np.inf)
+    if game_state['boss_active']:
+        boss_pos = game_state['boss'].position
+        mine = owner == 0
+        boss_t[mine] = segment_circle_entry(x0[mine], z0[mine], x1[mine], z1[mine], boss_pos[0], boss_pos[2], TANK_RADIUS)
+
+    # obstacles win ties, then tanks
+    entry = np.minimum(obstacle_t, np.minimum(tank_t, boss_t))
+    hit = np.isfinite(entry)
+    hit_obstacle = hit & (obstacle_t == entry)
+    hit_tank[hit_obstacle | (tank_t != entry)] = -1
+    hit_boss = hit & ~hit_obstacle & (hit_tank < 0)
+
+    # shells leaving the arena without hitting anything just vanish
+    dead = ~hit & ((np.abs(x1) > GRID_LENGTH) | (np.abs(z1) > GRID_LENGTH))
+    dead |= hit_obstacle | hit_boss
+    for i in np.flatnonzero(hit).tolist():
+        t = float(entry[i])
+        proj_pos = (float(x0[i] + t * (x1[i] - x0[i])), float(pos[i, 1]), float(z0[i] + t * (z1[i] - z0[i])))
+        proj_owner = int(owner[i])
+
+        if hit_obstacle[i]:
+            create_explosion(proj_pos)
+            continue
+
+        tank_idx = int(hit_tank[i])
+        # an earlier hit in this pass may have respawned the target elsewhere
+        target = tanks[tank_idx].position if tank_idx >= 0 else None
+        if target is not None and np.isfinite(segment_circle_entry(x0[i], z0[i], x1[i], z1[i], target[0], target[2], TANK_RADIUS)):
+            tank = tanks[tank_idx]
+            dead[i] = True
+            create_explosion(proj_pos)
+
+            if proj_owner == 0:
+                tank.health -= PLAYER_PROJECTILE_DAMAGE
+            else:
+                tank.health -= ENEMY_PROJECTILE_DAMAGE.get(game_state.get('difficulty', 'easy'), 10)
+
+            if tank.health <= 0:
+                for hook in schedule(active_sets())[1]:
+                    hook(tank_idx, tank, proj_owner)
+
+                # every enemy tank scores for the enemy side
+                game_state['scores'][0 if proj_owner == 0 else 1] += 1
+                respawn_tank(tank_idx)
+
+        if hit_boss[i]:
+            boss = game_state['boss']
+            create_explosion(proj_pos)
+
+            boss.health -= PLAYER_PROJECTILE_DAMAGE
+
+            if boss.health <= 0:
+                game_state['game_over'] = True
+                game_state['winner'] = 0
+
+    store.remove(dead)
+
+def update_navigation():
+    # One flow field toward the player serves every enemy this tick.
+    if game_state['game_over'] or game_state['paused'] or len(game_state['tanks']) < 2:
+        return
+    player_pos = game_state['tanks'][0].position
+    navigation.update(player_pos[0], player_pos[2])
+
+def update_enemy_ai():
+    if game_state['game_over'] or game_state['paused']:
+        return
+
+    # every tank the AI drives, in tank order
+    enemies = world.query(*AI_COMPONENTS)
+    if len(enemies) == 0:
+        return
+
+    mode = world['ai_mode'][enemies]
+    frames = world['ai_avoiding_frames'][enemies]
+    avoid_dir = world['ai_avoiding_direction'][enemies]
+    cooldown = world['ai_fire_cooldown'][enemies]
+
+    difficulty = game_state['difficulty']
+    rot_speed = ENEMY_ROT_SPEED.get(difficulty, 1.0)
+    move_speed = ENEMY_MOVE_SPEED.get(difficulty, TANK_SPEED * 0.5)
+
+    player_pos = world['position'][world.query('player')[0]]
+    pos = world['position'][enemies]
+    rot = world['rotation'][enemies]
+    ex = pos[:, 0]
+    ez = pos[:, 2]
+
+    dx = player_pos[0] - ex
+    dz = player_pos[2] - ez
+    target_angle = np.degrees(np.arctan2(dx, dz)) % 360
+    angle_diff = (target_angle - rot + 180) % 360 - 180
+    abs_diff = np.abs(angle_diff)
+    distance = np.sqrt(dx ** 2 + dz ** 2)
+
+    # far away, follow the flow field around obstacles; where it already
+    # points roughly at the player, or has no heading, or up close, head
+    # straight for them
+    flow = navigation.headings(ex, ez)
+    detour = np.abs((flow - target_angle + 180) % 360 - 180) >= FLOW_SNAP_ANGLE
+    steer_angle = np.where(detour & (distance > 20), flow, target_angle)
+    steer_diff = (steer_angle - rot + 180) % 360 - 180
+    abs_steer = np.abs(steer_diff)
+
+    # tanks driven by remote players are left alone
+    active = ~world.tagged(enemies, 'controlled')
+    chasing = (mode == CHASING) & active
+    avoiding = (mode == AVOIDING) & active
+
+    # chasing: turn along the steering heading, close in, and fire when
+    # lined up with nothing in the way
+    turning = chasing & (abs_steer > 5)
+    rot = np.where(turning, (rot + np.where(steer_diff > 0, rot_speed, -rot_speed)) % 360, rot)
+
+    advancing = np.flatnonzero(chasing & (distance > 20) & (abs_steer < 10))
+    if len(advancing):
+        rad = np.radians(rot[advancing])
+        nx = ex[advancing] + move_speed * np.sin(rad)
+        nz = ez[advancing] + move_speed * np.cos(rad)
+        blocked = (np.abs(nx) > GRID_LENGTH) | (np.abs(nz) > GRID_LENGTH)
+        blocked |= obstacle_hits(nx, nz)
+        stuck = advancing[blocked]
+        mode[stuck] = AVOIDING
+        frames[stuck] = 20
+        avoid_dir[stuck] = np_rng.choice((1, -1), size=len(stuck))
+        free = advancing[~blocked]
+        ex[free] = nx[~blocked]
+        ez[free] = nz[~blocked]
+
+    cooling = chasing & (cooldown > 0)
+    cooldown[cooling] -= TICK_DT
+
+    firing = np.flatnonzero(chasing & (abs_diff < 5) & (distance < 40) & (cooldown <= 0))
+    if len(firing):
+        # one batched sight check for every enemy ready to fire; shots an
+        # obstacle would stop are held until the line clears
+        firing = firing[line_of_fire(ex[firing], ez[firing], player_pos[0], player_pos[2])]
+    if len(firing):
+        miss_chance = ENEMY_MISS_CHANCE.get(difficulty, 0.3)
+        fire_angle = rot[firing].copy()
+        missed = np_rng.random(len(firing)) < miss_chance
+        fire_angle[missed] += np_rng.uniform(-40, 40, size=int(missed.sum()))
+        rad = np.radians(fire_angle)
+        directions = np.zeros((len(firing), 3))
+        directions[:, 0] = np.sin(rad)
+        directions[:, 2] = np.cos(rad)
+        game_state['projectiles'].add_many(pos[firing], directions, world['tank_index'][enemies[firing]])
+        cooldown[firing] = ENEMY_FIRE_COOLDOWN.get(difficulty, 1.2)
+
+    # avoiding: spin away for a few frames, creeping forward every fifth one
+    spinning = avoiding & (frames > 0)
+    rot = np.where(spinning, (rot + 2 * avoid_dir) % 360, rot)
+    frames[spinning] -= 1
+    creeping = np.flatnonzero(spinning & (frames % 5 == 0))
+    if len(creeping):
+        rad = np.radians(rot[creeping])
+        nx = ex[creeping] + move_speed * np.sin(rad)
+        nz = ez[creeping] + move_speed * np.cos(rad)
+        clear = (np.abs(nx) <= GRID_LENGTH) & (np.abs(nz) <= GRID_LENGTH)
+        clear &= ~obstacle_hits(nx, nz)
+        ex[creeping[clear]] = nx[clear]
+        ez[creeping[clear]] = nz[clear]
+    mode[avoiding & ~spinning] = CHASING
+
+    world['position'][enemies] = pos
+    world['rotation'][enemies] = rot
+    world['ai_mode'][enemies] = mode
+    world['ai_avoiding_frames'][enemies] = frames
+    world['ai_avoiding_direction'][enemies] = avoid_dir
+    world['ai_fire_cooldown'][enemies] = cooldown
+
+    game_state['enemy_mode'] = ENEMY_MODES[mode[0]]
+
+def update_boss_ai():
+    if game_state['game_over'] or game_state['paused']:
+        return
+
+    boss = game_state['boss']
+    player = game_state['tanks'][0]
+
+    dx = player.position[0] - boss.position[0]
+    dz = player.position[2] - boss.position[2]
+
+    target_angle = math.degrees(math.atan2(dx, dz)) % 360
+    current_angle = boss.rotation
+    angle_diff = (target_angle - current_angle + 180) % 360 - 180
+
+    distance = math.sqrt(dx**2 + dz**2)
+
+    if abs(angle_diff) > 5:
+        boss.rotation = (current_angle + 4 * (1 if angle_diff > 0 else -1)) % 360
+
+    if distance > 15 and abs(angle_diff) < 15:
+        pos = list(boss.position)
+        rot = boss.rotation
+        pos[0] += BOSS_SPEED * 0.25 * math.sin(math.radians(rot))
+        pos[2] += BOSS_SPEED * 0.25 * math.cos(math.radians(rot))
+
+        if not (check_boundary_collision(pos) or check_obstacle_collision(pos)):
+            boss.position = tuple(pos)
+
+    if abs(angle_diff) < 10 and rng.random() < game_state['boss_fire_rate']:
+        # hold fire while an obstacle covers the player
+        if not line_of_fire(boss.position[0], boss.position[2], player.position[0], player.position[2])[0]:
+            return
+        direction = (math.sin(math.radians(boss.rotation)), 0, math.cos(math.radians(boss.rotation)))
+
+        projectile1 = {'position': boss.position, 'direction': direction, 'owner': 1}
+        projectile2 = {
+            'position': boss.position,
+            'direction': (
+                math.sin(math.radians(boss.rotation + 10)),
+                0,
+                math.cos(math.radians(boss.rotation + 10))
+            ),
+            'owner': 1
+        }
+
+        game_state['projectiles'].extend([projectile1, projectile2])
+
+def update_dynamic_obstacles():
+    if game_state['paused']:
+        return
+
+    for obs in obstacles:
+        if obs.dynamic:
+            if obs.type == 'cube':
+                pos = [obs.x, obs.z]
+                pos[0] += obs.speed * obs.direction[0]
+                pos[1] += obs.speed * obs.direction[1]
+
+                if abs(pos[0]) > GRID_LENGTH - obs.size/2 or abs(pos[1]) > GRID_LENGTH - obs.size/2:
+                    obs.direction = (-obs.direction[0], -obs.direction[1])
+
+                obs.x, obs.z = pos[0], pos[1]
+                index_obstacle(obs)
+
+            elif obs.type == 'barrier':
+                obs.rotation = (obs.rotation + obs.rotation_speed) % 360
+
+def turn_obstacle(index):
+    # moving cubes head off in a new random direction
+    obs = obstacles[index]
+    angle = rng.uniform(0, 360)
+    obs.direction = (math.sin(math.radians(angle)), math.cos(math.radians(angle)))
+    obs.direction_change_time = now()
+    schedule_turn(index)
+
+def blink_obstacle(index):
+    obs = obstacles[index]
+    obs.visible = not obs.visible
+    obs.toggle_time = now()
+    obs.next_toggle = rng.uniform(*(OBSTACLE_SHOWN_SECONDS if obs.visible else OBSTACLE_HIDDEN_SECONDS))
+    index_obstacle(obs)
+    schedule_blink(index)
+
+def teleport_player():
+    game_state['portal_active'] = True
+    game_state['portal_timer'] = PORTAL_TICKS
+
+    pos = spawn_point(SPAWN_AREA, skip=0)
+    if pos is not None:
+        game_state['portal_position'] = pos
+        game_state['tanks'][0].position = pos
+
+def update_portal_effect():
+    if game_state['portal_active']:
+        game_state['portal_timer'] -= 1
+        if game_state['portal_timer'] <= 0:
+            game_state['portal_active'] = False
+
+def check_flag_logic():
+    if game_state['paused']:
+        return
+
+    flag = game_state['flag']
+
+    if flag['status'] is None:
+        flag['status'] = 'held_by_enemy'
+        flag['holder'] = 1
+        flag['position'] = None
+        flag['hold_timer'] = 0.0
+
+    if flag['status'] == 'held_by_player':
+        flag['hold_timer'] += TICK_DT
+        if flag['hold_timer'] >= 10.0:
+            game_state['game_over'] = True
+            game_state['winner'] = 0
+
+    if flag['status'] == 'dropped' and flag['position'] is not None:
+        player_pos = game_state['tanks'][0].position
+        dist = math.sqrt((player_pos[0] - flag['position'][0])**2 + (player_pos[2] - flag['position'][2])**2)
+        if dist < TANK_RADIUS * 2:
+            flag['status'] = 'held_by_player'
+            flag['holder'] = 0
+            flag['position'] = None
+            flag['hold_timer'] = 0.0
+
+def ctf_tank_destroyed(tank_idx, tank, killer):
+    # an enemy carrying the flag drops it where it died, and losing the
+    # player while holding it loses the match
+    flag = game_state['flag']
+    if tank_idx != 0 and flag['status'] == 'held_by_enemy' and flag['holder'] == tank_idx:
+        flag['status'] = 'dropped'
+        flag['position'] = tank.position
+        flag['holder'] = None
+        flag['hold_timer'] = 0.0
+
+    if tank_idx == 0 and flag['status'] == 'held_by_player':
+        game_state['game_over'] = True
+        game_state['winner'] = 1
+
+def move_player(direction, tank_idx=0):
+    # tank_idx lets remote players drive tanks other than the local one
+    tank = game_state['tanks'][tank_idx]
+    pos = list(tank.position)
+    rot = tank.rotation
+    speed_multiplier = 2.0 if game_state['powerup_speed_boost'] and tank_idx == 0 else 1.0
+    pos[0] += direction * TANK_SPEED * speed_multiplier * math.sin(math.radians(rot))
+    pos[2] += direction * TANK_SPEED * speed_multiplier * math.cos(math.radians(rot))
+    if not check_boundary_collision(pos) and not check_obstacle_collision(pos):
+        tank.position = tuple(pos)
+
+def rotate_player(degrees, tank_idx=0):
+    tank = game_state['tanks'][tank_idx]
+    tank.rotation = (tank.rotation + degrees) % 360
+
+def toggle_auto_teleport():
+    game_state['auto_teleport_enabled'] = not game_state['auto_teleport_enabled']
+    if game_state['auto_teleport_enabled']:
+        game_state['last_auto_teleport_time'] = now()
+        teleport_player()
+    schedule_auto_teleport()
+
+def fire_player(tank_idx=0):
+    if game_state['game_over'] or game_state['paused']:
+        return
+
+    tank_pos = game_state['tanks'][tank_idx].position
+    rotation = game_state['tanks'][tank_idx].rotation
+    rad = math.radians(rotation)
+    direction = (math.sin(rad), 0, math.cos(rad))
+
+    projectile = {
+        'position': tank_pos,
+        'direction': direction,
+        'owner': tank_idx
+    }
+
+    game_state['projectiles'].append(projectile)
+
+def toggle_camera_mode():
+    game_state['camera_mode'] = not game_state['camera_mode']
+
+def handle_key(key):
+    if key == b'\x1b':  # ESC
+        if not game_state['paused']:
+            game_state['paused'] = True
+            game_state['held_keys'] = 0
+            game_state['pause_menu_index'] = 0
+            game_state['pause_menu_mode'] = 'main'
+        else:
+            game_state['paused'] = False
+        return
+    
+    if game_state['paused']:
+        if key == b'\r' or key == b'\n':  # Enter
+            if game_state['pause_menu_mode'] == 'main':
+                if game_state['pause_menu_index'] == 0:  # Resume
+                    game_state['paused'] = False
+                elif game_state['pause_menu_index'] == 1:  # Restart
+                    reset_game()
+                    game_state['paused'] = False
+                elif game_state['pause_menu_index'] == 2:  # Difficulty
+                    game_state['pause_menu_mode'] = 'difficulty'
+                    game_state['pause_menu_index'] = DIFFICULTIES.index(game_state['difficulty'])
+                elif game_state['pause_menu_index'] == 3:  # Game Mode
+                    game_state['pause_menu_mode'] = 'gamemode'
+                    game_state['pause_menu_index'] = 0 if game_state['game_mode'] == 'normal' else 1
+            
+            elif game_state['pause_menu_mode'] == 'difficulty':
+                selected = DIFFICULTIES[game_state['pause_menu_index']]
+                set_difficulty(selected)
+                
+                game_state['pause_menu_mode'] = 'main'
+                game_state['pause_menu_index'] = 2
+            
+            elif game_state['pause_menu_mode'] == 'gamemode':
+                selected = GAME_MODES[game_state['pause_menu_index']]
+                game_state['game_mode'] = selected
+                game_state['pause_menu_mode'] = 'main'
+                game_state['pause_menu_index'] = 3
+        
+        elif key == b'\x1b':  # ESC again
+            if game_state['pause_menu_mode'] == 'main':
+                game_state['paused'] = False
+            else:
+                game_state['pause_menu_mode'] = 'main'
+                game_state['pause_menu_index'] = 0
+        
+        elif key == b'w':  # up
+            menu_size = 4 if game_state['pause_menu_mode']=='main' else 3 if game_state['pause_menu_mode']=='difficulty' else 2
+            game_state['pause_menu_index'] = (game_state['pause_menu_index'] - 1) % menu_size
+        
+        elif key == b's':  # down
+            menu_size = 4 if game_state['pause_menu_mode']=='main' else 3 if game_state['pause_menu_mode']=='difficulty' else 2
+            game_state['pause_menu_index'] = (game_state['pause_menu_index'] + 1) % menu_size
+        
+        return
+    
+    if game_state['game_over']:
+        if key == b'r':
+            reset_game()
+        return
+    
+    if key == b'q':
+        toggle_auto_teleport()
+    elif key == b'c':
+        game_state['scores'][0] += 1
+    elif key == b'v':
+        game_state['scores'][1] += 1
+    elif key == b'r':
+        reset_game()
+
+def key_down(key):
+    # Shift and Caps Lock change the character, not the key. The pause
+    # menu still moves one entry per press of w or s, and keys pressed
+    # while paused are not held once the game resumes.
+    key = key.lower()
+    bit = HELD_KEYS.get(key)
+    if bit is None or game_state['paused']:
+        handle_key(key)
+    else:
+        game_state['held_keys'] |= bit
+
+def key_up(key):
+    game_state['held_keys'] &= ~HELD_KEYS.get(key.lower(), 0)
+
+def update_held_keys():
+    held = game_state['held_keys']
+    if not held or game_state['game_over']:
+        return
+    turn = bool(held & HELD_KEYS[b'a']) - bool(held & HELD_KEYS[b'd'])
+    if turn:
+        rotate_player(turn * PLAYER_TURN_SPEED)
+    drive = bool(held & HELD_KEYS[b'w']) - bool(held & HELD_KEYS[b's'])
+    if drive:
+        move_player(drive)
+
+def auto_teleport():
+    teleport_player()
+    game_state['last_auto_teleport_time'] = now()
+    schedule_auto_teleport()
+
+def powerup_due():
+    # spawns the power-up when there is none and expires it otherwise
+    if game_state['game_over']:
+        return
+    if game_state['powerup'] is None and spawn_powerup():
+        schedule_powerup()
+    else:
+        # expired, or there was no room for it: wait for the next one
+        clear_powerup()
+
+def speed_boost_over():
+    game_state['powerup_speed_boost'] = False
+
+# Every timed event is scheduled from a time kept in game_state or on its
+# obstacle, so schedule_events() can rebuild the whole schedule from a
+# reset or a restored snapshot. Keys name the event and, for obstacles,
+# the obstacle's index.
+
+def schedule_powerup():
+    powerup = game_state['powerup']
+    if powerup is None:
+        due = game_state['powerup_next_spawn_time']
+    else:
+        due = powerup['spawn_time'] + game_state['powerup_duration']
+    events.schedule(('powerup',), due, powerup_due)
+
+def schedule_speed_boost():
+    if game_state['powerup_speed_boost']:
+        events.schedule(('speed_boost',), game_state['powerup_speed_end_time'], speed_boost_over)
+    else:
+        events.cancel(('speed_boost',))
+
+def schedule_auto_teleport():
+    if game_state['auto_teleport_enabled']:
+        events.schedule(('auto_teleport',), game_state['last_auto_teleport_time'] + 30, auto_teleport)
+    else:
+        events.cancel(('auto_teleport',))
+
+def schedule_turn(index):
+    events.schedule(('turn', index), obstacles[index].direction_change_time + OBSTACLE_TURN_SECONDS, partial(turn_obstacle, index))
+
+def schedule_blink(index):
+    obs = obstacles[index]
+    events.schedule(('blink', index), obs.toggle_time + obs.next_toggle, partial(blink_obstacle, index))
+
+def schedule_obstacle(index):
+    obs = obstacles[index]
+    if obs.dynamic and obs.type == 'cube':
+        schedule_turn(index)
+    if obs.toggle_time is not None:
+        schedule_blink(index)
+
+def schedule_events():
+    events.clear()
+    schedule_powerup()
+    schedule_speed_boost()
+    schedule_auto_teleport()
+    for index in range(len(obstacles)):
+        schedule_obstacle(index)
+
+def update_events():
+    events.run(now())
+
+schedule_events()
+
+SIM_PHASES = [
+    update_held_keys,
+    update_projectiles,
+    update_explosions,
+    update_events,
+    check_powerup_collection,
+    update_navigation,
+    update_enemy_ai,
+    update_boss_ai,
+    update_dynamic_obstacles,
+    update_portal_effect,
+    check_flag_logic,
+    check_win_condition
+]
+
+# Game modes and the boss fight switch whole sets of systems on and off,
+# so the systems themselves carry no mode checks: core always runs, ctf in
+# capture-the-flag matches and boss while the boss is in play. A set can
+# also add hooks that run when a tank is destroyed, given the tank's index,
+# the tank and the owner of the shell that destroyed it (the boss fires as 1).
+SYSTEM_SETS = {
+    'core': [update_held_keys, update_projectiles, update_explosions, update_events, check_powerup_collection, update_navigation,
+             update_enemy_ai, update_dynamic_obstacles, update_portal_effect, check_win_condition],
+    'boss': [update_boss_ai],
+    'ctf': [check_flag_logic]
+}
+DESTROYED_HOOKS = {
+    'ctf': [ctf_tank_destroyed]
+}
+schedules = {}
+
+def active_sets():
+    sets = ('core',)
+    if game_state['game_mode'] == 'ctf':
+        sets += ('ctf',)
+    if game_state['boss_active']:
+        sets += ('boss',)
+    return sets
+
+def schedule(sets):
+    # the systems of these sets in SIM_PHASES order, and their hooks
+    plan = schedules.get(sets)
+    if plan is None:
+        enabled = {system for name in sets for system in SYSTEM_SETS[name]}
+        plan = ([system for system in SIM_PHASES if system in enabled],
+                [hook for name in sets for hook in DESTROYED_HOOKS.get(name, ())])
+        schedules[sets] = plan
+    return plan
+
+def step():
+    if game_state.get('paused', False):
+        return
+
+    systems = schedule(active_sets())[0]
+    if profiler.enabled:
+        for system in systems:
+            profiler.measure(system.__name__, system)
+    else:
+        for system in systems:
+            system()
+
+    game_state['tick'] += 1
+
+def entity_counts():
+    return {
+        'tanks': len(game_state['tanks']),
+        'projectiles': len(game_state['projectiles']),
+        'explosions': len(game_state['explosions']),
+        'obstacles': len(obstacles)
+    }
+
+def run_headless(ticks, seed_value=None, player=None):
+    # player, if given, is called once per tick before step() to drive tank 0
+    set_clock(tick_clock)
+    if seed_value is not None:
+        seed(seed_value)
+    reset_game()
+    for _ in range(ticks):
+        if game_state['game_over']:
+            break
+        if player is not None:
+            player()
+        step()
+    return game_state
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run Tank Wars without a window")
+    parser.add_argument('--ticks', type=int, default=TICK_RATE * 60)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='easy')
+    parser.add_argument('--mode', choices=GAME_MODES, default='normal')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        seed(args.seed)
+    set_difficulty(args.difficulty)
+    game_state['game_mode'] = args.mode
+    start = time.perf_counter()
+    run_headless(args.ticks)
+    elapsed = time.perf_counter() - start
+    print(f"ticks: {game_state['tick']}  sim time: {game_state['tick'] * TICK_DT:.1f}s  "
+          f"wall: {elapsed:.3f}s  ({game_state['tick'] / max(elapsed, 1e-9):.0f} ticks/s)")
+    print(f"scores: {game_state['scores']}  winner: {game_state['winner']}")
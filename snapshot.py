@@ -0,0 +1,297 @@
+import struct
+
+import numpy as np
+
+from simulation import *
+
+
+# Compact binary snapshot of the whole world: game_state, obstacles and,
+# optionally, both random generators. Every scalar of game_state goes into
+# one fixed WORLD struct; tanks with their enemy AI state, explosions,
+# projectiles and obstacles follow as little-endian arrays. A restored world plays on exactly
+# like the saved one. Strings are stored as their index in the matching
+# tuple, and None as a presence bit or -1. Bump FORMAT_VERSION whenever the
+# layout changes.
+
+MAGIC = b'TWSS'
+FORMAT_VERSION = 7
+
+PAUSE_MENU_MODES = ('main', 'difficulty', 'gamemode')
+FLAG_STATUSES = (None, 'held_by_enemy', 'held_by_player', 'dropped')
+OBSTACLE_TYPES = ('cube', 'barrier')
+
+# bits of WORLD's flags field
+CAMERA_MODE = 1 << 0
+GAME_OVER = 1 << 1
+POWERUP_ACTIVE = 1 << 2
+POWERUP_SPEED_BOOST = 1 << 3
+BOSS_ACTIVE = 1 << 4
+AUTO_TELEPORT = 1 << 5
+PORTAL_ACTIVE = 1 << 6
+PAUSED = 1 << 7
+HAS_POWERUP = 1 << 8
+HAS_BOSS = 1 << 9
+HAS_FLAG_POSITION = 1 << 10
+HAS_RNG = 1 << 11
+
+HEADER = struct.Struct('<4sH')
+WORLD = struct.Struct(
+    '<q'        # tick
+    'q'         # next projectile id
+    'ii'        # scores
+    'H'         # flags
+    'b'         # winner, -1 for None
+    'dddd'      # powerup_spawn_time, powerup_next_spawn_time, powerup_duration, powerup_speed_end_time
+    'B'         # enemy_mode
+    'dd'        # enemy_fire_rate, boss_fire_rate
+    'd'         # last_auto_teleport_time
+    'dddi'      # portal_position, portal_timer
+    'iBBBB'     # pause_menu_index, pause_menu_mode, difficulty, game_mode, held_keys
+    'dddd'      # powerup position, spawn_time
+    'ddddi'     # boss position, rotation, health
+    'Bdddid'    # flag status, position, holder (-1 for None), hold_timer
+    'IIII'      # tanks, explosions, projectiles, obstacles
+)
+# random.Random: version, gauss_next presence and value, then 625 words
+PY_RNG = struct.Struct('<iBd')
+PY_RNG_WORDS = 625
+# PCG64: state and increment as 128-bit halves, has_uint32, uinteger
+NP_RNG = struct.Struct('<QQQQiI')
+
+# obstacle table, one row of every Obstacle field: type, x, z, size, dynamic,
+# toggling, speed, direction, direction_change_time, visible, toggle_time,
+# next_toggle, rotation, rotation_speed. toggling is 0 where toggle_time is
+# None, the one field that can be absent.
+OBSTACLE_COLUMNS = 15
+
+
+def _pack_obstacles():
+    rows = []
+    for obs in obstacles:
+        toggle_time = obs.toggle_time
+        rows.append((OBSTACLE_TYPES.index(obs.type), obs.x, obs.z, obs.size, obs.dynamic, toggle_time is not None,
+                     obs.speed, *obs.direction, obs.direction_change_time, obs.visible,
+                     toggle_time or 0.0, obs.next_toggle, obs.rotation, obs.rotation_speed))
+    return np.array(rows, dtype='<f8').reshape(len(rows), OBSTACLE_COLUMNS)
+
+def _unpack_obstacles(table):
+    result = []
+    for row in table.tolist():
+        size = row[3]
+        obs = Obstacle(OBSTACLE_TYPES[int(row[0])], row[1], row[2], int(size) if size.is_integer() else size, bool(row[4]),
+                       speed=row[6], direction=(row[7], row[8]), direction_change_time=row[9],
+                       visible=bool(row[10]), toggle_time=row[11] if row[5] else None, next_toggle=row[12],
+                       rotation=row[13], rotation_speed=row[14])
+        result.append(obs)
+    return result
+
+def _pack_rngs():
+    version, words, gauss_next = rng.getstate()
+    state = np_rng.bit_generator.state
+    if state['bit_generator'] != 'PCG64':
+        raise ValueError(f"cannot snapshot a {state['bit_generator']} generator")
+    pcg = state['state']
+    mask = (1 << 64) - 1
+    return b''.join((
+        PY_RNG.pack(version, gauss_next is not None, gauss_next or 0.0),
+        np.array(words, dtype='<u4').tobytes(),
+        NP_RNG.pack(pcg['state'] >> 64, pcg['state'] & mask, pcg['inc'] >> 64, pcg['inc'] & mask,
+                    state['has_uint32'], state['uinteger'])
+    ))
+
+def _unpack_rngs(data, offset):
+    version, has_gauss, gauss_next = PY_RNG.unpack_from(data, offset)
+    offset += PY_RNG.size
+    words = np.frombuffer(data, dtype='<u4', count=PY_RNG_WORDS, offset=offset).tolist()
+    offset += PY_RNG_WORDS * 4
+    rng.setstate((version, tuple(words), gauss_next if has_gauss else None))
+    state_hi, state_lo, inc_hi, inc_lo, has_uint32, uinteger = NP_RNG.unpack_from(data, offset)
+    np_rng.bit_generator.state = {
+        'bit_generator': 'PCG64',
+        'state': {'state': (state_hi << 64) | state_lo, 'inc': (inc_hi << 64) | inc_lo},
+        'has_uint32': has_uint32,
+        'uinteger': uinteger
+    }
+    return offset + NP_RNG.size
+
+def save_state(include_rng=True):
+    g = game_state
+    tanks = g['tanks']
+    explosions = g['explosions']
+    store = g['projectiles']
+    n = len(store)
+    powerup = g['powerup']
+    boss = g['boss']
+    flag = g['flag']
+
+    flags = 0
+    for bit, on in ((CAMERA_MODE, g['camera_mode']), (GAME_OVER, g['game_over']),
+                    (POWERUP_ACTIVE, g['powerup_active']), (POWERUP_SPEED_BOOST, g['powerup_speed_boost']),
+                    (BOSS_ACTIVE, g['boss_active']), (AUTO_TELEPORT, g['auto_teleport_enabled']),
+                    (PORTAL_ACTIVE, g['portal_active']), (PAUSED, g['paused']),
+                    (HAS_POWERUP, powerup is not None), (HAS_BOSS, boss is not None),
+                    (HAS_FLAG_POSITION, flag['position'] is not None),
+                    (HAS_RNG, include_rng)):
+        if on:
+            flags |= bit
+
+    powerup_pos = powerup['position'] if powerup is not None else (0, 0, 0)
+    boss_pos = boss.position if boss is not None else (0, 0, 0)
+    flag_pos = flag['position'] if flag['position'] is not None else (0, 0, 0)
+    winner = g['winner']
+    holder = flag['holder']
+
+    parts = [
+        HEADER.pack(MAGIC, FORMAT_VERSION),
+        WORLD.pack(
+            g['tick'], store.next_id, g['scores'][0], g['scores'][1], flags, -1 if winner is None else winner,
+            g['powerup_spawn_time'], g['powerup_next_spawn_time'], g['powerup_duration'], g['powerup_speed_end_time'],
+            ENEMY_MODES.index(g['enemy_mode']),
+            g['enemy_fire_rate'], g['boss_fire_rate'], g['last_auto_teleport_time'],
+            *g['portal_position'], g['portal_timer'],
+            g['pause_menu_index'], PAUSE_MENU_MODES.index(g['pause_menu_mode']),
+            DIFFICULTIES.index(g['difficulty']), GAME_MODES.index(g['game_mode']), g['held_keys'],
+            *powerup_pos, powerup['spawn_time'] if powerup is not None else 0.0,
+            *boss_pos, boss.rotation if boss is not None else 0.0, boss.health if boss is not None else 0,
+            FLAG_STATUSES.index(flag['status']), *flag_pos, -1 if holder is None else holder, flag['hold_timer'],
+            len(tanks), len(explosions), n, len(obstacles)
+        ),
+        _pack_tanks().astype('<f8', copy=False).tobytes(),
+        np.array([(*e.position, e.lifetime) for e in explosions], dtype='<f8').tobytes(),
+        store.position[:n].astype('<f8', copy=False).tobytes(),
+        store.previous[:n].astype('<f8', copy=False).tobytes(),
+        store.direction[:n].astype('<f8', copy=False).tobytes(),
+        store.owner[:n].astype('<i4', copy=False).tobytes(),
+        store.ids[:n].astype('<i8', copy=False).tobytes()
+    ]
+    parts.append(_pack_obstacles().astype('<f8', copy=False).tobytes())
+    if include_rng:
+        parts.append(_pack_rngs())
+    return b''.join(parts)
+
+# x, y, z, rotation, health, controlled, then the AI components, 0 on the player
+TANK_COLUMNS = 6 + len(AI_COMPONENTS)
+
+def _pack_tanks():
+    rows = world.query('tank_index')
+    table = np.zeros((len(rows), TANK_COLUMNS))
+    table[:, 0:3] = world['position'][rows]
+    table[:, 3] = world['rotation'][rows]
+    table[:, 4] = world['health'][rows]
+    table[:, 5] = world.tagged(rows, 'controlled')
+    ai = world.tagged(rows, AI_COMPONENTS[0])
+    for column, name in enumerate(AI_COMPONENTS, 6):
+        table[ai, column] = world[name][rows[ai]]
+    return table
+
+def _unpack_tanks(table):
+    # Reuses the tank entities already in the world, so handles held
+    # elsewhere stay valid when the tank count is unchanged.
+    tanks = game_state['tanks']
+    remove_tanks(len(table))
+    while len(tanks) < len(table):
+        add_tank((0, 0, 0), 0, 0)
+    for tank, controlled in zip(tanks, table[:, 5].tolist()):
+        if tank.controlled != bool(controlled):
+            tank.controlled = bool(controlled)
+    rows = world.query('tank_index')
+    world['position'][rows] = table[:, 0:3]
+    world['rotation'][rows] = table[:, 3]
+    world['health'][rows] = table[:, 4]
+    ai = world.tagged(rows, AI_COMPONENTS[0])
+    for column, name in enumerate(AI_COMPONENTS, 6):
+        world[name][rows[ai]] = table[ai, column]
+
+def _read(data, offset, dtype, count, columns=None):
+    values = np.frombuffer(data, dtype=dtype, count=count * (columns or 1), offset=offset)
+    if columns is not None:
+        values = values.reshape(count, columns)
+    return values, offset + values.nbytes
+
+def restore_state(data):
+    # Rebuilds game_state and obstacles in place so modules holding them
+    # stay valid. Random generators are restored only if they were saved.
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("not a Tank Wars snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"snapshot format {version}, expected {FORMAT_VERSION}")
+    (tick, next_id, score0, score1, flags, winner,
+     powerup_spawn_time, powerup_next_spawn_time, powerup_duration, powerup_speed_end_time,
+     enemy_mode,
+     enemy_fire_rate, boss_fire_rate, last_auto_teleport_time,
+     portal_x, portal_y, portal_z, portal_timer,
+     pause_menu_index, pause_menu_mode, difficulty, game_mode, held_keys,
+     powerup_x, powerup_y, powerup_z, powerup_spawn,
+     boss_x, boss_y, boss_z, boss_rotation, boss_health,
+     flag_status, flag_x, flag_y, flag_z, holder, hold_timer,
+     tank_count, explosion_count, n, obstacle_count) = WORLD.unpack_from(data, HEADER.size)
+    offset = HEADER.size + WORLD.size
+
+    tanks, offset = _read(data, offset, '<f8', tank_count, TANK_COLUMNS)
+    explosions, offset = _read(data, offset, '<f8', explosion_count, 4)
+    position, offset = _read(data, offset, '<f8', n, 3)
+    previous, offset = _read(data, offset, '<f8', n, 3)
+    direction, offset = _read(data, offset, '<f8', n, 3)
+    owner, offset = _read(data, offset, '<i4', n)
+    ids, offset = _read(data, offset, '<i8', n)
+
+    table, offset = _read(data, offset, '<f8', obstacle_count, OBSTACLE_COLUMNS)
+    if flags & HAS_RNG:
+        offset = _unpack_rngs(data, offset)
+
+    store = game_state.get('projectiles')
+    if not isinstance(store, ProjectileStore):
+        store = ProjectileStore()
+    store.clear()
+    store.add_many(position, direction, owner)
+    store.previous[:n] = previous
+    store.ids[:n] = ids
+    store.next_id = next_id
+
+    _unpack_tanks(tanks)
+    if flags & HAS_BOSS:
+        place_boss((boss_x, boss_y, boss_z), boss_rotation, boss_health)
+    else:
+        remove_boss()
+
+    game_state.update({
+        'tick': tick,
+        'projectiles': store,
+        'scores': [score0, score1],
+        'camera_mode': bool(flags & CAMERA_MODE),
+        'explosions': [Explosion((x, y, z), int(lifetime)) for x, y, z, lifetime in explosions.tolist()],
+        'game_over': bool(flags & GAME_OVER),
+        'winner': None if winner < 0 else winner,
+        'powerup': {'position': (powerup_x, powerup_y, powerup_z), 'spawn_time': powerup_spawn} if flags & HAS_POWERUP else None,
+        'powerup_spawn_time': powerup_spawn_time,
+        'powerup_next_spawn_time': powerup_next_spawn_time,
+        'powerup_duration': int(powerup_duration) if powerup_duration.is_integer() else powerup_duration,
+        'powerup_active': bool(flags & POWERUP_ACTIVE),
+        'powerup_speed_boost': bool(flags & POWERUP_SPEED_BOOST),
+        'powerup_speed_end_time': powerup_speed_end_time,
+        'enemy_mode': ENEMY_MODES[enemy_mode],
+        'boss_active': bool(flags & BOSS_ACTIVE),
+        'enemy_fire_rate': enemy_fire_rate,
+        'boss_fire_rate': boss_fire_rate,
+        'auto_teleport_enabled': bool(flags & AUTO_TELEPORT),
+        'last_auto_teleport_time': last_auto_teleport_time,
+        'portal_active': bool(flags & PORTAL_ACTIVE),
+        'portal_position': (portal_x, portal_y, portal_z),
+        'portal_timer': portal_timer,
+        'paused': bool(flags & PAUSED),
+        'held_keys': held_keys,
+        'pause_menu_index': pause_menu_index,
+        'pause_menu_mode': PAUSE_MENU_MODES[pause_menu_mode],
+        'difficulty': DIFFICULTIES[difficulty],
+        'game_mode': GAME_MODES[game_mode],
+        'flag': {
+            'status': FLAG_STATUSES[flag_status],
+            'position': (flag_x, flag_y, flag_z) if flags & HAS_FLAG_POSITION else None,
+            'holder': None if holder < 0 else holder,
+            'hold_timer': hold_timer
+        }
+    })
+    obstacles[:] = _unpack_obstacles(table)
+    rebuild_obstacle_grid()
+    schedule_events()
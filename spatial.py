@@ -0,0 +1,188 @@
+import numpy as np
+
+
+class SpatialGrid:
+    # Uniform hash grid over the arena floor (x/z plane). Each entry is a
+    # circle; it is listed in every cell its bounding square touches, so a
+    # query only has to look at the cells under the query circle.
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entries = {}
+        # dense mask of the non-empty cells, dropped whenever a cell gains
+        # its first entry or loses its last
+        self._occupancy = None
+
+    def _span(self, x, z, radius):
+        cs = self.cell_size
+        return (int((x - radius) // cs), int((z - radius) // cs),
+                int((x + radius) // cs), int((z + radius) // cs))
+
+    def _link(self, key, span):
+        x0, z0, x1, z1 = span
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cz in range(z0, z1 + 1):
+                bucket = cells.get((cx, cz))
+                if bucket is None:
+                    cells[(cx, cz)] = {key}
+                    self._occupancy = None
+                else:
+                    bucket.add(key)
+
+    def _unlink(self, key, span):
+        x0, z0, x1, z1 = span
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cz in range(z0, z1 + 1):
+                bucket = cells.get((cx, cz))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del cells[(cx, cz)]
+                        self._occupancy = None
+
+    def insert(self, key, item, x, z, radius=0.0):
+        if key in self.entries:
+            self.remove(key)
+        span = self._span(x, z, radius)
+        self.entries[key] = [item, span]
+        self._link(key, span)
+
+    def move(self, key, item, x, z, radius=0.0):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.insert(key, item, x, z, radius)
+            return
+        entry[0] = item
+        span = self._span(x, z, radius)
+        if span != entry[1]:
+            self._unlink(key, entry[1])
+            self._link(key, span)
+            entry[1] = span
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self._unlink(key, entry[1])
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+        self._occupancy = None
+
+    def keys(self):
+        return self.entries.keys()
+
+    def query(self, x, z, radius=0.0):
+        # Candidate keys whose cells overlap the query circle. Callers still
+        # run their own exact distance test on the returned entries.
+        x0, z0, x1, z1 = self._span(x, z, radius)
+        cells = self.cells
+        if x0 == x1 and z0 == z1:
+            bucket = cells.get((x0, z0))
+            return list(bucket) if bucket else []
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cz in range(z0, z1 + 1):
+                bucket = cells.get((cx, cz))
+                if bucket:
+                    found.update(bucket)
+        return list(found)
+
+    def query_items(self, x, z, radius=0.0):
+        entries = self.entries
+        return [entries[key][0] for key in self.query(x, z, radius)]
+
+    def occupancy(self):
+        # (first cell x, first cell z, mask) covering every non-empty cell,
+        # with an empty border so lookups outside can be clamped onto it.
+        if self._occupancy is None:
+            if self.cells:
+                keys = np.array(list(self.cells), dtype=np.int64)
+                low = keys.min(axis=0) - 1
+                mask = np.zeros(tuple(keys.max(axis=0) - low + 2), dtype=bool)
+                mask[keys[:, 0] - low[0], keys[:, 1] - low[1]] = True
+                self._occupancy = (int(low[0]), int(low[1]), mask)
+            else:
+                self._occupancy = (0, 0, np.zeros((1, 1), dtype=bool))
+        return self._occupancy
+
+    def cell_indices(self, x):
+        # Vectorised cell coordinate along one axis, as _span computes it.
+        return np.floor(x / self.cell_size).astype(np.int64)
+
+    def occupied(self, cx, cz):
+        # Vectorised: whether each cell (cx[i], cz[i]) holds any entry.
+        x0, z0, mask = self.occupancy()
+        return mask[np.clip(cx - x0, 0, mask.shape[0] - 1), np.clip(cz - z0, 0, mask.shape[1] - 1)]
+
+    def crossed(self, x0, z0, x1, z1):
+        # Batched grid DDA over equal-length float arrays: whether each
+        # segment from (x0[i], z0[i]) to (x1[i], z1[i]) may cross a cell
+        # holding any entry. The boundary crossings of all segments are laid
+        # out and sorted at once rather than stepped, and callers run their
+        # own exact test on the segments that may.
+        cs = self.cell_size
+        cx = self.cell_indices(x0)
+        cz = self.cell_indices(z0)
+        end_x = self.cell_indices(x1)
+        end_z = self.cell_indices(z1)
+
+        # nothing to walk when no entry lies under the box around them all
+        result = np.zeros(len(cx), dtype=bool)
+        if len(cx) == 0:
+            return result
+        origin_x, origin_z, mask = self.occupancy()
+        low_x = max(min(cx.min(), end_x.min()) - origin_x, 0)
+        low_z = max(min(cz.min(), end_z.min()) - origin_z, 0)
+        high_x = max(cx.max(), end_x.max()) - origin_x + 1
+        high_z = max(cz.max(), end_z.max()) - origin_z + 1
+        if high_x <= 0 or high_z <= 0 or not mask[low_x:high_x, low_z:high_z].any():
+            return result
+
+        # Most segments end in the cell they start in. One crossing at most
+        # one boundary along each axis stays within the four cells at its
+        # corners, and checking all four is close enough for a broad phase.
+        # Only longer segments are walked.
+        result = self.occupied(cx, cz)
+        steps_x = np.abs(end_x - cx)
+        steps_z = np.abs(end_z - cz)
+        short = np.flatnonzero((steps_x + steps_z > 0) & (steps_x <= 1) & (steps_z <= 1))
+        if len(short):
+            corners = self.occupied(np.concatenate((end_x[short], cx[short], end_x[short])),
+                                    np.concatenate((end_z[short], end_z[short], cz[short])))
+            result[short] |= corners.reshape(3, -1).any(axis=0)
+        walking = np.flatnonzero((steps_x > 1) | (steps_z > 1))
+        if len(walking) == 0:
+            return result
+        x0 = x0[walking]
+        z0 = z0[walking]
+        cx = cx[walking]
+        cz = cz[walking]
+        steps_x = steps_x[walking]
+        steps_z = steps_z[walking]
+        dx = x1[walking] - x0
+        dz = z1[walking] - z0
+
+        # segment fraction at each x and z cell boundary crossed, in order
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first_x = np.where(dx != 0, ((cx + (dx > 0)) * cs - x0) / dx, np.inf)
+            first_z = np.where(dz != 0, ((cz + (dz > 0)) * cs - z0) / dz, np.inf)
+            delta_x = np.where(dx != 0, cs / np.abs(dx), 0)
+            delta_z = np.where(dz != 0, cs / np.abs(dz), 0)
+        k = np.arange(max(int(steps_x.max()), int(steps_z.max())))
+        cross_x = np.where(k < steps_x[:, None], first_x[:, None] + k * delta_x[:, None], np.inf)
+        cross_z = np.where(k < steps_z[:, None], first_z[:, None] + k * delta_z[:, None], np.inf)
+
+        # merged, each crossing moves one cell along its axis
+        times = np.concatenate((cross_x, cross_z), axis=1)
+        order = np.argsort(times, axis=1, kind='stable')
+        passed = np.isfinite(np.take_along_axis(times, order, axis=1))
+        along_x = (order < len(k)) & passed
+        walk_x = cx[:, None] + np.where(dx > 0, 1, -1)[:, None] * np.cumsum(along_x, axis=1)
+        walk_z = cz[:, None] + np.where(dz > 0, 1, -1)[:, None] * np.cumsum(passed & ~along_x, axis=1)
+        rows = np.nonzero(passed)[0]
+        result[walking[rows[self.occupied(walk_x[passed], walk_z[passed])]]] = True
+        return result
@@ -0,0 +1,61 @@
+import pytest
+
+import base
+from inputs import InputBuffer
+from replay import KEY, KEY_UP
+from simulation import *
+
+
+@pytest.fixture
+def game():
+    set_clock(tick_clock)
+    seed(5)
+    game_state['paused'] = False
+    reset_game()
+    yield game_state
+    game_state['paused'] = False
+    base.input_buffer.clear()
+
+
+def test_shifted_release_lets_go_of_the_key(game):
+    key_down(b'w')
+    key_up(b'W')
+    assert game['held_keys'] == 0
+
+
+def test_caps_lock_keys_are_held(game):
+    key_down(b'W')
+    key_down(b'A')
+    assert game['held_keys'] == HELD_KEYS[b'w'] | HELD_KEYS[b'a']
+
+
+def test_pause_lets_go_of_held_keys(game):
+    key_down(b'w')
+    key_down(b'\x1b')
+    key_down(b'd')
+    assert game['paused'] and game['held_keys'] == 0
+    key_down(b'\x1b')
+    assert not game['paused'] and game['held_keys'] == 0
+
+
+def test_release_lets_go_of_keys_down_and_waiting():
+    buffer = InputBuffer(clock=lambda: 0.0)
+    buffer.push(KEY, ord('w'))
+    buffer.take(0.0)
+    buffer.push(KEY, ord('a'))
+    buffer.push(KEY, ord('s'))
+    buffer.push(KEY_UP, ord('s'))
+    buffer.release()
+    buffer.take(0.0)
+    assert buffer.held == []
+
+
+def test_window_leaving_releases_held_keys(game):
+    base.input_buffer.clear()
+    base.keyboardListener(b'w', 0, 0)
+    base.keyboardListener(b'D', 0, 0)
+    base.apply_inputs(float('inf'))
+    assert game['held_keys'] == HELD_KEYS[b'w'] | HELD_KEYS[b'd']
+    base.entryListener(base.GLUT_LEFT)
+    base.apply_inputs(float('inf'))
+    assert game['held_keys'] == 0 and base.input_buffer.held == []
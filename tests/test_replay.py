@@ -0,0 +1,78 @@
+import pytest
+
+import base
+from replay import KEY, KEY_UP, Recording, Playback, start_recording
+from simulation import *
+from snapshot import save_state
+
+ESC = 27
+
+
+class Window:
+    # Drives base.advance() from a fake clock, as the frame timer would.
+
+    def __init__(self):
+        self.time = 100.0
+        base.input_buffer.clock = lambda: self.time
+        base.input_buffer.clear()
+        base.last_frame_time = self.time
+        base.sim_accumulator = 0.0
+
+    def frames(self, count=1):
+        for _ in range(count):
+            self.time += TICK_DT
+            base.advance(self.time)
+
+    def key(self, key, up=False):
+        (base.keyboardUpListener if up else base.keyboardListener)(key, 0, 0)
+
+
+@pytest.fixture
+def window():
+    yield Window()
+    base.recording = None
+    base.playback = None
+    base.input_buffer.clear()
+    game_state['paused'] = False
+
+
+def play_in_window(window, recording):
+    base.recording = None
+    base.playback = Playback(recording)
+    window.frames(recording.ticks + 10)
+    return base.playback
+
+
+def test_window_replay_resumes_after_pause(window):
+    base.recording = recording = start_recording(7)
+    window.frames(30)
+    window.key(b'w')
+    window.frames(20)
+    window.key(b'\x1b')
+    window.frames(15)
+    assert game_state['paused']
+    window.key(b's')
+    window.frames(2)
+    window.key(b's', up=True)
+    window.key(b'\x1b')
+    window.frames(40)
+    window.key(b'w', up=True)
+    window.frames(30)
+    assert not game_state['paused']
+    expected = save_state()
+
+    playback = play_in_window(window, recording)
+    assert playback.finished()
+    assert not game_state['paused']
+    assert save_state() == expected
+
+
+def test_window_replay_resumes_from_a_later_tick(window):
+    recording = start_recording(3)
+    recording.events = [(60, KEY, ESC, 0), (62, KEY, ESC, 0)]
+    recording.ticks = 121
+
+    playback = play_in_window(window, recording)
+    assert playback.tick == 121
+    assert not game_state['paused']
+    assert game_state['tick'] == 119
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from simulation import *
+from tuning import drive_player
+from vecenv import TankEnv, MOVE, TURN, FIRE
+
+# short of the first turn of a moving cube, whose new heading each side
+# draws from its own generator; the blinking cube goes down once on the way
+TICKS = OBSTACLE_TURN_SECONDS * TICK_RATE - 1
+BLINK_TICK = TICKS - OBSTACLE_HIDDEN_SECONDS[0] * TICK_RATE + 10
+
+
+def mirror(env):
+    # The simulation set up as arena 0: the player and one enemy no AI
+    # drives, the same obstacles, and the first blink on the same tick.
+    set_clock(tick_clock)
+    seed(11)
+    set_difficulty('medium')
+    game_state['game_mode'] = 'normal'
+    reset_game()
+    remove_tanks(2)
+    enemy = game_state['tanks'][1]
+    for name in AI_COMPONENTS:
+        world.discard(enemy.entity, name)
+    for tank, sim_tank in enumerate(game_state['tanks']):
+        sim_tank.position = (env.pos[0, tank, 0], 0, env.pos[0, tank, 1])
+        sim_tank.rotation = env.rot[0, tank]
+        sim_tank.health = 100
+
+    obstacles[:] = new_obstacles()
+    for i, obs in enumerate(obstacles):
+        if obs.toggle_time is not None:
+            obs.toggle_time = 0.0
+            obs.next_toggle = (env.toggle_at[0, i] - 0.5) / TICK_RATE
+    rebuild_obstacle_grid()
+    schedule_events()
+
+
+def assert_matches(env):
+    tanks = game_state['tanks']
+    np.testing.assert_allclose([tank.position[::2] for tank in tanks], env.pos[0], atol=1e-6)
+    np.testing.assert_allclose([tank.rotation for tank in tanks], env.rot[0], atol=1e-6)
+    assert [tank.health for tank in tanks] == env.health[0].tolist()
+    np.testing.assert_allclose([(obs.x, obs.z, obs.rotation) for obs in obstacles],
+                               np.stack((env.obs_x[0], env.obs_z[0], env.obs_angle[0]), axis=1), atol=1e-6)
+    assert [obs.visible for obs in obstacles] == env.visible[0].tolist()
+    store = game_state['projectiles']
+    shells = sorted(map(tuple, store.position[:store.count, ::2].round(6)))
+    assert shells == sorted(map(tuple, env.shell_pos[0, env.shell_live[0]].round(6)))
+
+
+@pytest.mark.parametrize('seed_value', [1, 2, 14, 16, 32])
+def test_arena_matches_simulation(seed_value):
+    env = TankEnv(1, seed=seed_value, difficulty='medium')
+    env.reset()
+    env.toggle_at[0, env.toggles] = BLINK_TICK
+    mirror(env)
+    actions = np.random.default_rng(seed_value).integers(-1, 2, (TICKS, 1, 3))
+    state = {'reload': 0, 'shots': 0}
+    hits = 0
+    blinked = False
+    for tick in range(TICKS):
+        move, turn, fire = actions[tick, 0, MOVE], actions[tick, 0, TURN], actions[tick, 0, FIRE] > 0
+        ready = env.reload[0, 1] <= 0
+        drive_player(state)
+        rotate_player(turn * env.enemy_turn, 1)
+        move_player(move * env.enemy_speed / TANK_SPEED, 1)
+        if fire and ready:
+            fire_player(1)
+        step()
+        _, _, done, _ = env.step(actions[tick] * (1, 1, fire))
+        if done[0]:
+            break
+        hits += int((env.health[0] < 100).sum())
+        blinked |= not env.visible[0, env.toggles].all()
+        assert_matches(env)
+    assert hits and blinked
@@ -0,0 +1,272 @@
+import sys
+import json
+import math
+import time
+import argparse
+import itertools
+import multiprocessing
+
+import numpy as np
+
+from simulation import *
+
+
+# Monte Carlo runner for enemy tuning. Every parameter set - one value each
+# for ENEMY_PROJECTILE_DAMAGE, ENEMY_FIRE_COOLDOWN and ENEMY_MISS_CHANCE at
+# the chosen difficulty - plays a batch of headless matches against a
+# scripted player, spread over a process pool. Each match seeds the game
+# from its own SeedSequence child of (seed, set, match), so results do not
+# depend on which worker ran it or in what order. Workers send back one
+# small summary per match, folded into running totals as they arrive, and
+# each set ends up as one report entry. Kills are read from the tanks
+# destroyed, not the scores: every enemy kill scores for the enemy side,
+# enemies shooting each other included.
+
+REPORT_VERSION = 2
+MAX_MATCH_SECONDS = 300
+
+# scripted player: turn rate and reload, close enough to a steady human
+PLAYER_TURN = 3.0
+PLAYER_RELOAD_TICKS = TICK_RATE // 2
+PLAYER_AIM = 3.0
+PLAYER_RANGE = (12, 25)
+
+
+class RunningStat:
+    # Count, mean and variance without keeping the samples (Welford).
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def add_all(self, values):
+        for value in values:
+            self.add(value)
+
+    def summary(self):
+        if self.count == 0:
+            return {'n': 0, 'mean': None, 'sd': None}
+        sd = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return {'n': self.count, 'mean': round(self.mean, 4), 'sd': round(sd, 4)}
+
+
+def nearest_target(me):
+    targets = [tank.position for tank in game_state['tanks'][1:] if tank.health > 0]
+    if game_state['boss_active']:
+        targets.append(game_state['boss'].position)
+    if not targets:
+        return None
+    return min(targets, key=lambda pos: (pos[0] - me[0]) ** 2 + (pos[2] - me[2]) ** 2)
+
+def drive_player(state):
+    # Turns toward the nearest enemy, keeps it within PLAYER_RANGE and
+    # fires whenever lined up and reloaded.
+    me = game_state['tanks'][0]
+    target = nearest_target(me.position)
+    if target is None:
+        return
+    dx = target[0] - me.position[0]
+    dz = target[2] - me.position[2]
+    diff = (math.degrees(math.atan2(dx, dz)) - me.rotation + 180) % 360 - 180
+    rotate_player(max(-PLAYER_TURN, min(PLAYER_TURN, diff)))
+    if abs(diff) < 20:
+        distance = math.sqrt(dx ** 2 + dz ** 2)
+        if distance > PLAYER_RANGE[1]:
+            move_player(1)
+        elif distance < PLAYER_RANGE[0]:
+            move_player(-1)
+    if abs(diff) < PLAYER_AIM and game_state['tick'] >= state['reload']:
+        fire_player()
+        state['shots'] += 1
+        state['reload'] = game_state['tick'] + PLAYER_RELOAD_TICKS
+
+def match_seed(seed_value, set_index, match_index):
+    # 128 bits from this match's own stream, usable by both generators
+    words = np.random.SeedSequence(seed_value, spawn_key=(set_index, match_index)).generate_state(4)
+    return sum(int(word) << (32 * i) for i, word in enumerate(words))
+
+def record_destroyed(tank_idx, tank, killer):
+    destroyed.append((tank_idx, killer))
+
+def init_worker(difficulty, mode, max_ticks):
+    global match_ticks, destroyed
+    match_ticks = max_ticks
+    destroyed = []
+    DESTROYED_HOOKS.setdefault('core', []).append(record_destroyed)
+    schedules.clear()
+    set_clock(tick_clock)
+    set_difficulty(difficulty)
+    game_state['game_mode'] = mode
+
+def play_match(task):
+    set_index, params, seed_value = task
+    difficulty = game_state['difficulty']
+    ENEMY_PROJECTILE_DAMAGE[difficulty] = params['damage']
+    ENEMY_FIRE_COOLDOWN[difficulty] = params['cooldown']
+    ENEMY_MISS_CHANCE[difficulty] = params['miss_chance']
+
+    seed(seed_value)
+    reset_game()
+    store = game_state['projectiles']
+    first_id = store.next_id
+    state = {'reload': 0, 'shots': 0}
+    deaths = []
+    # enemy tank index -> seconds each of its lives lasted before the player
+    # killed it
+    kills = {}
+    # tank index -> tick its current life started; every tank's clock
+    # restarts when it dies, whoever killed it
+    alive_since = {}
+    destroyed.clear()
+    while not game_state['game_over'] and game_state['tick'] < match_ticks:
+        drive_player(state)
+        step()
+        tick = game_state['tick']
+        for tank_idx, killer in destroyed:
+            lived = (tick - alive_since.get(tank_idx, 0)) * TICK_DT
+            alive_since[tank_idx] = tick
+            if tank_idx == 0:
+                deaths.append(lived)
+            elif killer == 0:
+                kills.setdefault(tank_idx, []).append(lived)
+        destroyed.clear()
+
+    return set_index, {
+        'winner': game_state['winner'],
+        'seconds': game_state['tick'] * TICK_DT,
+        'player_deaths': deaths,
+        'enemy_kills': kills,
+        'player_shots': state['shots'],
+        # every shell not fired by the script came from an enemy or the boss
+        'enemy_shots': store.next_id - first_id - state['shots']
+    }
+
+
+class SetReport:
+    # Running totals for one parameter set.
+
+    def __init__(self, params):
+        self.params = params
+        self.outcomes = {'player': 0, 'enemy': 0, 'timeout': 0}
+        self.seconds = RunningStat()
+        self.player_ttk = RunningStat()
+        self.enemy_ttk = RunningStat()
+        self.enemy_ttk_by_tank = {}
+        self.player_shots = RunningStat()
+        self.enemy_shots = RunningStat()
+
+    def add(self, result):
+        winner = result['winner']
+        self.outcomes['timeout' if winner is None else 'player' if winner == 0 else 'enemy'] += 1
+        self.seconds.add(result['seconds'])
+        self.player_ttk.add_all(result['player_deaths'])
+        for tank_idx, times in result['enemy_kills'].items():
+            self.enemy_ttk.add_all(times)
+            self.enemy_ttk_by_tank.setdefault(tank_idx, RunningStat()).add_all(times)
+        self.player_shots.add(result['player_shots'])
+        self.enemy_shots.add(result['enemy_shots'])
+
+    def report(self):
+        matches = sum(self.outcomes.values())
+        rate = self.outcomes['player'] / matches if matches else 0.0
+        # normal approximation, fine at the match counts a sweep uses
+        margin = 1.96 * math.sqrt(rate * (1 - rate) / matches) if matches else 0.0
+        return {
+            'params': self.params,
+            'matches': matches,
+            'outcomes': dict(self.outcomes),
+            'player_win_rate': round(rate, 4),
+            'player_win_rate_95': [round(max(rate - margin, 0), 4), round(min(rate + margin, 1), 4)],
+            'match_seconds': self.seconds.summary(),
+            # seconds the player survives before an enemy kills it, and
+            # the other way round
+            'player_time_to_kill': self.player_ttk.summary(),
+            'enemy_time_to_kill': self.enemy_ttk.summary(),
+            'enemy_time_to_kill_by_tank': {str(tank_idx): stat.summary()
+                                           for tank_idx, stat in sorted(self.enemy_ttk_by_tank.items())},
+            'player_shots_per_match': self.player_shots.summary(),
+            'enemy_shots_per_match': self.enemy_shots.summary()
+        }
+
+
+def mean_text(summary, width=6):
+    return f"{summary['mean']:{width}.1f}" if summary['mean'] is not None else '-'.rjust(width)
+
+def parse_values(text, kind):
+    return [kind(value) for value in text.split(',')]
+
+def parameter_sets(damages, cooldowns, miss_chances):
+    return [{'damage': damage, 'cooldown': cooldown, 'miss_chance': miss}
+            for damage, cooldown, miss in itertools.product(damages, cooldowns, miss_chances)]
+
+def run_sweep(sets, matches, seed_value, difficulty, mode, workers, max_seconds=MAX_MATCH_SECONDS, progress=None):
+    reports = [SetReport(params) for params in sets]
+    tasks = ((i, params, match_seed(seed_value, i, m)) for i, params in enumerate(sets) for m in range(matches))
+    total = len(sets) * matches
+    with multiprocessing.Pool(workers, initializer=init_worker,
+                              initargs=(difficulty, mode, int(max_seconds * TICK_RATE))) as pool:
+        for done, (set_index, result) in enumerate(pool.imap_unordered(play_match, tasks, chunksize=4), 1):
+            reports[set_index].add(result)
+            if progress is not None:
+                progress(done, total)
+    return [report.report() for report in reports]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep enemy tuning parameters over headless Tank Wars matches")
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='medium')
+    parser.add_argument('--mode', choices=GAME_MODES, default='normal')
+    parser.add_argument('--damage', help="comma-separated ENEMY_PROJECTILE_DAMAGE values (default: current)")
+    parser.add_argument('--cooldown', help="comma-separated ENEMY_FIRE_COOLDOWN values in seconds (default: current)")
+    parser.add_argument('--miss-chance', help="comma-separated ENEMY_MISS_CHANCE values (default: current)")
+    parser.add_argument('--matches', type=int, default=200, help="matches per parameter set")
+    parser.add_argument('--workers', type=int, default=None, help="processes in the pool (default: one per core)")
+    parser.add_argument('--max-seconds', type=float, default=MAX_MATCH_SECONDS, help="sim seconds before a match counts as a timeout")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', metavar='PATH', help="write the report as JSON to PATH")
+    args = parser.parse_args()
+
+    difficulty = args.difficulty
+    sets = parameter_sets(parse_values(args.damage, int) if args.damage else [ENEMY_PROJECTILE_DAMAGE[difficulty]],
+                          parse_values(args.cooldown, float) if args.cooldown else [ENEMY_FIRE_COOLDOWN[difficulty]],
+                          parse_values(args.miss_chance, float) if args.miss_chance else [ENEMY_MISS_CHANCE[difficulty]])
+    workers = args.workers or multiprocessing.cpu_count()
+
+    def progress(done, total):
+        if done % 50 == 0 or done == total:
+            print(f"\r{done}/{total} matches", end='', file=sys.stderr, flush=True)
+
+    start = time.perf_counter()
+    reports = run_sweep(sets, args.matches, args.seed, difficulty, args.mode, workers, args.max_seconds, progress)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    for report in reports:
+        params = report['params']
+        low, high = report['player_win_rate_95']
+        print(f"damage {params['damage']:3d}  cooldown {params['cooldown']:4.1f}s  miss {params['miss_chance']:.2f}  "
+              f"player wins {report['player_win_rate']:6.1%} ({low:.0%}-{high:.0%})  "
+              f"timeouts {report['outcomes']['timeout']:4d}  "
+              f"player ttk {mean_text(report['player_time_to_kill'])}s  enemy ttk {mean_text(report['enemy_time_to_kill'])}s  "
+              f"shots {mean_text(report['player_shots_per_match'])} / {mean_text(report['enemy_shots_per_match'])}")
+    print(f"{len(sets) * args.matches} matches in {elapsed:.1f}s on {workers} workers")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'version': REPORT_VERSION,
+                'difficulty': difficulty,
+                'mode': args.mode,
+                'matches_per_set': args.matches,
+                'seed': args.seed,
+                'max_seconds': args.max_seconds,
+                'elapsed_seconds': round(elapsed, 3),
+                'sets': reports
+            }, f, indent=2)
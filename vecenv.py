@@ -0,0 +1,381 @@
+import math
+import time
+import random
+import argparse
+
+import numpy as np
+
+from simulation import (GRID_LENGTH, TANK_RADIUS, TANK_SPEED, BULLET_SPEED, TICK_RATE, DIFFICULTIES,
+                        FREE_CELL_SIZE, SPAWN_AREA, PLAYER_PROJECTILE_DAMAGE, OBSTACLE_TURN_SECONDS,
+                        OBSTACLE_SHOWN_SECONDS, OBSTACLE_HIDDEN_SECONDS,
+                        ENEMY_PROJECTILE_DAMAGE, ENEMY_FIRE_COOLDOWN, ENEMY_ROT_SPEED, ENEMY_MOVE_SPEED,
+                        new_obstacles, obstacle_radius, obstacle_box, respawn_area)
+from projectiles import segment_circle_entry, segment_box_entry
+from freespace import FreeSpace
+from tuning import PLAYER_TURN, PLAYER_RELOAD_TICKS, PLAYER_AIM, PLAYER_RANGE
+
+
+# Step/reset environment over N independent arenas, each a player tank and
+# one enemy tank among the game's obstacles. The agent drives the enemy;
+# the player follows the scripted policy of tuning.py. Every arena lives in
+# a row of the same NumPy arrays, so one step() advances all of them with
+# array operations and no per-arena Python. Arenas that finish an episode
+# are reset in place and their next observation is the first of the new
+# episode. Movement, firing, damage and the swept shell collisions follow
+# simulation.py, in the order step() runs them, with the enemy driven
+# before the tick as a network client would; power-ups, the boss, portals
+# and CTF are left out.
+
+# actions, one row per arena: move (-1 back, 0, 1 forward),
+# turn (-1 right, 0, 1 left), fire (0 or 1)
+MOVE, TURN, FIRE = range(3)
+ACTION_SIZE = 3
+
+TANK_FEATURES = 11
+SHELL_FEATURES = 6
+RASTER_CHANNELS = 4   # obstacles, player, enemy, shells
+
+KILL_REWARD = 1.0
+OBSTACLE_DIRECTION_TICKS = OBSTACLE_TURN_SECONDS * TICK_RATE
+
+
+def wrap_degrees(angle):
+    return (angle + 180) % 360 - 180
+
+
+class TankEnv:
+    # n arenas stepped together. Observations are a dict of float32 arrays:
+    # 'tanks' (n, TANK_FEATURES) describes the enemy and the player as the
+    # enemy sees it, 'shells' (n, shells, SHELL_FEATURES) the nearest live
+    # shells in the enemy's frame, zero rows past the last, and with raster
+    # set, 'raster' (n, RASTER_CHANNELS, raster, raster) a top-down
+    # occupancy grid of the arena. Rewards are damage dealt minus damage
+    # taken over 100, plus or minus KILL_REWARD when a tank is destroyed.
+
+    def __init__(self, n, seed=None, difficulty='medium', max_steps=60 * TICK_RATE, ticks_per_step=1,
+                 shells=8, raster=None, capacity=32):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.max_steps = max_steps
+        self.ticks_per_step = ticks_per_step
+        self.shells = shells
+        self.raster = raster
+        self.enemy_damage = ENEMY_PROJECTILE_DAMAGE[difficulty]
+        self.enemy_cooldown = int(round(ENEMY_FIRE_COOLDOWN[difficulty] * TICK_RATE))
+        self.enemy_turn = ENEMY_ROT_SPEED[difficulty]
+        self.enemy_speed = ENEMY_MOVE_SPEED[difficulty]
+
+        # one column per obstacle of the game's layout
+        layout = [obs for obs in new_obstacles() if obstacle_radius(obs) is not None]
+        self.layout = layout
+        self.obstacle_radius = np.array([obstacle_radius(obs) + TANK_RADIUS for obs in layout])
+        boxes = np.array([obstacle_box(obs) for obs in layout], dtype=float)
+        self.half_x = boxes[:, 0]
+        self.half_z = boxes[:, 1]
+        self.size = np.array([obs.size for obs in layout], dtype=float)
+        self.speed = np.array([obs.speed if obs.type == 'cube' and obs.dynamic else 0.0
+                               for obs in layout])
+        self.spin = np.array([obs.rotation_speed if obs.type == 'barrier' and obs.dynamic else 0.0
+                              for obs in layout])
+        self.toggles = np.array([obs.toggle_time is not None for obs in layout])
+        # every arena starts from the layout, so one raster serves all spawns
+        self.free_space = FreeSpace(GRID_LENGTH, FREE_CELL_SIZE)
+        for i, obs in enumerate(layout):
+            self.free_space.place(i, obs.x, obs.z, obstacle_radius(obs) + TANK_RADIUS)
+        self.spawn_rng = random.Random(int(self.rng.integers(2 ** 63)))
+
+        m = len(layout)
+        self.obs_x = np.zeros((n, m))
+        self.obs_z = np.zeros((n, m))
+        self.obs_angle = np.zeros((n, m))
+        self.obs_dir = np.zeros((n, m, 2))
+        self.visible = np.ones((n, m), dtype=bool)
+        self.toggle_at = np.zeros((n, m), dtype=np.int64)
+
+        # tank 0 is the player, tank 1 the enemy
+        self.pos = np.zeros((n, 2, 2))
+        self.rot = np.zeros((n, 2))
+        self.health = np.zeros((n, 2))
+        self.reload = np.zeros((n, 2), dtype=np.int64)
+
+        self.shell_pos = np.zeros((n, capacity, 2))
+        self.shell_dir = np.zeros((n, capacity, 2))
+        self.shell_owner = np.zeros((n, capacity), dtype=np.int8)
+        self.shell_live = np.zeros((n, capacity), dtype=bool)
+
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+
+    def reset(self):
+        self._reset(np.arange(self.n))
+        return self.observe()
+
+    def _reset(self, arenas):
+        k = len(arenas)
+        if k == 0:
+            return
+        layout = self.layout
+        self.obs_x[arenas] = [obs.x for obs in layout]
+        self.obs_z[arenas] = [obs.z for obs in layout]
+        self.obs_angle[arenas] = [obs.rotation for obs in layout]
+        self.obs_dir[arenas] = [obs.direction for obs in layout]
+        self.visible[arenas] = True
+        shown = self.rng.uniform(*OBSTACLE_SHOWN_SECONDS, (k, len(layout)))
+        self.toggle_at[arenas] = np.where(self.toggles, shown * TICK_RATE, 0).astype(np.int64)
+
+        self.health[arenas] = 100
+        self.reload[arenas] = 0
+        self.rot[arenas] = (0, 180)
+        self.shell_live[arenas] = False
+        self.steps[arenas] = 0
+        self.ticks[arenas] = 0
+        for tank in (0, 1):
+            self._spawn(arenas, tank)
+
+    def _spawn(self, arenas, tank):
+        # simulation.respawn_tank: a free point of the tank's own corner
+        # away from the other tank, drawn for all arenas at once and again
+        # for those too close, a few times. The rest get spawn_point's exact
+        # pass, over the corner and then the whole arena; a tank with
+        # nowhere to go stays where it is.
+        area = respawn_area(tank)
+        pending = arenas
+        for _ in range(self.free_space.attempts):
+            spot = self.free_space.points(self.rng, area, len(pending))
+            if spot is None:
+                break
+            close = np.hypot(*(spot - self.pos[pending, 1 - tank]).T) < TANK_RADIUS * 2
+            self.pos[pending[~close], tank] = spot[~close]
+            pending = pending[close]
+            if len(pending) == 0:
+                return
+        for arena in pending.tolist():
+            other = [self.pos[arena, 1 - tank]]
+            point = (self.free_space.sample(self.spawn_rng, area, other, TANK_RADIUS * 2)
+                     or self.free_space.sample(self.spawn_rng, SPAWN_AREA, other, TANK_RADIUS * 2))
+            if point is not None:
+                self.pos[arena, tank] = point[0], point[2]
+
+    def _blocked(self, arenas, spot):
+        # simulation.check_obstacle_collision for one point per arena
+        dx = spot[:, 0, None] - self.obs_x[arenas]
+        dz = spot[:, 1, None] - self.obs_z[arenas]
+        return (self.visible[arenas] & (dx ** 2 + dz ** 2 < self.obstacle_radius ** 2)).any(axis=1)
+
+    def _drive(self, tank, move, turn_degrees, speed):
+        rot = (self.rot[:, tank] + turn_degrees) % 360
+        self.rot[:, tank] = rot
+        rad = np.radians(rot)
+        step = np.stack((np.sin(rad), np.cos(rad)), axis=1) * (move * speed)[:, None]
+        target = self.pos[:, tank] + step
+        moving = np.flatnonzero(move != 0)
+        free = (np.abs(target[moving]) <= GRID_LENGTH).all(axis=1) & ~self._blocked(moving, target[moving])
+        self.pos[moving[free], tank] = target[moving[free]]
+
+    def _fire(self, tank, firing):
+        # into the first free slot of each firing arena; a full arena holds fire
+        free = ~self.shell_live
+        has_slot = free.any(axis=1)
+        arenas = np.flatnonzero(firing & has_slot & (self.reload[:, tank] <= 0))
+        if len(arenas) == 0:
+            return
+        slots = free[arenas].argmax(axis=1)
+        rad = np.radians(self.rot[arenas, tank])
+        self.shell_pos[arenas, slots] = self.pos[arenas, tank]
+        self.shell_dir[arenas, slots] = np.stack((np.sin(rad), np.cos(rad)), axis=1)
+        self.shell_owner[arenas, slots] = tank
+        self.shell_live[arenas, slots] = True
+        self.reload[arenas, tank] = PLAYER_RELOAD_TICKS if tank == 0 else self.enemy_cooldown
+
+    def _player(self):
+        # tuning.drive_player for every arena at once
+        offset = self.pos[:, 1] - self.pos[:, 0]
+        diff = wrap_degrees(np.degrees(np.arctan2(offset[:, 0], offset[:, 1])) - self.rot[:, 0])
+        distance = np.hypot(offset[:, 0], offset[:, 1])
+        facing = np.abs(diff) < 20
+        move = np.where(facing & (distance > PLAYER_RANGE[1]), 1, np.where(facing & (distance < PLAYER_RANGE[0]), -1, 0))
+        self._drive(0, move, np.clip(diff, -PLAYER_TURN, PLAYER_TURN), TANK_SPEED)
+        self._fire(0, np.abs(diff) < PLAYER_AIM)
+
+    def _obstacles(self):
+        # simulation's turn_obstacle and blink_obstacle events, then
+        # update_dynamic_obstacles
+        moving = self.speed > 0
+        turning = moving & ((self.ticks > 0) & (self.ticks % OBSTACLE_DIRECTION_TICKS == 0))[:, None]
+        count = int(turning.sum())
+        if count:
+            angle = np.radians(self.rng.uniform(0, 360, count))
+            self.obs_dir[turning] = np.stack((np.sin(angle), np.cos(angle)), axis=1)
+
+        due = self.toggles & (self.ticks[:, None] >= self.toggle_at)
+        count = int(due.sum())
+        if count:
+            hiding = self.visible[due]
+            wait = np.where(hiding, self.rng.uniform(*OBSTACLE_HIDDEN_SECONDS, count),
+                            self.rng.uniform(*OBSTACLE_SHOWN_SECONDS, count))
+            self.visible[due] = ~hiding
+            self.toggle_at[due] = self.ticks[np.nonzero(due)[0]] + (wait * TICK_RATE).astype(np.int64)
+
+        if moving.any():
+            x = self.obs_x + self.speed * self.obs_dir[:, :, 0]
+            z = self.obs_z + self.speed * self.obs_dir[:, :, 1]
+            bounce = moving & ((np.abs(x) > GRID_LENGTH - self.size / 2) | (np.abs(z) > GRID_LENGTH - self.size / 2))
+            self.obs_dir[bounce] *= -1
+            self.obs_x = np.where(moving, x, self.obs_x)
+            self.obs_z = np.where(moving, z, self.obs_z)
+        self.obs_angle = (self.obs_angle + self.spin) % 360
+
+    def _shells(self):
+        # simulation.update_projectiles, one (arena, slot) pair per row
+        live = self.shell_live
+        start = self.shell_pos
+        end = start + self.shell_dir * BULLET_SPEED
+        x0 = start[:, :, 0, None]
+        z0 = start[:, :, 1, None]
+        x1 = end[:, :, 0, None]
+        z1 = end[:, :, 1, None]
+
+        wall_t = segment_box_entry(x0, z0, x1, z1, self.obs_x[:, None], self.obs_z[:, None],
+                                   self.half_x, self.half_z, self.obs_angle[:, None])
+        wall_t = np.where(self.visible[:, None], wall_t, np.inf).min(axis=2)
+        tank_t = segment_circle_entry(x0, z0, x1, z1, self.pos[:, None, :, 0], self.pos[:, None, :, 1], TANK_RADIUS)
+        # a shell never hits the tank that fired it
+        tank_t[self.shell_owner[:, :, None] == np.arange(2)] = np.inf
+
+        entry = np.minimum(wall_t, tank_t.min(axis=2))
+        hit = live & np.isfinite(entry)
+        struck = hit & (wall_t > entry)
+        victim = tank_t.argmin(axis=2)
+
+        damage = np.zeros((self.n, 2))
+        for tank, amount in ((0, self.enemy_damage), (1, PLAYER_PROJECTILE_DAMAGE)):
+            damage[:, tank] = (struck & (victim == tank)).sum(axis=1) * amount
+        self.health -= damage
+
+        self.shell_pos = end
+        self.shell_live = live & ~hit & (np.abs(end) <= GRID_LENGTH).all(axis=2)
+        return damage
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        reward = np.zeros(self.n)
+        done = np.zeros(self.n, dtype=bool)
+        for _ in range(self.ticks_per_step):
+            self._player()
+            self._drive(1, actions[:, MOVE], actions[:, TURN] * self.enemy_turn, self.enemy_speed)
+            self._fire(1, actions[:, FIRE] != 0)
+            damage = self._shells()
+            self._obstacles()
+            self.reload -= 1
+            self.ticks += 1
+
+            killed = self.health <= 0
+            reward += np.where(done, 0, (damage[:, 0] - damage[:, 1]) / 100 + KILL_REWARD * (killed[:, 0].astype(float) - killed[:, 1]))
+            done |= killed.any(axis=1)
+        self.steps += 1
+        truncated = ~done & (self.steps >= self.max_steps)
+        finished = np.flatnonzero(done | truncated)
+        self._reset(finished)
+        return self.observe(), reward, done | truncated, {'truncated': truncated}
+
+    def observe(self):
+        n = self.n
+        me = self.pos[:, 1]
+        rad = np.radians(self.rot[:, 1])
+        sin = np.sin(rad)
+        cos = np.cos(rad)
+
+        def local(dx, dz, scale=1):
+            # left (the way a positive turn goes) and forward of the enemy
+            s = sin.reshape(sin.shape + (1,) * (dx.ndim - 1))
+            c = cos.reshape(s.shape)
+            return (dx * c - dz * s) / scale, (dx * s + dz * c) / scale
+
+        # distances in arena widths
+        width = 2 * GRID_LENGTH
+        offset = self.pos[:, 0] - me
+        left, forward = local(offset[:, 0], offset[:, 1], width)
+        facing = np.radians(self.rot[:, 0] - self.rot[:, 1])
+        tanks = np.stack((me[:, 0] / GRID_LENGTH, me[:, 1] / GRID_LENGTH, sin, cos,
+                          self.health[:, 1] / 100, np.maximum(self.reload[:, 1], 0) / max(self.enemy_cooldown, 1),
+                          left, forward, np.sin(facing), np.cos(facing), self.health[:, 0] / 100), axis=1)
+
+        # the nearest live shells first
+        shell_offset = self.shell_pos - me[:, None]
+        distance = np.where(self.shell_live, np.hypot(shell_offset[:, :, 0], shell_offset[:, :, 1]), np.inf)
+        nearest = np.argsort(distance, axis=1)[:, :self.shells]
+        rows = np.arange(n)[:, None]
+        valid = np.isfinite(distance[rows, nearest])
+        s_left, s_forward = local(shell_offset[rows, nearest, 0], shell_offset[rows, nearest, 1], width)
+        d = self.shell_dir[rows, nearest]
+        d_left, d_forward = local(d[:, :, 0], d[:, :, 1])
+        shells = np.stack((s_left, s_forward, d_left, d_forward,
+                           self.shell_owner[rows, nearest] == 0, valid), axis=2) * valid[:, :, None]
+        if shells.shape[1] < self.shells:
+            shells = np.concatenate((shells, np.zeros((n, self.shells - shells.shape[1], SHELL_FEATURES))), axis=1)
+
+        observation = {'tanks': tanks.astype(np.float32), 'shells': shells.astype(np.float32)}
+        if self.raster:
+            observation['raster'] = self.rasterise()
+        return observation
+
+    def rasterise(self):
+        r = self.raster
+        cell = 2 * GRID_LENGTH / r
+        grid = np.zeros((self.n, RASTER_CHANNELS, r, r), dtype=np.float32)
+
+        # obstacles: the cells whose centres lie inside a visible box, tested
+        # only over the window of cells each box can reach
+        reach = np.hypot(self.half_x, self.half_z)
+        window = np.arange(int(math.ceil(2 * reach.max() / cell)) + 1)
+        first_col = np.ceil((self.obs_x - reach + GRID_LENGTH) / cell - 0.5).astype(np.int64)
+        first_row = np.ceil((self.obs_z - reach + GRID_LENGTH) / cell - 0.5).astype(np.int64)
+        cols = first_col[:, :, None, None] + window
+        rows = first_row[:, :, None, None] + window[:, None]
+        rad = np.radians(self.obs_angle)[:, :, None, None]
+        dx = -GRID_LENGTH + cell * (cols + 0.5) - self.obs_x[:, :, None, None]
+        dz = -GRID_LENGTH + cell * (rows + 0.5) - self.obs_z[:, :, None, None]
+        u = dx * np.cos(rad) - dz * np.sin(rad)
+        v = dx * np.sin(rad) + dz * np.cos(rad)
+        inside = ((np.abs(u) < self.half_x[:, None, None]) & (np.abs(v) < self.half_z[:, None, None])
+                  & self.visible[:, :, None, None] & (cols >= 0) & (cols < r) & (rows >= 0) & (rows < r))
+        arena, obstacle, row, col = np.nonzero(inside)
+        grid[arena, 0, rows[arena, obstacle, row, 0], cols[arena, obstacle, 0, col]] = 1
+
+        # rows run along z and columns along x, as in navigation.FlowField
+        def cells(xz):
+            return np.clip(((xz + GRID_LENGTH) / cell).astype(np.int64), 0, r - 1)
+
+        arenas = np.arange(self.n)
+        for tank in (0, 1):
+            col, row = cells(self.pos[:, tank]).T
+            grid[arenas, 1 + tank, row, col] = 1
+        arena, slot = np.nonzero(self.shell_live)
+        col, row = cells(self.shell_pos[arena, slot]).T
+        grid[arena, 3, row, col] = 1
+        return grid
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure TankEnv throughput with random enemy actions")
+    parser.add_argument('--envs', default='1,64,256,1024', help="comma-separated arena counts, one run each")
+    parser.add_argument('--steps', type=int, default=600)
+    parser.add_argument('--raster', type=int, default=None)
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='medium')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    for n in [int(v) for v in args.envs.split(',')]:
+        env = TankEnv(n, seed=args.seed, difficulty=args.difficulty, raster=args.raster)
+        env.reset()
+        actions = np.random.default_rng(args.seed).integers(-1, 2, size=(args.steps, n, ACTION_SIZE))
+        episodes = 0
+        returns = 0.0
+        start = time.perf_counter()
+        for t in range(args.steps):
+            _, reward, done, _ = env.step(actions[t])
+            returns += reward.sum()
+            episodes += int(done.sum())
+        elapsed = time.perf_counter() - start
+        print(f"{n:5d} arenas  {n * args.steps / elapsed:10.0f} steps/s  {elapsed / args.steps * 1000:7.3f} ms/step  "
+              f"{episodes} episodes  reward {returns:.1f}")
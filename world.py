@@ -0,0 +1,123 @@
+import numpy as np
+
+
+class World:
+    # Entity-component store. Every component is a packed column with one
+    # row per live entity, and every row carries a bitmask of the
+    # components its entity has; a column's value means nothing on rows
+    # without the bit. A component registered without a dtype is a tag: a
+    # bit and no column. Removing an entity shifts the rows after it down,
+    # so rows stay in spawn order and systems see entities in a stable
+    # order. Entity ids never change. query() returns the rows holding a
+    # set of components, cached until an entity gains or loses one; the
+    # result is shared, so callers must not modify it.
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.capacity = capacity
+        self.columns = {}
+        self.bits = {}
+        self.mask = np.zeros(capacity, dtype=np.int64)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.rows = {}
+        self.next_id = 0
+        self._queries = {}
+
+    def component(self, name, dtype=float, shape=()):
+        self.bits[name] = 1 << len(self.bits)
+        if dtype is not None:
+            self.columns[name] = np.zeros((self.capacity,) + shape, dtype=dtype)
+
+    def __getitem__(self, name):
+        # the whole column; index it with rows from query() or row()
+        return self.columns[name]
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+
+        def grow(old):
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            return new
+
+        self.mask = grow(self.mask)
+        self.ids = grow(self.ids)
+        self.columns = {name: grow(column) for name, column in self.columns.items()}
+        self.capacity = capacity
+
+    def spawn(self, **components):
+        self._reserve(self.count + 1)
+        row = self.count
+        entity = self.next_id
+        self.next_id += 1
+        self.count += 1
+        self.ids[row] = entity
+        self.rows[entity] = row
+        self.mask[row] = 0
+        for name, value in components.items():
+            self._set(row, name, value)
+        self._queries.clear()
+        return entity
+
+    def _set(self, row, name, value):
+        self.mask[row] |= self.bits[name]
+        column = self.columns.get(name)
+        if column is not None:
+            column[row] = value
+
+    def add(self, entity, name, value=0):
+        self._set(self.rows[entity], name, value)
+        self._queries.clear()
+
+    def discard(self, entity, name):
+        self.mask[self.rows[entity]] &= ~self.bits[name]
+        self._queries.clear()
+
+    def has(self, entity, name):
+        return bool(self.mask[self.rows[entity]] & self.bits[name])
+
+    def tagged(self, rows, name):
+        return (self.mask[rows] & self.bits[name]) != 0
+
+    def row(self, entity):
+        return self.rows[entity]
+
+    def alive(self, entity):
+        return entity in self.rows
+
+    def despawn(self, entity):
+        row = self.rows.pop(entity)
+        last = self.count - 1
+        if row < last:
+            for column in (self.mask, self.ids, *self.columns.values()):
+                column[row:last] = column[row + 1:last + 1]
+            for moved in range(row, last):
+                self.rows[int(self.ids[moved])] = moved
+        self.count = last
+        self._queries.clear()
+
+    def clear(self):
+        self.count = 0
+        self.rows.clear()
+        self._queries.clear()
+
+    def query(self, *names, without=()):
+        key = (names, without)
+        rows = self._queries.get(key)
+        if rows is None:
+            need = sum(self.bits[name] for name in names)
+            skip = sum(self.bits[name] for name in without)
+            mask = self.mask[:self.count]
+            rows = np.flatnonzero(((mask & need) == need) & ((mask & skip) == 0))
+            self._queries[key] = rows
+        return rows
+
+    def entities(self, rows):
+        return self.ids[rows]
+
+    def __len__(self):
+        return self.count